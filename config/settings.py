@@ -46,11 +46,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -59,7 +61,8 @@ ROOT_URLCONF = 'config.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates с учётом времени отрисовки в /metrics
+        'BACKEND': 'core.metrics.InstrumentedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -79,13 +82,46 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
+# Постоянные соединения под WSGI: секунды жизни соединения с проверкой перед
+# повторным использованием. Под ASGI оставьте 0 — там соединение на каждый запрос
+DB_CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', '0'))
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Реплика для чтений core (ReadWriteRouter): файл SQLite, который обновляют
+# sync_read_replica и команды, меняющие данные (load_nasa, apply_retention,
+# predict_flybys, import_orbits, drop_midnight_duplicates), или Postgres
+# с NASA_READ_DB_ENGINE=django.db.backends.postgresql
+if os.getenv('NASA_READ_DB_NAME'):
+    DATABASES['replica'] = {
+        'ENGINE': os.getenv('NASA_READ_DB_ENGINE', 'django.db.backends.sqlite3'),
+        'NAME': os.getenv('NASA_READ_DB_NAME'),
+        'HOST': os.getenv('NASA_READ_DB_HOST', ''),
+        'PORT': os.getenv('NASA_READ_DB_PORT', ''),
+        'USER': os.getenv('NASA_READ_DB_USER', ''),
+        'PASSWORD': os.getenv('NASA_READ_DB_PASSWORD', ''),
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'TEST': {'MIRROR': 'default'},
+    }
+NASA_READ_DATABASE = 'replica' if 'replica' in DATABASES else None
+DATABASE_ROUTERS = ['core.db.ReadWriteRouter']
+
+# Прагмы SQLite на каждое соединение; пустая строка оставляет значение SQLite
+NASA_SQLITE_JOURNAL_MODE = os.getenv('NASA_SQLITE_JOURNAL_MODE', 'wal')
+NASA_SQLITE_BUSY_TIMEOUT = int(os.getenv('NASA_SQLITE_BUSY_TIMEOUT', '5000'))
+NASA_SQLITE_SYNCHRONOUS = os.getenv('NASA_SQLITE_SYNCHRONOUS', 'normal')
+# Копирование реплики SQLite: страниц за шаг и пауза между шагами (секунды)
+NASA_REPLICA_COPY_PAGES = int(os.getenv('NASA_REPLICA_COPY_PAGES', '1024'))
+NASA_REPLICA_COPY_SLEEP = float(os.getenv('NASA_REPLICA_COPY_SLEEP', '0.005'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -131,4 +167,85 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 # NASA API Settings
 NASA_API_KEY = os.getenv('NASA_API_KEY', '')
-NASA_NEO_API_URL = 'https://api.nasa.gov/neo/rest/v1/feed'
\ No newline at end of file
+# Адрес фида; для офлайн-прогонов — локальный python manage.py fake_neows
+NASA_NEO_API_URL = os.getenv('NASA_NEO_API_URL', 'https://api.nasa.gov/neo/rest/v1/feed')
+# Размер пакета для bulk-записи при загрузке фида
+NASA_INGEST_BATCH_SIZE = int(os.getenv('NASA_INGEST_BATCH_SIZE', '500'))
+
+# Пул ключей NASA через запятую для параллельной загрузки истории
+NASA_API_KEYS = [key.strip() for key in os.getenv('NASA_API_KEYS', '').split(',') if key.strip()]
+# Число параллельных запросов к фиду в load_nasa
+NASA_FETCH_WORKERS = int(os.getenv('NASA_FETCH_WORKERS', '4'))
+# Сколько запросов оставлять в запасе у каждого ключа по X-RateLimit-Remaining
+NASA_RATE_LIMIT_RESERVE = int(os.getenv('NASA_RATE_LIMIT_RESERVE', '0'))
+
+# HTTP-клиент NeoWs: таймауты (соединение, чтение), повторы и квота ключа в час
+NASA_HTTP_TIMEOUT = (
+    float(os.getenv('NASA_HTTP_CONNECT_TIMEOUT', '3.05')),
+    float(os.getenv('NASA_HTTP_READ_TIMEOUT', '30')),
+)
+NASA_HTTP_MAX_RETRIES = int(os.getenv('NASA_HTTP_MAX_RETRIES', '4'))
+NASA_HTTP_BACKOFF_BASE = float(os.getenv('NASA_HTTP_BACKOFF_BASE', '0.5'))
+NASA_HTTP_BACKOFF_MAX = float(os.getenv('NASA_HTTP_BACKOFF_MAX', '30'))
+NASA_RATE_LIMIT_PER_HOUR = int(os.getenv('NASA_RATE_LIMIT_PER_HOUR', '1000'))
+
+# Сколько секунд окно фида считается свежим и не запрашивается повторно
+NASA_SYNC_FRESHNESS = int(os.getenv('NASA_SYNC_FRESHNESS', '600'))
+
+# HTTP-кэширование главной страницы для анонимных пользователей
+NASA_PAGE_MAX_AGE = int(os.getenv('NASA_PAGE_MAX_AGE', '60'))
+# Сколько секунд номер поколения данных держится в кэше
+NASA_GENERATION_CACHE_SECONDS = int(os.getenv('NASA_GENERATION_CACHE_SECONDS', '5'))
+
+# Размер страниц таблицы сближений и списка отслеживания (?page_size= не больше максимума)
+NASA_PAGE_SIZE = int(os.getenv('NASA_PAGE_SIZE', '50'))
+NASA_WATCHLIST_PAGE_SIZE = int(os.getenv('NASA_WATCHLIST_PAGE_SIZE', '20'))
+NASA_PAGE_SIZE_MAX = int(os.getenv('NASA_PAGE_SIZE_MAX', '500'))
+# Сколько секунд кэшируется сводка списка отслеживания пользователя
+NASA_WATCHLIST_SUMMARY_TTL = int(os.getenv('NASA_WATCHLIST_SUMMARY_TTL', '300'))
+# Страница JSON API: по умолчанию и максимум строк за запрос
+NASA_API_PAGE_SIZE = int(os.getenv('NASA_API_PAGE_SIZE', '1000'))
+NASA_API_PAGE_SIZE_MAX = int(os.getenv('NASA_API_PAGE_SIZE_MAX', '50000'))
+# Строк за одно чтение курсора при выгрузке export_flybys
+NASA_EXPORT_CHUNK_SIZE = int(os.getenv('NASA_EXPORT_CHUNK_SIZE', '2000'))
+
+# Живая лента главной страницы (SSE); работает только под ASGI, под WSGI выключена всегда
+NASA_LIVE_FEED_ENABLED = os.getenv('NASA_LIVE_FEED_ENABLED', '1') == '1'
+# Опрос поколения, жизнь соединения, пинг и предел строк в событии
+NASA_LIVE_POLL_SECONDS = float(os.getenv('NASA_LIVE_POLL_SECONDS', '3'))
+NASA_LIVE_LIFETIME_SECONDS = int(os.getenv('NASA_LIVE_LIFETIME_SECONDS', '300'))
+NASA_LIVE_HEARTBEAT_SECONDS = int(os.getenv('NASA_LIVE_HEARTBEAT_SECONDS', '20'))
+NASA_LIVE_MAX_ROWS = int(os.getenv('NASA_LIVE_MAX_ROWS', '200'))
+
+# Токен для /metrics (Authorization: Bearer ...); пустой — эндпоинт открыт
+NASA_METRICS_TOKEN = os.getenv('NASA_METRICS_TOKEN', '')
+
+# Профили медленных запросов (админка → Профили запросов): порог в мс (0 — только
+# по запросу сотрудника), доля запросов под cProfile, лимит сохранений и хранимых записей
+NASA_PROFILE_THRESHOLD_MS = int(os.getenv('NASA_PROFILE_THRESHOLD_MS', '0'))
+NASA_PROFILE_SAMPLE_RATE = float(os.getenv('NASA_PROFILE_SAMPLE_RATE', '0.1'))
+NASA_PROFILE_MAX_PER_MINUTE = int(os.getenv('NASA_PROFILE_MAX_PER_MINUTE', '6'))
+NASA_PROFILE_KEEP = int(os.getenv('NASA_PROFILE_KEEP', '200'))
+
+# Время жизни кэша распределений /api/analytics/, с; загрузка данных сбрасывает его раньше
+NASA_ANALYTICS_CACHE_TTL = int(os.getenv('NASA_ANALYTICS_CACHE_TTL', '3600'))
+
+# Поиск астероидов: результатов по умолчанию (автодополнение) и максимум за запрос
+NASA_SEARCH_LIMIT = int(os.getenv('NASA_SEARCH_LIMIT', '10'))
+NASA_SEARCH_LIMIT_MAX = int(os.getenv('NASA_SEARCH_LIMIT_MAX', '50'))
+
+# Горизонт хранения, дни: сближения старше переносятся из Flyby в архивную таблицу
+# (apply_retention, load_nasa после загрузки); 0 — хранить всё в Flyby
+NASA_RETENTION_DAYS = int(os.getenv('NASA_RETENTION_DAYS', '365'))
+
+# Каталог столбцового архива истории (manage.py archive_history)
+NASA_ARCHIVE_DIR = Path(os.getenv('NASA_ARCHIVE_DIR', BASE_DIR / 'archive'))
+
+# Локальный прогноз сближений по элементам орбит (predict_flybys): горизонт в днях
+# и порог дистанции, км (по умолчанию 0,05 а.е., как у списков NeoWs)
+NASA_PREDICT_DAYS = int(os.getenv('NASA_PREDICT_DAYS', '365'))
+NASA_PREDICT_MAX_DISTANCE_KM = float(os.getenv('NASA_PREDICT_MAX_DISTANCE_KM', '7479893.5'))
+
+# Почта для оповещений о сближениях; по умолчанию письма печатаются в консоль
+EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'NEO Observer <noreply@localhost>')
@@ -1,27 +1,133 @@
 from django.contrib import admin
-from .models import Asteroid, Flyby, Watchlist
+from django.http import Http404, HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html, format_html_join
+from .models import (
+    AlertDelivery, AlertRule, ArchivedFlyby, Asteroid, DailyFlybyStats, FeedWindow, Flyby, ProfileCapture, Watchlist,
+)
+from .search import filter_matching
 
 
 @admin.register(Asteroid)
 class AsteroidAdmin(admin.ModelAdmin):
     list_display = ('name', 'nasa_id', 'is_potentially_hazardous', 'absolute_magnitude', 'created_at')
-    list_filter = ('is_potentially_hazardous', 'created_at')
+    list_filter = ('is_potentially_hazardous', 'orbit_source', 'created_at')
     search_fields = ('name', 'nasa_id')
     readonly_fields = ('created_at', 'updated_at')
 
+    def get_search_results(self, request, queryset, search_term):
+        # Полнотекстовый индекс вместо icontains по каждому полю
+        return filter_matching(queryset, search_term), False
+
 
 @admin.register(Flyby)
 class FlybyAdmin(admin.ModelAdmin):
-    list_display = ('asteroid', 'date', 'velocity_kmh', 'miss_distance_km', 'created_at')
-    list_filter = ('date', 'created_at', 'asteroid__is_potentially_hazardous')
+    list_display = ('asteroid', 'date', 'velocity_kmh', 'miss_distance_km', 'source', 'created_at')
+    list_filter = ('date', 'source', 'created_at', 'asteroid__is_potentially_hazardous')
     search_fields = ('asteroid__name', 'asteroid__nasa_id')
     date_hierarchy = 'date'
     readonly_fields = ('created_at',)
 
 
+@admin.register(ArchivedFlyby)
+class ArchivedFlybyAdmin(admin.ModelAdmin):
+    list_display = ('asteroid', 'date', 'velocity_kmh', 'miss_distance_km', 'source', 'updated_at')
+    list_filter = ('source', 'is_hazardous')
+    search_fields = ('asteroid__name', 'asteroid__nasa_id')
+    date_hierarchy = 'date'
+    list_select_related = ('asteroid',)
+    readonly_fields = ('created_at', 'updated_at')
+
+
 @admin.register(Watchlist)
 class WatchlistAdmin(admin.ModelAdmin):
     list_display = ('user', 'asteroid', 'added_at')
     list_filter = ('added_at', 'asteroid__is_potentially_hazardous')
     search_fields = ('user__username', 'asteroid__name', 'user_notes')
     readonly_fields = ('added_at',)
+
+
+@admin.register(FeedWindow)
+class FeedWindowAdmin(admin.ModelAdmin):
+    list_display = ('start_date', 'end_date', 'asteroid_count', 'completed_at')
+    date_hierarchy = 'start_date'
+
+
+@admin.register(DailyFlybyStats)
+class DailyFlybyStatsAdmin(admin.ModelAdmin):
+    list_display = ('date', 'asteroid_count', 'hazardous_count', 'min_miss_distance_km', 'max_velocity_kmh', 'updated_at')
+    date_hierarchy = 'date'
+    readonly_fields = ('updated_at',)
+
+
+@admin.register(AlertRule)
+class AlertRuleAdmin(admin.ModelAdmin):
+    list_display = ('user', 'enabled', 'max_miss_distance_km', 'lookahead', 'hazardous_only', 'updated_at')
+    list_filter = ('enabled', 'hazardous_only')
+    search_fields = ('user__username', 'user__email')
+
+
+@admin.register(AlertDelivery)
+class AlertDeliveryAdmin(admin.ModelAdmin):
+    list_display = ('user', 'flyby', 'created_at', 'sent_at')
+    list_filter = ('sent_at', 'created_at')
+    search_fields = ('user__username', 'flyby__asteroid__name')
+    list_select_related = ('user', 'flyby__asteroid')
+    raw_id_fields = ('user', 'flyby')
+
+
+@admin.register(ProfileCapture)
+class ProfileCaptureAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'method', 'path', 'view_name', 'status_code', 'duration_ms', 'db_ms', 'query_count', 'trigger', 'user')
+    list_filter = ('trigger', 'view_name', 'created_at')
+    search_fields = ('path', 'user__username')
+    date_hierarchy = 'created_at'
+    list_select_related = ('user',)
+    exclude = ('sql_log', 'profile_data', 'profile_text')
+    readonly_fields = (
+        'created_at', 'trigger', 'user', 'method', 'path', 'view_name', 'status_code',
+        'duration_ms', 'db_ms', 'query_count', 'download', 'profile', 'queries',
+    )
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        return [
+            path(
+                '<int:capture_id>/download/',
+                self.admin_site.admin_view(self.download_view),
+                name='core_profilecapture_download',
+            ),
+            *super().get_urls(),
+        ]
+
+    def download_view(self, request, capture_id):
+        """Сырые данные pstats: python -m pstats capture.prof или snakeviz."""
+        capture = get_object_or_404(ProfileCapture, pk=capture_id)
+        if not capture.profile_data:
+            raise Http404('Профиль cProfile не снимался')
+        response = HttpResponse(bytes(capture.profile_data), content_type='application/octet-stream')
+        response.headers['Content-Disposition'] = f'attachment; filename="capture-{capture.pk}.prof"'
+        return response
+
+    @admin.display(description='Файл pstats')
+    def download(self, obj):
+        if not obj.profile_data:
+            return 'нет (запрос вне выборки профилирования)'
+        return format_html('<a href="{}">capture-{}.prof</a>', reverse('admin:core_profilecapture_download', args=[obj.pk]), obj.pk)
+
+    @admin.display(description='Профиль')
+    def profile(self, obj):
+        return format_html('<pre style="white-space: pre; overflow-x: auto">{}</pre>', obj.profile_text or '—')
+
+    @admin.display(description='Журнал SQL')
+    def queries(self, obj):
+        return format_html(
+            '<ol>{}</ol>',
+            format_html_join('', '<li><code>{}</code> <small>{} мс</small></li>', ((q['sql'], q['ms']) for q in obj.sql_log)),
+        )
@@ -0,0 +1,123 @@
+"""Дневные агрегаты сближений для статистики и графиков главной страницы."""
+from datetime import timedelta
+
+from django.db.models import Count, Max, Min, Q, Sum
+from django.db.models.functions import TruncDate
+
+from .models import ArchivedFlyby, DailyFlybyStats, Flyby
+from .queries import day_start
+from .retention import retention_cutoff
+
+STATS_FIELDS = ('asteroid_count', 'hazardous_count', 'min_miss_distance_km', 'max_velocity_kmh')
+
+
+def _day_runs(days):
+    """Непрерывные отрезки дней: [(первый, последний), ...]."""
+    runs = []
+    for day in sorted(days):
+        if runs and day - runs[-1][1] == timedelta(days=1):
+            runs[-1][1] = day
+        else:
+            runs.append([day, day])
+    return runs
+
+
+def days_condition(days):
+    """Условие на date: попадание в любой из дней days (отрезками подряд идущих дней)."""
+    condition = Q()
+    for first, last in _day_runs(days):
+        condition |= Q(date__gte=day_start(first), date__lt=day_start(last + timedelta(days=1)))
+    return condition
+
+
+def _day_rows(model, days):
+    return (
+        model.objects.filter(days_condition(days))
+        .annotate(day=TruncDate('date'))
+        .order_by()
+        .values('day')
+        .annotate(
+            asteroid_count=Count('asteroid_id', distinct=True),
+            hazardous_count=Count('asteroid_id', distinct=True, filter=Q(is_hazardous=True)),
+            min_miss_distance_km=Min('miss_distance_km'),
+            max_velocity_kmh=Max('velocity_kmh'),
+        )
+    )
+
+
+def _merge(row, other):
+    """Агрегаты одного дня из двух уровней хранения: строки уровней не пересекаются."""
+    return {
+        'asteroid_count': row['asteroid_count'] + other['asteroid_count'],
+        'hazardous_count': row['hazardous_count'] + other['hazardous_count'],
+        'min_miss_distance_km': min(row['min_miss_distance_km'], other['min_miss_distance_km']),
+        'max_velocity_kmh': max(row['max_velocity_kmh'], other['max_velocity_kmh']),
+    }
+
+
+def refresh_daily_stats(days, batch_size=500):
+    """
+    Пересчитывает агрегаты для указанных дней одним GROUP BY по индексу даты.
+
+    Дни раньше горизонта хранения считаются и по архивной таблице
+    (core.retention) вторым таким же запросом. Дни без сближений удаляются
+    из таблицы агрегатов.
+
+    Returns:
+        int: число пересчитанных дней с данными
+    """
+    days = set(days)
+    if not days:
+        return 0
+
+    by_day = {row['day']: row for row in _day_rows(Flyby, days)}
+    cutoff = retention_cutoff()
+    old_days = {day for day in days if cutoff is not None and day_start(day) < cutoff}
+    if old_days:
+        for row in _day_rows(ArchivedFlyby, old_days):
+            by_day[row['day']] = _merge(by_day[row['day']], row) if row['day'] in by_day else row
+    stats = [DailyFlybyStats(date=day, **{name: row[name] for name in STATS_FIELDS}) for day, row in by_day.items()]
+
+    empty_days = sorted(days - set(by_day))
+    for i in range(0, len(empty_days), batch_size):
+        DailyFlybyStats.objects.filter(date__in=empty_days[i:i + batch_size]).delete()
+    if stats:
+        DailyFlybyStats.objects.bulk_create(
+            stats,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=['date'],
+            update_fields=[*STATS_FIELDS, 'updated_at'],
+        )
+    return len(stats)
+
+
+def _window_totals(first_day, last_day):
+    return DailyFlybyStats.objects.filter(date__gte=first_day, date__lte=last_day), dict(
+        total_asteroids=Sum('asteroid_count', default=0),
+        hazardous_count=Sum('hazardous_count', default=0),
+        min_miss_distance_km=Min('min_miss_distance_km'),
+        max_velocity_kmh=Max('max_velocity_kmh'),
+    )
+
+
+def _with_safe_count(totals):
+    totals['safe_count'] = totals['total_asteroids'] - totals['hazardous_count']
+    return totals
+
+
+def window_stats(first_day, last_day):
+    """
+    Сводка за дни [first_day, last_day] из дневных агрегатов.
+
+    Число астероидов за окно — сумма дневных: один астероид не сближается
+    с Землёй дважды за неделю, поэтому сумма совпадает с DISTINCT по окну.
+    """
+    rows, aggregates = _window_totals(first_day, last_day)
+    return _with_safe_count(rows.aggregate(**aggregates))
+
+
+async def awindow_stats(first_day, last_day):
+    """Асинхронный вариант window_stats."""
+    rows, aggregates = _window_totals(first_day, last_day)
+    return _with_safe_count(await rows.aaggregate(**aggregates))
@@ -0,0 +1,128 @@
+"""Оповещения о сближениях отслеживаемых астероидов.
+
+Подходящие пары (пользователь, сближение) ищутся одним запросом для всех
+пользователей: список отслеживания соединяется с правилами и сближениями,
+пороги правила сравниваются прямо в SQL, уже отправленные пары отсекаются
+через NOT EXISTS. Письма собираются по одному на пользователя и уходят
+пачками через одно соединение почтового бэкенда.
+"""
+import logging
+from dataclasses import dataclass
+from itertools import groupby
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import DateTimeField, Exists, ExpressionWrapper, F, OuterRef, Q, Value
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import AlertDelivery, AlertRule, Flyby, Watchlist
+
+logger = logging.getLogger(__name__)
+
+RULE = 'user__alert_rule__'
+FLYBY = 'asteroid__flybys__'
+
+
+@dataclass
+class AlertResult:
+    created: int = 0
+    users: int = 0
+    sent: int = 0
+
+
+def matching_flybys(now=None):
+    """
+    Пары (user_id, flyby_id) новых сближений, подходящих под правила пользователей.
+
+    Окно ограничено сверху AlertRule.MAX_LOOKAHEAD, чтобы запрос шёл по
+    индексу даты; горизонт конкретного правила проверяется выражением.
+    Сближение, изменившееся после загрузки и только теперь попавшее под
+    порог, оповещения ещё не имеет и поэтому тоже попадает в выборку.
+    """
+    now = now or timezone.now()
+    horizon = ExpressionWrapper(Value(now) + F(f'{RULE}lookahead'), output_field=DateTimeField())
+    delivered = AlertDelivery.objects.filter(user_id=OuterRef('user_id'), flyby_id=OuterRef(f'{FLYBY}id'))
+    return Watchlist.objects.filter(
+        Q(**{f'{RULE}max_miss_distance_km__isnull': True})
+        | Q(**{f'{FLYBY}miss_distance_km__lte': F(f'{RULE}max_miss_distance_km')}),
+        Q(**{f'{RULE}hazardous_only': False}) | Q(**{f'{FLYBY}is_hazardous': True}),
+        Q(**{f'{FLYBY}date__lt': horizon}),
+        ~Exists(delivered),
+        **{
+            f'{RULE}enabled': True,
+            # Локальный прогноз — кандидаты, оповещения только по данным NeoWs
+            f'{FLYBY}source': Flyby.SOURCE_NEOWS,
+            'user__email__gt': '',
+            f'{FLYBY}date__gte': now,
+            f'{FLYBY}date__lt': now + AlertRule.MAX_LOOKAHEAD,
+        },
+    ).order_by().values_list('user_id', f'{FLYBY}id')
+
+
+def create_deliveries(now=None, batch_size=None):
+    """Записывает новые оповещения; повтор пары отсекает уникальный индекс."""
+    batch_size = batch_size or getattr(settings, 'NASA_INGEST_BATCH_SIZE', 500)
+    deliveries = [AlertDelivery(user_id=user_id, flyby_id=flyby_id) for user_id, flyby_id in matching_flybys(now)]
+    AlertDelivery.objects.bulk_create(deliveries, batch_size=batch_size, ignore_conflicts=True)
+    return len(deliveries)
+
+
+def build_message(user, deliveries):
+    context = {'user': user, 'flybys': [delivery.flyby for delivery in deliveries]}
+    return EmailMessage(
+        subject=render_to_string('core/email/alert_subject.txt', context).strip(),
+        body=render_to_string('core/email/alert.txt', context),
+        to=[user.email],
+    )
+
+
+def send_pending(now=None, users_per_batch=100):
+    """
+    Отправляет неотправленные оповещения о предстоящих сближениях: одно письмо на пользователя.
+
+    Оповещения отмечаются отправленными после успешной отправки своей пачки;
+    при ошибке бэкенда остаток остаётся в очереди до следующего запуска.
+
+    Returns:
+        tuple: (число пользователей, число оповещений)
+    """
+    now = now or timezone.now()
+    pending = (
+        AlertDelivery.objects.filter(sent_at__isnull=True, flyby__date__gte=now)
+        .select_related('user', 'flyby__asteroid')
+        .order_by('user_id', 'flyby__date')
+    )
+    connection = get_connection()
+    users = sent = 0
+    messages, ids = [], []
+
+    def flush():
+        nonlocal users, sent
+        connection.send_messages(messages)
+        AlertDelivery.objects.filter(id__in=ids).update(sent_at=timezone.now())
+        users += len(messages)
+        sent += len(ids)
+        messages.clear()
+        ids.clear()
+
+    try:
+        for _, group in groupby(pending.iterator(), key=lambda delivery: delivery.user_id):
+            group = list(group)
+            messages.append(build_message(group[0].user, group))
+            ids.extend(delivery.id for delivery in group)
+            if len(messages) >= users_per_batch:
+                flush()
+        if messages:
+            flush()
+    except OSError as e:
+        logger.warning("Оповещения не отправлены: %s", e)
+    return users, sent
+
+
+def run_alerts(now=None):
+    """Этап оповещений после загрузки: новые пары и рассылка."""
+    now = now or timezone.now()
+    result = AlertResult(created=create_deliveries(now))
+    result.users, result.sent = send_pending(now)
+    return result
@@ -0,0 +1,138 @@
+"""Распределения размеров, дистанций и скоростей сближений для графиков.
+
+Столбцы окна читаются одним values_list и считаются в NumPy: гистограммы
+и процентили без экземпляров моделей и без цикла Python по строкам, так
+что окно в несколько лет обходится одним запросом и несколькими проходами
+по массивам. Окно старше горизонта хранения читается вместе с архивной
+таблицей (core.retention). Результат кэшируется на поколение данных: до следующей
+загрузки одно и то же окно считается один раз. Окно, целиком лежащее в
+столбцовом архиве (core.columnar), считается по архиву без базы.
+"""
+import math
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from .caching import get_generation
+from .columnar import get_archive
+from .models import Flyby
+from .retention import across_tiers, retention_cutoff
+
+ANALYTICS_CACHE_KEY = 'core:analytics:{generation}:{start}:{end}'
+LUNAR_DISTANCE_KM = 384_400
+PERCENTILES = (5, 25, 50, 75, 95)
+HISTOGRAM_BINS = 24
+# Границы диаметра через четверть порядка: 1 м ... 56 км
+DIAMETER_EDGES_M = 10 ** np.arange(0, 4.8, 0.25)
+COLUMNS = ('asteroid_id', 'miss_distance_km', 'velocity_kmh', 'is_hazardous',
+           'asteroid__diameter_min_m', 'asteroid__diameter_max_m')
+
+
+def get_cache_ttl():
+    return getattr(settings, 'NASA_ANALYTICS_CACHE_TTL', 3600)
+
+
+def _flybys(start, end):
+    # Локальный прогноз — кандидаты, распределения строятся по данным NeoWs
+    cutoff = retention_cutoff()
+    return across_tiers(
+        lambda model: model.objects.filter(date__gte=start, date__lt=end, source=Flyby.SOURCE_NEOWS).values_list(*COLUMNS),
+        archived=cutoff is not None and start < cutoff,
+    )
+
+
+def to_columns(rows):
+    """Строки values_list(*COLUMNS) в словарь массивов; NULL диаметра — NaN."""
+    table = np.array(rows, dtype=float).reshape(-1, len(COLUMNS))
+    return {
+        'asteroid_id': table[:, 0].astype(np.int64),
+        'miss_distance_km': table[:, 1],
+        'velocity_kmh': table[:, 2],
+        'is_hazardous': table[:, 3].astype(bool),
+        # Среднее геометрическое границ — оценка для альбедо около 0,11
+        'diameter_m': np.sqrt(table[:, 4] * table[:, 5]),
+    }
+
+
+def nice_edges(maximum, bins=HISTOGRAM_BINS):
+    """Равные интервалы от нуля с шагом 1, 2 или 5 × 10^n, покрывающие maximum."""
+    if not maximum > 0:
+        return np.linspace(0, 1, bins + 1)
+    raw = maximum / bins
+    magnitude = 10 ** math.floor(math.log10(raw))
+    step = next(m * magnitude for m in (1, 2, 5, 10) if m * magnitude >= raw)
+    return step * np.arange(math.ceil(maximum / step) + 1)
+
+
+def _round(values):
+    """Значения для JSON: три значащие цифры."""
+    return [float(f'{value:.3g}') for value in values]
+
+
+def histogram(values, hazardous, edges):
+    """Счётчики по интервалам edges, всего и для опасных; выбросы — в крайние интервалы."""
+    values = np.clip(values, edges[0], edges[-1])
+    counts, _ = np.histogram(values, edges)
+    hazardous_counts, _ = np.histogram(values[hazardous], edges)
+    return {'edges': _round(edges), 'counts': counts.tolist(), 'hazardous': hazardous_counts.tolist()}
+
+
+def percentiles(values):
+    """Процентили PERCENTILES или None для пустого массива."""
+    if not len(values):
+        return None
+    return dict(zip((f'p{p}' for p in PERCENTILES), _round(np.percentile(values, PERCENTILES))))
+
+
+def summarize(columns):
+    """Гистограммы и процентили для столбцов to_columns."""
+    hazardous = columns['is_hazardous']
+    distance_km = columns['miss_distance_km']
+    distance_ld = distance_km / LUNAR_DISTANCE_KM
+    velocity = columns['velocity_kmh']
+
+    # Размер — свойство астероида: каждый считается один раз, сколько бы сближений у него ни было
+    _, first = np.unique(columns['asteroid_id'], return_index=True)
+    diameter = columns['diameter_m'][first]
+    diameter_hazardous = hazardous[first]
+    known = ~np.isnan(diameter)
+    diameter, diameter_hazardous = diameter[known], diameter_hazardous[known]
+
+    return {
+        'flybys': int(len(distance_km)),
+        'asteroids': int(len(first)),
+        'with_diameter': int(known.sum()),
+        'histograms': {
+            'diameter_m': histogram(diameter, diameter_hazardous, DIAMETER_EDGES_M),
+            'miss_distance_km': histogram(distance_km, hazardous, nice_edges(distance_km.max(initial=0))),
+            'miss_distance_ld': histogram(distance_ld, hazardous, nice_edges(distance_ld.max(initial=0))),
+            'velocity_kmh': histogram(velocity, hazardous, nice_edges(velocity.max(initial=0))),
+        },
+        'percentiles': {
+            'diameter_m': percentiles(diameter),
+            'miss_distance_km': percentiles(distance_km),
+            'miss_distance_ld': percentiles(distance_ld),
+            'velocity_kmh': percentiles(velocity),
+        },
+    }
+
+
+def _cache_key(generation, start, end):
+    return ANALYTICS_CACHE_KEY.format(generation=generation, start=int(start.timestamp()), end=int(end.timestamp()))
+
+
+def window_analytics(start, end):
+    """Распределения сближений в [start, end) с кэшем на поколение данных."""
+    key = _cache_key(get_generation()[0], start, end)
+    payload = cache.get(key)
+    if payload is None:
+        archive = get_archive()
+        if archive is not None and archive.covers(start, end):
+            columns = archive.analytics_columns(start, end)
+        else:
+            columns = to_columns(list(_flybys(start, end)))
+        payload = summarize(columns)
+        cache.set(key, payload, get_cache_ttl())
+    return payload
+
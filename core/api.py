@@ -0,0 +1,253 @@
+"""JSON API только для чтения: сближения, астероиды и список отслеживания.
+
+Строки читаются через values(), без создания экземпляров моделей, и только
+запрошенные клиентом столбцы (?fields=name,date,...). Списки постраничные
+по курсору (?cursor=, ?page_size=), см. core.pagination.
+"""
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.dateparse import parse_date
+from django.utils.http import quote_etag
+
+from . import queries
+from .analytics import window_analytics
+from .caching import conditional_on_generation
+from .models import Asteroid, Flyby, Watchlist
+from .pagination import InvalidCursor, get_page_size, keyset_page
+from .retention import across_tiers
+from .search import get_limit, search_asteroids
+
+# Имя поля в ответе -> путь в ORM
+FLYBY_FIELDS = {
+    'id': 'id',
+    'date': 'date',
+    'velocity_kmh': 'velocity_kmh',
+    'miss_distance_km': 'miss_distance_km',
+    'is_hazardous': 'is_hazardous',
+    'source': 'source',
+    'asteroid_id': 'asteroid_id',
+    'nasa_id': 'asteroid__nasa_id',
+    'name': 'asteroid__name',
+    'absolute_magnitude': 'asteroid__absolute_magnitude',
+}
+ASTEROID_FIELDS = {
+    'id': 'id',
+    'nasa_id': 'nasa_id',
+    'name': 'name',
+    'absolute_magnitude': 'absolute_magnitude',
+    'is_potentially_hazardous': 'is_potentially_hazardous',
+    'nasa_jpl_url': 'nasa_jpl_url',
+    'diameter_min_m': 'diameter_min_m',
+    'diameter_max_m': 'diameter_max_m',
+    'updated_at': 'updated_at',
+}
+ASTEROID_FLYBY_FIELDS = ('date', 'velocity_kmh', 'miss_distance_km')
+HISTORY_FIELDS = {
+    'date': 'date',
+    'velocity_kmh': 'velocity_kmh',
+    'miss_distance_km': 'miss_distance_km',
+    'is_hazardous': 'is_hazardous',
+    'source': 'source',
+    'nasa_id': 'asteroid__nasa_id',
+    'name': 'asteroid__name',
+}
+# Ключ сортировки истории: выбирается всегда, в объединении уровней сортировать можно только по выбранному
+HISTORY_ORDER = ('-date', 'asteroid__nasa_id')
+WATCHLIST_FIELDS = {
+    'id': 'id',
+    'added_at': 'added_at',
+    'user_notes': 'user_notes',
+    'asteroid_id': 'asteroid_id',
+    'nasa_id': 'asteroid__nasa_id',
+    'name': 'asteroid__name',
+    'is_potentially_hazardous': 'asteroid__is_potentially_hazardous',
+}
+
+
+class BadRequest(ValueError):
+    """Некорректные параметры запроса API."""
+
+
+def error(message, status=400):
+    return JsonResponse({'error': message}, status=status)
+
+
+def select_fields(request, available, extra=()):
+    """
+    Поля ответа из ?fields=; без параметра — все поля.
+
+    Raises:
+        BadRequest: запрошено неизвестное поле
+    """
+    value = request.GET.get('fields')
+    if not value:
+        return list(available) + list(extra)
+    fields = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in available and name not in extra]
+    if unknown:
+        raise BadRequest(f"Неизвестные поля: {', '.join(unknown)}")
+    return fields
+
+
+def fetch_page(request, queryset, fields, mapping, order):
+    """
+    Страница строк с нужными столбцами и ссылка на следующую.
+
+    Ключ сортировки читается всегда, даже если клиент его не запросил:
+    по нему строится курсор.
+    """
+    key_paths = [field.lstrip('-') for field in order]
+    paths = list(dict.fromkeys([mapping[name] for name in fields] + key_paths))
+    page_size = get_page_size(
+        request.GET.get('page_size'),
+        getattr(settings, 'NASA_API_PAGE_SIZE', 1000),
+        getattr(settings, 'NASA_API_PAGE_SIZE_MAX', 50000),
+    )
+    try:
+        page = keyset_page(queryset.values(*paths), order, request.GET.get('cursor'), page_size)
+    except InvalidCursor as e:
+        raise BadRequest(str(e)) from e
+
+    results = [{name: row[mapping[name]] for name in fields} for row in page.items]
+    next_url = None
+    if page.has_next:
+        params = request.GET.copy()
+        params['cursor'] = page.next_cursor
+        next_url = request.build_absolute_uri(f'{request.path}?{params.urlencode()}')
+    return {'results': results, 'next_cursor': page.next_cursor, 'next': next_url}
+
+
+def date_range(request):
+    """
+    Окно [start, end] из ?start=&end= (YYYY-MM-DD); по умолчанию неделя главной страницы.
+
+    Returns:
+        tuple: (начало, конец) — полуоткрытые границы datetime
+    """
+    first_day, last_day, start, end = queries.window_bounds(queries.WEEK_DAYS)
+    try:
+        if request.GET.get('start'):
+            first_day = parse_date(request.GET['start'])
+        if request.GET.get('end'):
+            last_day = parse_date(request.GET['end'])
+    except ValueError as e:
+        raise BadRequest(f"Некорректная дата: {e}") from e
+    if first_day is None or last_day is None:
+        raise BadRequest("Дата должна быть в формате YYYY-MM-DD")
+    if first_day > last_day:
+        raise BadRequest("start позже end")
+    return queries.day_start(first_day), queries.day_start(last_day + timedelta(days=1))
+
+
+@conditional_on_generation(shared=True)
+def flybys(request):
+    """Сближения за период: ?start=&end=&hazardous=1|0&fields=&cursor=&page_size=."""
+    try:
+        fields = select_fields(request, FLYBY_FIELDS)
+        start, end = date_range(request)
+        rows = Flyby.objects.filter(date__gte=start, date__lt=end)
+        hazardous = request.GET.get('hazardous')
+        if hazardous in ('1', '0'):
+            rows = rows.filter(is_hazardous=hazardous == '1')
+        payload = fetch_page(request, rows, fields, FLYBY_FIELDS, queries.FLYBY_ORDER)
+    except BadRequest as e:
+        return error(str(e))
+    return JsonResponse(payload)
+
+
+@conditional_on_generation(shared=True)
+def analytics(request):
+    """Гистограммы и процентили размеров, дистанций и скоростей за период: ?start=&end=."""
+    try:
+        start, end = date_range(request)
+    except BadRequest as e:
+        return error(str(e))
+    return JsonResponse(window_analytics(start, end))
+
+
+@conditional_on_generation(shared=True)
+def search(request):
+    """Автодополнение: астероиды по началу названия или NASA ID, ?q=2024 AB&limit=10."""
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return error('Нужен параметр q')
+    return JsonResponse({'results': search_asteroids(query, get_limit(request.GET.get('limit')))})
+
+
+@conditional_on_generation(shared=True)
+def asteroid_detail(request, nasa_id):
+    """Астероид по NASA ID со списком его сближений (поле flybys)."""
+    try:
+        fields = select_fields(request, ASTEROID_FIELDS, extra=['flybys'])
+    except BadRequest as e:
+        return error(str(e))
+
+    paths = [ASTEROID_FIELDS[name] for name in fields if name != 'flybys']
+    row = Asteroid.objects.filter(nasa_id=nasa_id).values('id', *paths).first()
+    if row is None:
+        return error('Астероид не найден', status=404)
+
+    data = {name: row[ASTEROID_FIELDS[name]] for name in fields if name != 'flybys'}
+    if 'flybys' in fields:
+        # ?archived=1 — вместе со сближениями, перенесёнными в архив
+        data['flybys'] = list(across_tiers(
+            lambda model: model.objects.filter(asteroid_id=row['id']).values(*ASTEROID_FLYBY_FIELDS),
+            archived=request.GET.get('archived') == '1',
+        ).order_by('date'))
+    return JsonResponse(data)
+
+
+def private_response(request, payload):
+    """
+    Ответ с данными пользователя.
+
+    Такие данные меняются без загрузки, поэтому поколение для ETag не
+    подходит: ETag считается по телу ответа, 304 экономит только передачу.
+    """
+    response = JsonResponse(payload)
+    etag = quote_etag(hashlib.md5(response.content).hexdigest())
+    response = get_conditional_response(request, etag=etag, response=response)
+    response.headers['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def watchlist(request):
+    """Список отслеживания текущего пользователя."""
+    if not request.user.is_authenticated:
+        return error('Требуется вход', status=401)
+    try:
+        fields = select_fields(request, WATCHLIST_FIELDS)
+        items = Watchlist.objects.filter(user=request.user)
+        payload = fetch_page(request, items, fields, WATCHLIST_FIELDS, queries.WATCHLIST_ORDER)
+    except BadRequest as e:
+        return error(str(e))
+    return private_response(request, payload)
+
+
+def watchlist_history(request):
+    """
+    Прошедшие сближения астероидов из списка пользователя, последние первыми:
+    ?fields=&limit=&archived=1 (вместе с архивом за пределами горизонта хранения).
+    """
+    if not request.user.is_authenticated:
+        return error('Требуется вход', status=401)
+    try:
+        fields = select_fields(request, HISTORY_FIELDS)
+    except BadRequest as e:
+        return error(str(e))
+    limit = get_page_size(request.GET.get('limit'))
+    paths = list(dict.fromkeys([*(HISTORY_FIELDS[name] for name in fields), *(f.lstrip('-') for f in HISTORY_ORDER)]))
+    asteroid_ids = Watchlist.objects.filter(user=request.user).values('asteroid_id')
+    now = timezone.now()
+    rows = across_tiers(
+        lambda model: model.objects.filter(asteroid_id__in=asteroid_ids, date__lt=now).values(*paths),
+        archived=request.GET.get('archived') == '1',
+    ).order_by(*HISTORY_ORDER)[:limit]
+    results = [{name: row[HISTORY_FIELDS[name]] for name in fields} for row in rows]
+    return private_response(request, {'results': results})
@@ -1,5 +1,15 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from .metrics import install_query_timer
+        connection_created.connect(install_query_timer, dispatch_uid='core.metrics.query_timer')
+        from .db import apply_sqlite_pragmas
+        connection_created.connect(apply_sqlite_pragmas, dispatch_uid='core.db.sqlite_pragmas')
+        from .search import ensure_index_after_migrate
+        post_migrate.connect(ensure_index_after_migrate, sender=self, dispatch_uid='core.search.ensure_index')
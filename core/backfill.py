@@ -0,0 +1,317 @@
+"""Параллельная загрузка истории фида NeoWs по окнам дат с контрольными точками."""
+import asyncio
+import logging
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from .client import NeoWsClientError
+from .ingest import IngestResult, content_hash, ingest_records, normalize_items
+from .models import FeedWindow
+from .services import NASANeoWsService
+from .stream import FeedStreamParser, iter_bytes
+
+logger = logging.getLogger(__name__)
+
+# Фид принимает диапазон не длиннее 7 дней между start_date и end_date
+FEED_WINDOW_DAYS = 7
+
+
+class RateLimitExhausted(Exception):
+    """У всех ключей из пула закончилась квота запросов."""
+
+
+class FeedRequestError(Exception):
+    """API вернул ошибку для окна дат."""
+
+
+def split_windows(start_date, end_date, days=FEED_WINDOW_DAYS):
+    """Разбивает диапазон [start_date, end_date] на окна, допустимые для фида."""
+    windows = []
+    window_start = start_date
+    while window_start <= end_date:
+        window_end = min(window_start + timedelta(days=days), end_date)
+        windows.append((window_start, window_end))
+        window_start = window_end + timedelta(days=1)
+    return windows
+
+
+class ApiKeyPool:
+    """
+    Потокобезопасный пул API-ключей.
+
+    Каждый запрос получает ключ с наибольшим остатком квоты по последнему
+    заголовку X-RateLimit-Remaining; ключи с остатком не выше reserve не выдаются.
+    """
+
+    def __init__(self, keys, reserve=None):
+        if not keys:
+            raise ValueError("Пул API-ключей пуст")
+        self.reserve = getattr(settings, 'NASA_RATE_LIMIT_RESERVE', 0) if reserve is None else reserve
+        self._remaining = {key: None for key in keys}
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            available = [
+                (remaining if remaining is not None else float('inf'), key)
+                for key, remaining in self._remaining.items()
+                if remaining is None or remaining > self.reserve
+            ]
+            if not available:
+                raise RateLimitExhausted("Квота исчерпана для всех API-ключей")
+            remaining, key = max(available, key=lambda item: item[0])
+            if remaining != float('inf'):
+                # Резервируем запрос до прихода заголовков, чтобы потоки не выбрали один и тот же ключ
+                self._remaining[key] = remaining - 1
+            return key
+
+    def update(self, key, headers):
+        value = headers.get('X-RateLimit-Remaining')
+        if value is None:
+            return
+        try:
+            remaining = int(value)
+        except ValueError:
+            return
+        with self._lock:
+            self._remaining[key] = remaining
+
+    def exhaust(self, key):
+        with self._lock:
+            self._remaining[key] = 0
+
+    def remaining(self):
+        with self._lock:
+            return dict(self._remaining)
+
+
+def fetch_window(window, key_pool):
+    """
+    Загружает одно окно, переключая ключ при ответе 429.
+
+    Тело читается целиком (response.content): окно загружается в потоке
+    пула, а разбирается и пишется в вызывающем потоке после сравнения хэша,
+    так что до записи ответ всё равно держится в памяти. Объём одного окна
+    в 7 дней невелик; FeedStreamParser затем идёт по нему кусками, не
+    собирая дерево JSON.
+
+    Returns:
+        bytes: тело ответа
+    """
+    start_date, end_date = window
+    while True:
+        api_key = key_pool.acquire()
+        response = NASANeoWsService.request_feed(start_date, end_date, api_key=api_key)
+        key_pool.update(api_key, response.headers)
+        if response.status_code == 429:
+            key_pool.exhaust(api_key)
+            continue
+        if response.status_code != 200:
+            raise FeedRequestError(f"{start_date} - {end_date}: HTTP {response.status_code}")
+        return response.content
+
+
+async def afetch_window(client, window, key_pool):
+    """Асинхронный вариант fetch_window через AsyncNeoWsClient; тело так же читается целиком."""
+    start_date, end_date = window
+    while True:
+        api_key = key_pool.acquire()
+        response = await client.get_feed(start_date, end_date, api_key)
+        key_pool.update(api_key, response.headers)
+        if response.status_code == 429:
+            key_pool.exhaust(api_key)
+            continue
+        if response.status_code != 200:
+            raise FeedRequestError(f"{start_date} - {end_date}: HTTP {response.status_code}")
+        return response.content
+
+
+def window_states(windows):
+    """Сохранённые состояния окон из списка: (start_date, end_date) -> FeedWindow."""
+    if not windows:
+        return {}
+    starts = [start for start, _ in windows]
+    return {
+        (state.start_date, state.end_date): state
+        for state in FeedWindow.objects.filter(start_date__gte=min(starts), start_date__lte=max(starts))
+    }
+
+
+def get_freshness():
+    """Сколько окно считается свежим после последней проверки."""
+    return timedelta(seconds=getattr(settings, 'NASA_SYNC_FRESHNESS', 600))
+
+
+def stale_windows(windows, states, max_age=None, now=None):
+    """
+    Окна, которые нужно запросить заново.
+
+    Args:
+        windows: Список окон (start_date, end_date)
+        states: Результат window_states()
+        max_age: timedelta; окна, проверенные позже now - max_age, пропускаются.
+            None означает, что пропускается любое уже загруженное окно (контрольная точка).
+    """
+    now = now or timezone.now()
+    result = []
+    for window in windows:
+        state = states.get(window)
+        if state is None:
+            result.append(window)
+        elif max_age is not None and (state.fetched_at or state.completed_at) < now - max_age:
+            result.append(window)
+    return result
+
+
+def save_window(window, body, batch_size=None, stats=None, known_hash=None):
+    """
+    Сохраняет окно короткими транзакциями по пакетам и затем отмечает его
+    загруженным: прерванное окно остаётся неотмеченным и загрузится заново.
+
+    Тело ответа разбирается и нормализуется один раз, без обращения к базе:
+    по этим записям считается хэш содержимого, и они же пишутся. Если хэш
+    совпал с сохранённым known_hash, запись пропускается и обновляется только
+    время проверки окна. Записи окна в 7 дней держатся в памяти целиком —
+    хэш не зависит от порядка астероидов и готов только после разбора всего окна.
+    """
+    start_date, end_date = window
+    now = timezone.now()
+    parser = FeedStreamParser(iter_bytes(body))
+    records = normalize_items(stats.meter('parse', parser) if stats else parser)
+    if stats:
+        records = stats.meter('normalize', records, upstream='parse')
+    records = list(records)
+    window_hash = content_hash(records)
+    if known_hash is not None and window_hash == known_hash:
+        FeedWindow.objects.filter(start_date=start_date, end_date=end_date).update(fetched_at=now)
+        return IngestResult()
+
+    result = ingest_records(records, batch_size=batch_size, stats=stats)
+    FeedWindow.objects.update_or_create(
+        start_date=start_date,
+        end_date=end_date,
+        defaults={
+            'asteroid_count': parser.meta.get('element_count', 0),
+            'content_hash': window_hash,
+            'completed_at': now,
+            'fetched_at': now,
+        },
+    )
+    return result
+
+
+def run_backfill(windows, workers=None, key_pool=None, batch_size=None, on_window=None, stats=None,
+                 known_hashes=None):
+    """
+    Загружает окна пулом потоков; запись в базу выполняется в вызывающем потоке.
+
+    Одновременно в работе не больше workers окон. При исчерпании квоты новые
+    окна не запускаются, уже начатые дописываются, затем поднимается RateLimitExhausted.
+
+    Args:
+        windows: Список окон (start_date, end_date)
+        workers: Размер пула потоков (по умолчанию NASA_FETCH_WORKERS)
+        key_pool: ApiKeyPool (по умолчанию из NASA_API_KEYS)
+        batch_size: Размер пакета для записи в базу
+        on_window: Колбэк on_window(window, result, error) после каждого окна
+        stats: PipelineStats для учёта пропускной способности стадий
+        known_hashes: Словарь окно -> сохранённый хэш содержимого; неизменившиеся окна не пишутся
+    """
+    workers = workers or getattr(settings, 'NASA_FETCH_WORKERS', 4)
+    key_pool = key_pool or ApiKeyPool(NASANeoWsService.get_api_keys())
+    known_hashes = known_hashes or {}
+    pending = iter(windows)
+    exhausted = None
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        in_flight = {}
+
+        def submit_next():
+            window = next(pending, None)
+            if window is not None:
+                in_flight[executor.submit(fetch_window, window, key_pool)] = window
+            return window is not None
+
+        for _ in range(workers):
+            if not submit_next():
+                break
+
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                window = in_flight.pop(future)
+                result = error = None
+                try:
+                    result = save_window(
+                        window, future.result(), batch_size=batch_size, stats=stats,
+                        known_hash=known_hashes.get(window),
+                    )
+                except RateLimitExhausted as e:
+                    exhausted = e
+                    error = e
+                except (FeedRequestError, NeoWsClientError, ValueError, OSError) as e:
+                    logger.warning("Окно %s - %s не загружено: %s", window[0], window[1], e)
+                    error = e
+                if on_window:
+                    on_window(window, result, error)
+                if exhausted is None:
+                    submit_next()
+
+    if exhausted is not None:
+        raise exhausted
+
+
+async def arun_backfill(windows, workers=None, key_pool=None, batch_size=None, on_window=None, stats=None,
+                        known_hashes=None, client=None):
+    """
+    Асинхронный вариант run_backfill: окна запрашиваются в одном цикле событий.
+
+    Одновременно выполняется не больше workers запросов, потоков под них не
+    создаётся. Запись в базу идёт через sync_to_async(thread_sensitive=True),
+    то есть по очереди в одном потоке, как и в синхронном варианте.
+
+    Args:
+        client: AsyncNeoWsClient; без него создаётся и закрывается временный
+        Остальные аргументы — как у run_backfill.
+    """
+    if client is None:
+        async with NASANeoWsService.async_client() as client:
+            return await arun_backfill(
+                windows, workers, key_pool, batch_size, on_window, stats, known_hashes, client=client,
+            )
+
+    workers = workers or getattr(settings, 'NASA_FETCH_WORKERS', 4)
+    key_pool = key_pool or ApiKeyPool(NASANeoWsService.get_api_keys())
+    known_hashes = known_hashes or {}
+    semaphore = asyncio.Semaphore(workers)
+    save = sync_to_async(save_window, thread_sensitive=True)
+    exhausted = None
+
+    async def process(window):
+        nonlocal exhausted
+        async with semaphore:
+            if exhausted is not None:
+                return
+            result = error = None
+            try:
+                body = await afetch_window(client, window, key_pool)
+                result = await save(
+                    window, body, batch_size=batch_size, stats=stats, known_hash=known_hashes.get(window),
+                )
+            except RateLimitExhausted as e:
+                exhausted = e
+                error = e
+            except (FeedRequestError, NeoWsClientError, ValueError, OSError) as e:
+                logger.warning("Окно %s - %s не загружено: %s", window[0], window[1], e)
+                error = e
+            if on_window:
+                on_window(window, result, error)
+
+    await asyncio.gather(*(process(window) for window in windows))
+    if exhausted is not None:
+        raise exhausted
@@ -0,0 +1,211 @@
+"""Синтетические данные и замеры для manage.py bench.
+
+Генератор строит фид в формате NeoWs, поэтому загрузка меряется тем же
+путём, что и в рабочем режиме (process_and_save_data). Страницы меряются
+тестовым клиентом Django: задержка каждого запроса и число SQL-запросов.
+"""
+import math
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Asteroid, Watchlist
+from .services import NASANeoWsService
+from .watchlist import refresh_next_approaches
+
+# Дни истории до и после сегодняшнего: окно главной страницы и списка отслеживания попадает внутрь
+HISTORY_DAYS = 60
+FUTURE_DAYS = 30
+
+
+def estimated_diameter_m(magnitude, albedo):
+    """Диаметр по абсолютной величине и альбедо, как в оценке NeoWs: D = 1329 км / √p · 10^(−H/5)."""
+    return round(1329e3 / math.sqrt(albedo) * 10 ** (-magnitude / 5), 3)
+
+
+def synthetic_asteroid(index, rng):
+    """Объект астероида фида NeoWs без close_approach_data."""
+    nasa_id = str(2_000_000 + index)
+    magnitude = round(rng.uniform(15, 30), 2)
+    return {
+        'id': nasa_id,
+        'name': f'({2000 + index % 30} {chr(65 + index % 26)}{chr(65 + index // 26 % 26)}{index})',
+        'absolute_magnitude_h': magnitude,
+        'estimated_diameter': {'meters': {
+            'estimated_diameter_min': estimated_diameter_m(magnitude, 0.25),
+            'estimated_diameter_max': estimated_diameter_m(magnitude, 0.05),
+        }},
+        'is_potentially_hazardous_asteroid': rng.random() < 0.1,
+        'nasa_jpl_url': f'https://ssd.jpl.nasa.gov/?sstr={nasa_id}',
+    }
+
+
+def synthetic_approach(day, rng):
+    """Запись close_approach_data на день day со случайными временем, скоростью и дистанцией."""
+    return {
+        'close_approach_date': day.strftime('%Y-%m-%d'),
+        'close_approach_date_full': f"{day.strftime('%Y-%b-%d')} {rng.randrange(24):02d}:{rng.randrange(60):02d}",
+        'relative_velocity': {'kilometers_per_second': f'{rng.uniform(2, 40):.4f}'},
+        'miss_distance': {'kilometers': f'{rng.uniform(1e5, 7e7):.1f}'},
+    }
+
+
+def synthetic_feed(asteroids=1000, flybys_per_asteroid=3, seed=0, today=None):
+    """
+    Фид NeoWs со случайными, но воспроизводимыми сближениями.
+
+    Сближения астероида разбросаны по дням от today - HISTORY_DAYS до
+    today + FUTURE_DAYS; каждый день фида — отдельный ключ near_earth_objects.
+    """
+    rng = random.Random(seed)
+    today = today or timezone.localdate()
+    days = HISTORY_DAYS + FUTURE_DAYS
+    feed = {}
+    for i in range(asteroids):
+        asteroid = synthetic_asteroid(i, rng)
+        for offset in rng.sample(range(days), min(flybys_per_asteroid, days)):
+            day = today + timedelta(days=offset - HISTORY_DAYS)
+            feed.setdefault(day.strftime('%Y-%m-%d'), []).append({
+                **asteroid,
+                'close_approach_data': [synthetic_approach(day, rng)],
+            })
+    return {'element_count': sum(map(len, feed.values())), 'near_earth_objects': feed}
+
+
+def create_users(users=10, watchlist_per_user=20, seed=0):
+    """Пользователи bench-N со случайными списками отслеживания из уже загруженных астероидов."""
+    rng = random.Random(seed)
+    asteroid_ids = list(Asteroid.objects.values_list('id', flat=True))
+    created = User.objects.bulk_create(
+        User(username=f'bench-{i}', email=f'bench-{i}@example.com', password='!') for i in range(users)
+    )
+    if not created or created[0].pk is None:
+        created = list(User.objects.filter(username__startswith='bench-').order_by('id'))
+    Watchlist.objects.bulk_create(
+        (
+            Watchlist(user=user, asteroid_id=asteroid_id)
+            for user in created
+            for asteroid_id in rng.sample(asteroid_ids, min(watchlist_per_user, len(asteroid_ids)))
+        ),
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+    # next_approach_at заполняется тем же UPDATE, что и после загрузки
+    refresh_next_approaches(Watchlist.objects.all())
+    return created
+
+
+def percentile(values, fraction):
+    """Перцентиль по ближайшему рангу: p95 из 20 замеров — 19-й по величине."""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(fraction * len(ordered)))
+    return ordered[rank - 1]
+
+
+def measure_ingest(feed):
+    """Время загрузки фида через process_and_save_data и скорость в строках сближений в секунду."""
+    rows = feed['element_count']
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        created = NASANeoWsService.process_and_save_data(feed)
+        seconds = time.perf_counter() - started
+    return {
+        'rows': rows,
+        'seconds': round(seconds, 4),
+        'rows_per_sec': round(rows / seconds, 1) if seconds else None,
+        'queries': len(queries),
+        'asteroids_created': created[0],
+        'flybys_created': created[1],
+    }
+
+
+def measure_view(client, url, repeat=20):
+    """
+    Задержка и число запросов страницы: первый («холодный») запрос отдельно,
+    p50/p95 по остальным repeat.
+    """
+    timings, query_counts = [], []
+    for _ in range(repeat + 1):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - started) * 1000)
+        if response.status_code != 200:
+            raise RuntimeError(f'{url}: код ответа {response.status_code}')
+        query_counts.append(len(queries))
+    warm = timings[1:]
+    return {
+        'url': url,
+        'cold_ms': round(timings[0], 2),
+        'p50_ms': round(statistics.median(warm), 2),
+        'p95_ms': round(percentile(warm, 0.95), 2),
+        'queries_cold': query_counts[0],
+        'queries': max(query_counts[1:]),
+    }
+
+
+def run_bench(asteroids=1000, flybys_per_asteroid=3, users=10, watchlist_per_user=20, repeat=20, seed=0):
+    """
+    Полный прогон на текущей базе: генерация, загрузка (первая и повторная),
+    главная страница анонимом и пользователем, список отслеживания.
+    """
+    feed = synthetic_feed(asteroids, flybys_per_asteroid, seed)
+    results = {
+        'params': {
+            'asteroids': asteroids,
+            'flybys_per_asteroid': flybys_per_asteroid,
+            'users': users,
+            'watchlist_per_user': watchlist_per_user,
+            'repeat': repeat,
+            'seed': seed,
+        },
+        'database': connection.vendor,
+        'ingest': {
+            'initial': measure_ingest(feed),
+            # Повтор того же фида: путь обновления без изменений
+            'repeat': measure_ingest(feed),
+        },
+    }
+    bench_users = create_users(users, watchlist_per_user, seed)
+
+    client = Client()
+    index_url = reverse('core:index')
+    views = {'index': measure_view(client, index_url, repeat)}
+    client.force_login(bench_users[0])
+    views['index_authenticated'] = measure_view(client, index_url, repeat)
+    views['watchlist'] = measure_view(client, reverse('core:watchlist'), repeat)
+    results['views'] = views
+    return results
+
+
+def flatten(results, prefix=''):
+    """Числовые метрики результатов в виде {'views.index.p50_ms': ...} для сравнения."""
+    metrics = {}
+    for key, value in results.items():
+        if key == 'params':
+            continue
+        name = f'{prefix}{key}'
+        if isinstance(value, dict):
+            metrics.update(flatten(value, f'{name}.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            metrics[name] = value
+    return metrics
+
+
+def compare(baseline, current):
+    """Строки (метрика, было, стало, изменение в процентах) по общим метрикам двух прогонов."""
+    before, after = flatten(baseline), flatten(current)
+    rows = []
+    for name in sorted(before.keys() & after.keys()):
+        old, new = before[name], after[name]
+        change = (new - old) / old * 100 if old else None
+        rows.append((name, old, new, change))
+    return rows
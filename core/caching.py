@@ -0,0 +1,129 @@
+"""Поколение данных и HTTP-кэширование страниц, которые меняются только после загрузки."""
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .models import DataGeneration
+from .queries import day_start
+
+GENERATION_CACHE_KEY = 'core:data-generation'
+GENERATION_PK = 1
+
+
+def get_generation():
+    """
+    Текущее поколение данных: (номер, время изменения).
+
+    Значение держится в кэше NASA_GENERATION_CACHE_SECONDS секунд, так что
+    при общем кэше (Redis, memcached) проверка не обращается к базе вовсе.
+    """
+    generation = cache.get(GENERATION_CACHE_KEY)
+    if generation is None:
+        row = DataGeneration.objects.filter(pk=GENERATION_PK).values_list('value', 'changed_at').first()
+        generation = row or (0, None)
+        cache.set(GENERATION_CACHE_KEY, generation, getattr(settings, 'NASA_GENERATION_CACHE_SECONDS', 5))
+    return generation
+
+
+async def aget_generation():
+    """Асинхронный вариант get_generation."""
+    generation = await cache.aget(GENERATION_CACHE_KEY)
+    if generation is None:
+        row = await DataGeneration.objects.filter(pk=GENERATION_PK).values_list('value', 'changed_at').afirst()
+        generation = row or (0, None)
+        await cache.aset(GENERATION_CACHE_KEY, generation, getattr(settings, 'NASA_GENERATION_CACHE_SECONDS', 5))
+    return generation
+
+
+def bump_generation():
+    """Увеличивает поколение данных; кэш сбрасывается после фиксации транзакции."""
+    now = timezone.now()
+    updated = DataGeneration.objects.filter(pk=GENERATION_PK).update(value=F('value') + 1, changed_at=now)
+    if not updated:
+        DataGeneration.objects.get_or_create(pk=GENERATION_PK, defaults={'value': 1, 'changed_at': now})
+    transaction.on_commit(lambda: cache.delete(GENERATION_CACHE_KEY))
+
+
+def generation_etag(request, generation):
+    """ETag из поколения, текущего дня, пути и параметров запроса."""
+    params = '&'.join(f'{key}={value}' for key, value in sorted(request.GET.lists()))
+    key = f'{generation}:{timezone.localdate()}:{request.path}:{params}'
+    return quote_etag(hashlib.md5(key.encode()).hexdigest())
+
+
+def _validators(request, generation, changed_at):
+    etag = generation_etag(request, generation)
+    # Окно страницы сдвигается в полночь, даже если данные не менялись
+    last_modified = max(filter(None, [changed_at, day_start(timezone.localdate())]))
+    return etag, int(last_modified.timestamp())
+
+
+def _patch_validated(response, etag, last_modified, personal):
+    if response.status_code in (200, 304):
+        response.headers['ETag'] = etag
+        response.headers['Last-Modified'] = http_date(last_modified)
+        max_age = getattr(settings, 'NASA_PAGE_MAX_AGE', 60)
+        if personal:
+            patch_cache_control(response, private=True, max_age=max_age)
+        else:
+            patch_cache_control(response, public=True, max_age=max_age)
+    return response
+
+
+def conditional_on_generation(view=None, *, shared=False):
+    """
+    Условный GET по поколению данных.
+
+    ETag и Last-Modified вычисляются до вызова представления, поэтому повторный
+    запрос с If-None-Match получает 304 без запросов к таблицам данных.
+    Cache-Control: public позволяет обратному прокси отдавать страницу сам.
+    Для вошедших пользователей страница зависит от их списка отслеживания и
+    сообщений, поэтому она помечается private и отдаётся без валидаторов.
+    С shared=True ответ не зависит от пользователя (JSON API): валидаторы
+    отдаются всем, а для вошедших ответ помечается private.
+    Асинхронные представления оборачиваются асинхронно.
+    """
+    if view is None:
+        return lambda view: conditional_on_generation(view, shared=shared)
+
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            personal = (await request.auser()).is_authenticated
+            if request.method not in ('GET', 'HEAD') or (personal and not shared):
+                response = await view(request, *args, **kwargs)
+                patch_cache_control(response, private=True, no_cache=True)
+                return response
+
+            etag, last_modified = _validators(request, *await aget_generation())
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+            return _patch_validated(response, etag, last_modified, personal)
+
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        personal = request.user.is_authenticated
+        if request.method not in ('GET', 'HEAD') or (personal and not shared):
+            response = view(request, *args, **kwargs)
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+
+        etag, last_modified = _validators(request, *get_generation())
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = view(request, *args, **kwargs)
+        return _patch_validated(response, etag, last_modified, personal)
+
+    return wrapper
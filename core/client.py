@@ -0,0 +1,335 @@
+"""HTTP-клиент NASA NeoWs: пул соединений, повторы с backoff и ограничение частоты запросов."""
+import asyncio
+import logging
+import random
+import statistics
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.utils import timezone
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+# Сколько последних задержек хранить для перцентилей
+LATENCY_WINDOW = 1000
+
+
+class NeoWsClientError(Exception):
+    """Запрос к NeoWs не удался после всех повторов."""
+
+
+class TokenBucket:
+    """
+    Клиентский лимитер по алгоритму token bucket.
+
+    Ёмкость и скорость пополнения подстраиваются под заголовки X-RateLimit-Limit
+    и X-RateLimit-Remaining: токенов никогда не больше, чем остаток квоты на сервере.
+    Сам лимитер не ждёт: reserve() возвращает задержку, а клиент выдерживает её
+    через time.sleep или asyncio.sleep перед каждым запросом (в том числе
+    NASANeoWsService.request_feed).
+    """
+
+    def __init__(self, limit, period):
+        self.period = period
+        self.capacity = float(limit)
+        self.rate = limit / period
+        self.tokens = float(limit)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self):
+        """Забирает токен и возвращает, сколько секунд нужно подождать до его появления."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def adjust(self, headers):
+        try:
+            limit = int(headers['X-RateLimit-Limit'])
+        except (KeyError, ValueError):
+            limit = None
+        try:
+            remaining = int(headers['X-RateLimit-Remaining'])
+        except (KeyError, ValueError):
+            remaining = None
+        with self._lock:
+            self._refill(time.monotonic())
+            if limit:
+                self.capacity = float(limit)
+                self.rate = limit / self.period
+            if remaining is not None:
+                self.tokens = min(self.tokens, float(remaining))
+
+
+@dataclass
+class ClientStats:
+    """Счётчики клиента: запросы, повторы, ошибки и задержки отдельных вызовов."""
+    requests: int = 0
+    retries: int = 0
+    failures: int = 0
+    throttled_seconds: float = 0.0
+    latencies: deque = field(default_factory=lambda: deque(maxlen=LATENCY_WINDOW))
+    rate_limit_remaining: dict = field(default_factory=dict)
+
+    def percentile(self, q):
+        if not self.latencies:
+            return None
+        if len(self.latencies) == 1:
+            return self.latencies[0]
+        return statistics.quantiles(self.latencies, n=100, method='inclusive')[q - 1]
+
+    def summary(self):
+        return {
+            'requests': self.requests,
+            'retries': self.retries,
+            'failures': self.failures,
+            'throttled_seconds': round(self.throttled_seconds, 3),
+            'latency_p50': self.percentile(50),
+            'latency_p95': self.percentile(95),
+        }
+
+
+def parse_retry_after(value):
+    """Значение Retry-After в секундах (число секунд или HTTP-дата)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - timezone.now()).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class BaseNeoWsClient:
+    """
+    Общая часть синхронного и асинхронного клиентов: настройки, лимитеры по
+    ключам, расчёт задержек и учёт статистики.
+
+    Ответы 429/5xx и сетевые ошибки повторяются с экспоненциальной задержкой
+    и полным jitter; Retry-After от сервера имеет приоритет. Ответ 429 с нулевым
+    X-RateLimit-Remaining не повторяется: квота ключа исчерпана до конца периода.
+    """
+
+    def __init__(self, base_url=None, timeout=None, max_retries=None, backoff_base=None,
+                 backoff_max=None, pool_size=None, rate_limit=None, rate_period=None):
+        self.base_url = base_url or getattr(settings, 'NASA_NEO_API_URL', 'https://api.nasa.gov/neo/rest/v1/feed')
+        self.timeout = timeout or getattr(settings, 'NASA_HTTP_TIMEOUT', (3.05, 30))
+        self.max_retries = getattr(settings, 'NASA_HTTP_MAX_RETRIES', 4) if max_retries is None else max_retries
+        self.backoff_base = backoff_base or getattr(settings, 'NASA_HTTP_BACKOFF_BASE', 0.5)
+        self.backoff_max = backoff_max or getattr(settings, 'NASA_HTTP_BACKOFF_MAX', 30.0)
+        self.rate_limit = rate_limit or getattr(settings, 'NASA_RATE_LIMIT_PER_HOUR', 1000)
+        self.rate_period = rate_period or 3600
+        self.pool_size = pool_size or getattr(settings, 'NASA_FETCH_WORKERS', 4)
+        self.stats = ClientStats()
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, api_key):
+        with self._lock:
+            if api_key not in self._buckets:
+                self._buckets[api_key] = TokenBucket(self.rate_limit, self.rate_period)
+            return self._buckets[api_key]
+
+    def backoff(self, attempt, response=None):
+        """Задержка перед повтором номер attempt (с нуля)."""
+        if response is not None:
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            if retry_after is not None:
+                return min(retry_after, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _record(self, latency, retried=False, failed=False):
+        outcome = 'failed' if failed else 'retried' if retried else 'ok'
+        metrics.NEOWS_DURATION.observe(latency, outcome=outcome)
+        with self._lock:
+            self.stats.requests += 1
+            self.stats.latencies.append(latency)
+            if retried:
+                self.stats.retries += 1
+            if failed:
+                self.stats.failures += 1
+
+    def _throttle(self, bucket):
+        """Забирает токен ключа; возвращает задержку до него (её выдерживает вызывающий)."""
+        delay = bucket.reserve()
+        if delay > 0:
+            with self._lock:
+                self.stats.throttled_seconds += delay
+        return delay
+
+    @staticmethod
+    def feed_params(start_date, end_date, api_key):
+        return {
+            'start_date': start_date.strftime('%Y-%m-%d'),
+            'end_date': end_date.strftime('%Y-%m-%d'),
+            'api_key': api_key,
+        }
+
+    def _network_error(self, error, attempt, latency):
+        """
+        Учитывает сетевую ошибку.
+
+        Returns:
+            float: задержка перед повтором
+
+        Raises:
+            NeoWsClientError: повторы исчерпаны
+        """
+        if attempt >= self.max_retries:
+            self._record(latency, failed=True)
+            raise NeoWsClientError(f"Запрос к NASA API не удался: {error}") from error
+        self._record(latency, retried=True)
+        delay = self.backoff(attempt)
+        logger.info("Сетевая ошибка NeoWs (%s), повтор через %.1f с", error, delay)
+        return delay
+
+    def _response_retry(self, response, api_key, attempt, latency, bucket):
+        """
+        Учитывает ответ и решает, повторять ли запрос.
+
+        Returns:
+            float | None: задержка перед повтором или None, если ответ окончательный
+        """
+        bucket.adjust(response.headers)
+        remaining = response.headers.get('X-RateLimit-Remaining')
+        if remaining is not None:
+            with self._lock:
+                self.stats.rate_limit_remaining[api_key] = remaining
+            if remaining.isdigit():
+                metrics.NEOWS_RATE_LIMIT_REMAINING.set(int(remaining), key=metrics.key_label(api_key))
+
+        quota_exhausted = response.status_code == 429 and remaining == '0'
+        if response.status_code not in RETRY_STATUSES or quota_exhausted or attempt >= self.max_retries:
+            self._record(latency, failed=response.status_code >= 400)
+            return None
+
+        self._record(latency, retried=True)
+        delay = self.backoff(attempt, response)
+        logger.info("NeoWs ответил %s, повтор через %.1f с", response.status_code, delay)
+        return delay
+
+
+class NeoWsClient(BaseNeoWsClient):
+    """Клиент фида NeoWs с keep-alive сессией requests."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def get_feed(self, start_date, end_date, api_key):
+        """
+        Запрашивает фид за диапазон дат.
+
+        Returns:
+            requests.Response: последний ответ (в том числе с кодом ошибки, если повторы не помогли)
+
+        Raises:
+            NeoWsClientError: сетевая ошибка не прошла после всех повторов
+        """
+        params = self.feed_params(start_date, end_date, api_key)
+        bucket = self.bucket(api_key)
+        attempt = 0
+        while True:
+            waited = self._throttle(bucket)
+            if waited:
+                time.sleep(waited)
+
+            started = time.perf_counter()
+            try:
+                response = self.session.get(self.base_url, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                time.sleep(self._network_error(e, attempt, time.perf_counter() - started))
+                attempt += 1
+                continue
+
+            delay = self._response_retry(response, api_key, attempt, time.perf_counter() - started, bucket)
+            if delay is None:
+                return response
+            time.sleep(delay)
+            attempt += 1
+
+
+class AsyncNeoWsClient(BaseNeoWsClient):
+    """
+    Асинхронный клиент фида NeoWs на httpx.AsyncClient.
+
+    Ожидание лимитера и задержки повторов не блокируют цикл событий, поэтому
+    один процесс держит много одновременных запросов без потока на каждый.
+    Клиент привязан к циклу событий, в котором создан: используйте его как
+    асинхронный контекстный менеджер.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        timeout = self.timeout
+        if isinstance(timeout, tuple):
+            timeout = httpx.Timeout(timeout[1], connect=timeout[0])
+        self.session = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        await self.session.aclose()
+
+    async def get_feed(self, start_date, end_date, api_key):
+        """
+        Запрашивает фид за диапазон дат.
+
+        Returns:
+            httpx.Response: последний ответ (в том числе с кодом ошибки, если повторы не помогли)
+
+        Raises:
+            NeoWsClientError: сетевая ошибка не прошла после всех повторов
+        """
+        params = self.feed_params(start_date, end_date, api_key)
+        bucket = self.bucket(api_key)
+        attempt = 0
+        while True:
+            waited = self._throttle(bucket)
+            if waited:
+                await asyncio.sleep(waited)
+
+            started = time.perf_counter()
+            try:
+                response = await self.session.get(self.base_url, params=params)
+            except httpx.TransportError as e:
+                await asyncio.sleep(self._network_error(e, attempt, time.perf_counter() - started))
+                attempt += 1
+                continue
+
+            delay = self._response_retry(response, api_key, attempt, time.perf_counter() - started, bucket)
+            if delay is None:
+                return response
+            await asyncio.sleep(delay)
+            attempt += 1
@@ -0,0 +1,259 @@
+"""Столбцовый архив истории сближений в файлах NumPy с доступом через memmap.
+
+Каждый столбец — отдельный файл с сырыми значениями фиксированного типа,
+строки отсортированы по дате. Диапазон дат находится двоичным поиском по
+столбцу дат (np.searchsorted читает O(log n) страниц), а срез остальных
+столбцов — представление memmap: в память попадают только страницы
+запрошенного окна, база данных не нужна вовсе.
+
+Архив покрывает прошедшие дни до границы end (не включая её) и только
+данные NeoWs. Дописывание продолжает архив от end; сближения, изменённые в
+базе уже после архивации, попадают в архив при полной пересборке.
+
+Файлы каталога:
+
+* meta.json — версия, число строк, граница end, типы столбцов;
+* <столбец>.bin — значения столбца, little-endian;
+* asteroids.json — справочник астероидов, на который ссылается столбец asteroid.
+
+meta.json пишется последним и атомарно: байты сверх count, оставшиеся от
+прерванного дописывания, читатель не видит, а следующее дописывание
+обрезает.
+"""
+import json
+import logging
+import os
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from itertools import islice
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Flyby
+from .queries import day_start
+from .retention import across_tiers
+
+logger = logging.getLogger(__name__)
+
+VERSION = 1
+COLUMNS = {
+    # Unix-время сближения, секунды
+    'date': np.dtype('<i8'),
+    # Индекс строки asteroids.json
+    'asteroid': np.dtype('<i4'),
+    'velocity_kmh': np.dtype('<f8'),
+    'miss_distance_km': np.dtype('<f8'),
+    'is_hazardous': np.dtype('?'),
+}
+ASTEROID_FIELDS = ('nasa_id', 'name', 'absolute_magnitude', 'diameter_min_m', 'diameter_max_m')
+SOURCE_PATHS = ('date', 'velocity_kmh', 'miss_distance_km', 'is_hazardous', *(
+    f'asteroid__{name}' for name in ASTEROID_FIELDS
+))
+
+
+def get_archive_dir():
+    return Path(getattr(settings, 'NASA_ARCHIVE_DIR', settings.BASE_DIR / 'archive'))
+
+
+def get_chunk_size():
+    return getattr(settings, 'NASA_EXPORT_CHUNK_SIZE', 2000)
+
+
+def to_timestamp(moment):
+    return int(moment.timestamp())
+
+
+class ColumnarArchive:
+    """Открытый на чтение архив: столбцы — memmap длиной count."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path / 'meta.json', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        if self.meta.get('version') != VERSION:
+            raise ValueError(f"Неизвестная версия архива {self.meta.get('version')!r}")
+        with open(self.path / 'asteroids.json', encoding='utf-8') as f:
+            self.asteroids = json.load(f)
+        self.count = self.meta['count']
+        self.end = date.fromisoformat(self.meta['end']) if self.meta['end'] else None
+        self.columns = {name: self._open(name, dtype) for name, dtype in COLUMNS.items()}
+        # Оценка диаметра по строкам справочника, как в analytics.to_columns
+        bounds = np.array([row[3:5] for row in self.asteroids], dtype=float).reshape(-1, 2)
+        self.diameter_m = np.sqrt(bounds[:, 0] * bounds[:, 1])
+
+    def _open(self, name, dtype):
+        if not self.count:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(self.path / f'{name}.bin', dtype=dtype, mode='r', shape=(self.count,))
+
+    def __len__(self):
+        return self.count
+
+    def covers(self, start, end):
+        """Окно [start, end) целиком лежит в архивированных днях."""
+        return self.end is not None and end <= day_start(self.end)
+
+    def bounds(self, start=None, end=None):
+        """Индексы строк [first, last) окна дат двоичным поиском."""
+        dates = self.columns['date']
+        first = 0 if start is None else int(np.searchsorted(dates, to_timestamp(start), 'left'))
+        last = self.count if end is None else int(np.searchsorted(dates, to_timestamp(end), 'left'))
+        return first, max(first, last)
+
+    def window(self, start=None, end=None):
+        """Представления столбцов окна без копирования."""
+        first, last = self.bounds(start, end)
+        return {name: column[first:last] for name, column in self.columns.items()}
+
+    def analytics_columns(self, start, end):
+        """Столбцы окна в виде analytics.to_columns: распределения считаются без базы."""
+        window = self.window(start, end)
+        return {
+            'asteroid_id': np.asarray(window['asteroid'], dtype=np.int64),
+            'miss_distance_km': np.asarray(window['miss_distance_km']),
+            'velocity_kmh': np.asarray(window['velocity_kmh']),
+            'is_hazardous': np.asarray(window['is_hazardous']),
+            'diameter_m': self.diameter_m[window['asteroid']],
+        }
+
+    def export_rows(self, start=None, end=None, hazardous=None, chunk_size=None):
+        """
+        Кортежи значений export.EXPORT_COLUMNS в хронологическом порядке, пачками
+        по chunk_size строк: в памяти одновременно только одна пачка.
+
+        Args:
+            start, end: дни диапазона включительно (date), None — без границы
+            hazardous: True/False — только опасные/безопасные, None — все
+        """
+        chunk_size = chunk_size or get_chunk_size()
+        first, last = self.bounds(
+            day_start(start) if start else None,
+            day_start(end + timedelta(days=1)) if end else None,
+        )
+        columns = self.columns
+        for offset in range(first, last, chunk_size):
+            part = slice(offset, min(offset + chunk_size, last))
+            flags = columns['is_hazardous'][part]
+            keep = np.ones(len(flags), dtype=bool) if hazardous is None else flags == hazardous
+            values = zip(*(columns[name][part][keep].tolist() for name in (
+                'date', 'asteroid', 'is_hazardous', 'velocity_kmh', 'miss_distance_km',
+            )))
+            for timestamp, asteroid, is_hazardous, velocity, distance in values:
+                nasa_id, name, magnitude, _, _ = self.asteroids[asteroid]
+                yield (
+                    datetime.fromtimestamp(timestamp, tz=dt_timezone.utc), nasa_id, name, magnitude,
+                    is_hazardous, velocity, distance, Flyby.SOURCE_NEOWS,
+                )
+
+
+_opened = {}
+
+
+def get_archive(path=None):
+    """
+    Архив процесса или None, если он ещё не построен. Открытый архив
+    переиспользуется, пока не изменится его meta.json.
+    """
+    path = Path(path or get_archive_dir())
+    try:
+        stamp = os.stat(path / 'meta.json').st_mtime_ns
+    except FileNotFoundError:
+        return None
+    cached = _opened.get(path)
+    if cached is None or cached[0] != stamp:
+        cached = _opened[path] = (stamp, ColumnarArchive(path))
+    return cached[1]
+
+
+def _write_json(path, data):
+    temporary = path.with_suffix('.tmp')
+    with open(temporary, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(temporary, path)
+
+
+def _source_rows(start, end, chunk_size):
+    def build(model):
+        rows = model.objects.filter(date__lt=day_start(end), source=Flyby.SOURCE_NEOWS)
+        if start:
+            rows = rows.filter(date__gte=day_start(start))
+        return rows.values_list(*SOURCE_PATHS)
+
+    # История старше горизонта хранения лежит в архивной таблице (core.retention)
+    rows = across_tiers(build, archived=True).order_by('date', 'asteroid__nasa_id')
+    return rows.iterator(chunk_size=chunk_size)
+
+
+def append(until=None, path=None, rebuild=False, chunk_size=None):
+    """
+    Дописывает в архив сближения от его границы end до дня until (не включая,
+    по умолчанию — сегодня). rebuild строит архив заново со всей истории.
+
+    Returns:
+        int: число дописанных строк
+    """
+    path = Path(path or get_archive_dir())
+    until = until or timezone.localdate()
+    chunk_size = chunk_size or get_chunk_size()
+    path.mkdir(parents=True, exist_ok=True)
+
+    if rebuild:
+        # Открытые memmap прежних файлов (в том числе в других процессах) остаются
+        # на старых inode: файлы удаляются, а не обрезаются
+        _opened.pop(path, None)
+        for name in ('meta.json', *(f'{name}.bin' for name in COLUMNS)):
+            (path / name).unlink(missing_ok=True)
+    archive = None if rebuild else get_archive(path)
+    count = len(archive) if archive else 0
+    start = archive.end if archive else None
+    if start and until <= start:
+        return 0
+    asteroids = list(archive.asteroids) if archive else []
+    index = {row[0]: i for i, row in enumerate(asteroids)}
+
+    files = {}
+    try:
+        for name, dtype in COLUMNS.items():
+            files[name] = open(path / f'{name}.bin', 'r+b' if count else 'wb')
+            # Хвост прерванного дописывания обрезается до зафиксированного числа строк
+            files[name].truncate(count * dtype.itemsize)
+            files[name].seek(0, os.SEEK_END)
+
+        rows = _source_rows(start, until, chunk_size)
+        written = 0
+        while chunk := list(islice(rows, chunk_size)):
+            asteroid_rows = []
+            for row in chunk:
+                asteroid = row[4:]
+                if asteroid[0] not in index:
+                    index[asteroid[0]] = len(asteroids)
+                    asteroids.append(list(asteroid))
+                asteroid_rows.append(index[asteroid[0]])
+            dates, velocity, distance, hazardous = (
+                [row[k] for row in chunk] for k in range(4)
+            )
+            values = {
+                'date': [to_timestamp(moment) for moment in dates],
+                'asteroid': asteroid_rows,
+                'velocity_kmh': velocity,
+                'miss_distance_km': distance,
+                'is_hazardous': hazardous,
+            }
+            for name, dtype in COLUMNS.items():
+                files[name].write(np.asarray(values[name], dtype=dtype).tobytes())
+            written += len(chunk)
+    finally:
+        for f in files.values():
+            f.close()
+
+    _write_json(path / 'asteroids.json', asteroids)
+    _write_json(path / 'meta.json', {
+        'version': VERSION,
+        'count': count + written,
+        'end': until.isoformat(),
+        'columns': {name: dtype.str for name, dtype in COLUMNS.items()},
+    })
+    logger.info("Архив %s: дописано %s строк, граница %s", path, written, until)
+    return written
@@ -0,0 +1,147 @@
+"""Режим базы для загрузки под нагрузкой: прагмы SQLite и маршрутизация чтений.
+
+Прагмы ставятся на каждое новое соединение SQLite (connection_created):
+
+* journal_mode=WAL — читатели не ждут пишущую транзакцию, а видят последний
+  зафиксированный снимок;
+* busy_timeout — писатель, упёршийся в чужую блокировку, ждёт её вместо
+  немедленного «database is locked»;
+* synchronous=NORMAL — в WAL фиксация без fsync на каждую транзакцию,
+  короткие пакеты загрузки остаются дешёвыми.
+
+ReadWriteRouter отправляет чтения моделей core в псевдоним NASA_READ_DATABASE
+(второй файл SQLite или локальный Postgres), запись — в default. Чтения
+внутри открытой транзакции default идут туда же, где пишутся: загрузка и
+пересчёт сводок видят свои же строки. Файл-реплику SQLite обновляет
+copy_to_replica (manage.py sync_read_replica), а команды, меняющие данные
+(load_nasa, apply_retention, predict_flybys, import_orbits,
+drop_midnight_duplicates), вызывают его сами через sync_replica.
+"""
+import logging
+import sqlite3
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger(__name__)
+
+# Таблицы пользователей и служебные: их читают сразу после записи, реплика
+# с задержкой синхронизации вернула бы устаревшее
+PRIMARY_MODELS = frozenset({'watchlist', 'alertrule', 'alertdelivery', 'feedwindow', 'profilecapture'})
+
+
+def get_read_alias():
+    return getattr(settings, 'NASA_READ_DATABASE', None)
+
+
+def sqlite_pragmas():
+    """Прагмы из настроек; пустое значение — прагма не трогается."""
+    return [
+        (name, value) for name, value in (
+            ('journal_mode', getattr(settings, 'NASA_SQLITE_JOURNAL_MODE', 'wal')),
+            ('busy_timeout', getattr(settings, 'NASA_SQLITE_BUSY_TIMEOUT', 5000)),
+            ('synchronous', getattr(settings, 'NASA_SQLITE_SYNCHRONOUS', 'normal')),
+        )
+        if value not in ('', None)
+    ]
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """
+    Приёмник connection_created: прагмы на новое соединение SQLite.
+
+    Выполняются на сыром соединении sqlite3, мимо обёрток курсора: в
+    метрики и журнал запросов они не попадают.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    for name, value in sqlite_pragmas():
+        connection.connection.execute(f'PRAGMA {name} = {value}')
+    if connection.alias != DEFAULT_DB_ALIAS and connection.alias == get_read_alias():
+        # Реплика только для чтения: случайная запись в неё — ошибка, а не расхождение
+        connection.connection.execute('PRAGMA query_only = ON')
+
+
+class ReadWriteRouter:
+    """Чтения моделей core — в NASA_READ_DATABASE, запись и миграции — в default."""
+
+    def db_for_read(self, model, **hints):
+        alias = get_read_alias()
+        if not alias or model._meta.app_label != 'core' or model._meta.model_name in PRIMARY_MODELS:
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS if get_read_alias() else None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Строка из реплики и строка из default — одни и те же данные
+        aliases = {DEFAULT_DB_ALIAS, get_read_alias()}
+        if get_read_alias() and {obj1._state.db, obj2._state.db} <= aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db != DEFAULT_DB_ALIAS and db == get_read_alias():
+            return False
+        return None
+
+
+def replica_is_sqlite():
+    alias = get_read_alias()
+    return bool(alias) and connections[alias].vendor == 'sqlite' and connections[DEFAULT_DB_ALIAS].vendor == 'sqlite'
+
+
+def copy_to_replica():
+    """
+    Копирует основную базу SQLite в файл реплики онлайн-бэкапом sqlite3.
+
+    Копия пишется шагами по NASA_REPLICA_COPY_PAGES страниц с паузой
+    NASA_REPLICA_COPY_SLEEP секунд между ними через отдельное соединение с
+    файлом реплики. Между шагами основная база не заблокирована, и загрузка
+    пишет дальше (изменения из другого соединения перезапускают копирование).
+    Файл реплики заблокирован на запись до конца копирования: соединения
+    Django с ним открыты только на чтение и ждут блокировку не дольше busy_timeout.
+
+    Returns:
+        str: путь к файлу реплики
+    """
+    if not replica_is_sqlite():
+        raise ValueError('Копирование доступно только для реплики SQLite при основной базе SQLite')
+    source = connections[DEFAULT_DB_ALIAS]
+    if source.in_atomic_block:
+        # Бэкап ждал бы конца собственной транзакции соединения
+        raise ValueError('Копирование реплики внутри транзакции невозможно')
+    target = str(connections[get_read_alias()].settings_dict['NAME'])
+    source.ensure_connection()
+    destination = sqlite3.connect(target, timeout=getattr(settings, 'NASA_SQLITE_BUSY_TIMEOUT', 5000) / 1000)
+    pause = getattr(settings, 'NASA_REPLICA_COPY_SLEEP', 0.005)
+
+    def between_steps(status, remaining, total):
+        # Сам backup спит только при занятой базе; паузу между шагами держим сами
+        if remaining and pause:
+            time.sleep(pause)
+
+    try:
+        source.connection.backup(
+            destination, pages=getattr(settings, 'NASA_REPLICA_COPY_PAGES', 1024), progress=between_steps,
+        )
+    finally:
+        destination.close()
+    logger.info("Реплика %s обновлена", target)
+    return target
+
+
+def sync_replica():
+    """
+    Обновляет файл-реплику SQLite после изменения данных командой.
+
+    Реплики других баз следуют за основной сами, для них ничего не делается.
+
+    Returns:
+        str | None: путь к файлу реплики, если она обновлена
+    """
+    return copy_to_replica() if replica_is_sqlite() else None
@@ -0,0 +1,138 @@
+"""Живая лента главной страницы через Server-Sent Events.
+
+Соединение ждёт смены поколения данных, опрашивая get_generation (кэш, а не
+база). Изменения за поколение — сближения окна недели с updated_at позже
+прошлого поколения и сводка окна — считаются один раз на процесс и
+поколение и кладутся в кэш, так что тысяча открытых вкладок стоит один
+набор запросов на загрузку и опрос кэша раз в несколько секунд.
+
+Ленту держит только ASGI: под WSGI Django дочитывает асинхронный поток до
+конца, прежде чем отдать ответ, так что браузер не получил бы событий, а
+каждая вкладка заняла бы поток воркера на всю жизнь соединения.
+"""
+import asyncio
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateformat import format as format_date
+
+from . import queries
+from .aggregates import awindow_stats
+from .caching import aget_generation
+from .models import Flyby
+
+PAYLOAD_CACHE_KEY = 'core:live-payload:{previous}:{current}'
+# Поля сближения для строки таблицы главной страницы
+LIVE_FIELDS = {
+    'id': 'id',
+    'date': 'date',
+    'velocity_kmh': 'velocity_kmh',
+    'miss_distance_km': 'miss_distance_km',
+    'is_hazardous': 'is_hazardous',
+    'source': 'source',
+    'asteroid_id': 'asteroid_id',
+    'nasa_id': 'asteroid__nasa_id',
+    'name': 'asteroid__name',
+    'absolute_magnitude': 'asteroid__absolute_magnitude',
+    'nasa_jpl_url': 'asteroid__nasa_jpl_url',
+}
+
+
+def get_setting(name, default):
+    return getattr(settings, name, default)
+
+
+def live_feed_enabled(request):
+    """Лента включена (NASA_LIVE_FEED_ENABLED) и запрос обслуживает ASGI."""
+    return get_setting('NASA_LIVE_FEED_ENABLED', True) and isinstance(request, ASGIRequest)
+
+
+def format_event(event, data, event_id=None):
+    """Сообщение SSE: необязательный id, тип события и JSON в data."""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event}')
+    lines.append(f'data: {json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+async def changes_since(since, limit=None):
+    """
+    Изменения окна главной страницы после момента since.
+
+    Returns:
+        dict: {'flybys': [...], 'stats': {...}} или {'reload': True}, если
+            изменившихся строк больше limit и страницу проще перезагрузить
+    """
+    limit = limit or get_setting('NASA_LIVE_MAX_ROWS', 200)
+    today, week_end, start, end = queries.window_bounds(queries.WEEK_DAYS)
+    rows = Flyby.objects.filter(date__gte=start, date__lt=end)
+    if since is not None:
+        rows = rows.filter(updated_at__gt=since)
+    rows = rows.order_by(*queries.FLYBY_ORDER).values(*LIVE_FIELDS.values())[:limit + 1]
+
+    flybys = []
+    async for row in rows:
+        flyby = {name: row[path] for name, path in LIVE_FIELDS.items()}
+        # Дата в часовом поясе сервера, как в шаблоне: строки сравниваются с data-date таблицы
+        local = timezone.localtime(flyby['date'])
+        flyby['date'] = local.isoformat()
+        flyby['date_display'] = format_date(local, 'd.m.Y H:i')
+        flybys.append(flyby)
+    if len(flybys) > limit:
+        return {'reload': True}
+    return {'flybys': flybys, 'stats': await awindow_stats(today, week_end)}
+
+
+async def generation_payload(previous, current):
+    """Изменения между поколениями (номер, время), общие для всех соединений процесса."""
+    key = PAYLOAD_CACHE_KEY.format(previous=previous[0], current=current[0])
+    payload = await cache.aget(key)
+    if payload is None:
+        payload = await changes_since(previous[1])
+        await cache.aset(key, payload, get_setting('NASA_LIVE_PAYLOAD_TTL', 600))
+    return payload
+
+
+async def live_events(last_event_id=None, poll=None, lifetime=None, heartbeat=None):
+    """
+    Поток сообщений SSE для одного соединения.
+
+    id сообщения — номер поколения: переподключившийся браузер присылает его
+    в Last-Event-ID, и если данные успели смениться, получает reload.
+    Через lifetime секунд поток закрывается, браузер переподключается сам.
+    """
+    poll = poll or get_setting('NASA_LIVE_POLL_SECONDS', 3)
+    lifetime = lifetime or get_setting('NASA_LIVE_LIFETIME_SECONDS', 300)
+    heartbeat = heartbeat or get_setting('NASA_LIVE_HEARTBEAT_SECONDS', 20)
+
+    seen = await aget_generation()
+    yield f'retry: {int(poll * 1000)}\n\n'
+    if last_event_id is not None and last_event_id != str(seen[0]):
+        yield format_event('reload', {}, seen[0])
+    else:
+        yield format_event('hello', {'generation': seen[0]}, seen[0])
+
+    started = last_beat = time.monotonic()
+    while time.monotonic() - started < lifetime:
+        await asyncio.sleep(poll)
+        current = await aget_generation()
+        if current[0] != seen[0]:
+            payload = await generation_payload(seen, current)
+            if payload.get('reload'):
+                yield format_event('reload', {}, current[0])
+            else:
+                yield format_event('flybys', payload['flybys'], current[0])
+                yield format_event('stats', payload['stats'], current[0])
+            seen = current
+            last_beat = time.monotonic()
+        elif time.monotonic() - last_beat >= heartbeat:
+            # Комментарий не доходит до страницы, но держит соединение через прокси
+            yield ': ping\n\n'
+            last_beat = time.monotonic()
@@ -0,0 +1,125 @@
+"""Потоковая выгрузка истории сближений в CSV и NDJSON.
+
+Строки читаются курсором базы через iterator(chunk_size), форматируются и
+сжимаются по мере чтения: память не зависит от размера выгрузки.
+"""
+import csv
+import json
+import zlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Flyby
+from .queries import FLYBY_ORDER, day_start
+from .retention import across_tiers
+from .stream import CHUNK_SIZE
+
+FORMATS = ('csv', 'ndjson')
+# Столбец выгрузки -> путь в ORM
+EXPORT_COLUMNS = {
+    'date': 'date',
+    'nasa_id': 'asteroid__nasa_id',
+    'name': 'asteroid__name',
+    'absolute_magnitude': 'asteroid__absolute_magnitude',
+    'is_hazardous': 'is_hazardous',
+    'velocity_kmh': 'velocity_kmh',
+    'miss_distance_km': 'miss_distance_km',
+    'source': 'source',
+}
+CONTENT_TYPES = {'csv': 'text/csv; charset=utf-8', 'ndjson': 'application/x-ndjson'}
+
+
+def get_chunk_size():
+    return getattr(settings, 'NASA_EXPORT_CHUNK_SIZE', 2000)
+
+
+def export_rows(start=None, end=None, hazardous=None, chunk_size=None, archived=False):
+    """
+    Кортежи значений EXPORT_COLUMNS в хронологическом порядке.
+
+    Args:
+        start, end: дни диапазона включительно (date), None — без границы
+        hazardous: True/False — только опасные/безопасные, None — все
+        archived: читать и сближения, перенесённые в архив (core.retention)
+    """
+    def build(model):
+        rows = model.objects.all()
+        if start:
+            rows = rows.filter(date__gte=day_start(start))
+        if end:
+            rows = rows.filter(date__lt=day_start(end + timedelta(days=1)))
+        if hazardous is not None:
+            rows = rows.filter(is_hazardous=hazardous)
+        return rows.values_list(*EXPORT_COLUMNS.values())
+
+    if archived:
+        # В объединении сортировка только по выбранным столбцам; пара (астероид, дата) уникальна
+        rows = across_tiers(build, archived=True).order_by('date', 'asteroid__nasa_id')
+    else:
+        rows = build(Flyby).order_by(*FLYBY_ORDER)
+    return rows.iterator(chunk_size=chunk_size or get_chunk_size())
+
+
+class _Echo:
+    """Файлоподобный объект для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        yield writer.writerow(value.isoformat() if hasattr(value, 'isoformat') else value for value in row)
+
+
+def iter_ndjson(rows):
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    names = list(EXPORT_COLUMNS)
+    for row in rows:
+        yield encoder.encode(dict(zip(names, row))) + '\n'
+
+
+def iter_chunks(lines, size=CHUNK_SIZE):
+    """Склеивает строки в куски байт около size: меньше мелких записей в сокет и файл."""
+    buffer, length = [], 0
+    for line in lines:
+        data = line.encode()
+        buffer.append(data)
+        length += len(data)
+        if length >= size:
+            yield b''.join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def iter_gzip(chunks, level=6):
+    """Сжимает поток кусков в формат gzip."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(fmt, rows, compress=False):
+    """
+    Куски байт выгрузки в формате fmt ('csv' или 'ndjson').
+
+    Raises:
+        ValueError: неизвестный формат
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Неизвестный формат {fmt!r}, доступны: {', '.join(FORMATS)}")
+    lines = iter_csv(rows) if fmt == 'csv' else iter_ndjson(rows)
+    chunks = iter_chunks(lines)
+    return iter_gzip(chunks) if compress else chunks
+
+
+def export_filename(fmt, compress=False):
+    return f"flybys.{fmt}{'.gz' if compress else ''}"
@@ -0,0 +1,187 @@
+"""Локальная замена фида NeoWs для нагрузочных прогонов и репетиции сбоев.
+
+Сервер отвечает на GET <любой путь>?start_date=&end_date=&api_key= так же,
+как api.nasa.gov: фид по дням, заголовки X-RateLimit-*, 400 на диапазон
+длиннее 7 дней, 403 без ключа, 429 с нулевым остатком при исчерпанной квоте.
+Содержимое дня зависит только от даты и зерна, поэтому пересекающиеся окна
+и повторные прогоны получают одинаковые данные. Задержка и доля ошибок
+настраиваются; ошибки тоже воспроизводимы при том же зерне.
+"""
+import json
+import random
+import socket
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from .bench import synthetic_approach, synthetic_asteroid
+
+MAX_RANGE_DAYS = 7
+# Псевдостатус ошибки: соединение закрывается без ответа (сетевая ошибка у клиента)
+DROP = 'drop'
+
+
+@dataclass
+class FakeFeedConfig:
+    per_day: int = 20
+    # Общий пул астероидов: один объект встречается в разных днях, как в настоящем фиде
+    pool_size: int = 2000
+    seed: int = 0
+    latency: float = 0.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+    errors: tuple = (500, 503)
+    retry_after: int | None = None
+    rate_limit: int = 1000
+    rate_period: int = 3600
+
+
+def feed_day(day, config):
+    """Объекты астероидов фида на один день; не зависят от запрошенного диапазона."""
+    rng = random.Random(f'{config.seed}:{day.isoformat()}')
+    indexes = rng.sample(range(config.pool_size), min(config.per_day, config.pool_size))
+    return [
+        {
+            **synthetic_asteroid(index, random.Random(f'{config.seed}:asteroid:{index}')),
+            'close_approach_data': [synthetic_approach(day, rng)],
+        }
+        for index in indexes
+    ]
+
+
+def build_feed(start_date, end_date, config):
+    """Тело ответа фида за диапазон дат включительно."""
+    objects = {}
+    day = start_date
+    while day <= end_date:
+        objects[day.strftime('%Y-%m-%d')] = feed_day(day, config)
+        day += timedelta(days=1)
+    return {
+        'links': {},
+        'element_count': sum(map(len, objects.values())),
+        'near_earth_objects': objects,
+    }
+
+
+@dataclass
+class FakeFeedState:
+    """Счётчики сервера: квоты ключей и статистика ответов."""
+    config: FakeFeedConfig
+    requests: int = 0
+    statuses: dict = field(default_factory=dict)
+    _used: dict = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def __post_init__(self):
+        self._rng = random.Random(f'{self.config.seed}:errors')
+
+    def take_quota(self, api_key):
+        """Списывает запрос с квоты ключа; возвращает остаток или None, если квота исчерпана."""
+        now = time.monotonic()
+        with self._lock:
+            started, used = self._used.get(api_key, (now, 0))
+            if now - started >= self.config.rate_period:
+                started, used = now, 0
+            if used >= self.config.rate_limit:
+                return None
+            self._used[api_key] = (started, used + 1)
+            return self.config.rate_limit - used - 1
+
+    def injected_error(self):
+        """Случайная ошибка из config.errors с вероятностью error_rate либо None."""
+        with self._lock:
+            self.requests += 1
+            if self.config.error_rate and self._rng.random() < self.config.error_rate:
+                return self._rng.choice(self.config.errors)
+        return None
+
+    def count(self, status):
+        with self._lock:
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+
+
+class FakeFeedHandler(BaseHTTPRequestHandler):
+    server_version = 'FakeNeoWs/1.0'
+    protocol_version = 'HTTP/1.1'
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        config = self.state.config
+        delay = config.latency + (random.uniform(0, config.jitter) if config.jitter else 0)
+        if delay:
+            time.sleep(delay)
+
+        error = self.state.injected_error()
+        if error == DROP:
+            self.state.count(DROP)
+            self.close_connection = True
+            self.connection.shutdown(socket.SHUT_RDWR)
+            return
+        if error is not None:
+            headers = {'Retry-After': str(config.retry_after)} if config.retry_after is not None else {}
+            return self.send_json(error, {'error': {'code': 'INJECTED', 'message': 'Injected failure'}}, headers)
+
+        params = {name: values[0] for name, values in parse_qs(urlsplit(self.path).query).items()}
+        api_key = params.get('api_key')
+        if not api_key:
+            return self.send_json(403, {'error': {'code': 'API_KEY_MISSING', 'message': 'No api_key was supplied.'}})
+
+        remaining = self.state.take_quota(api_key)
+        limit_headers = {'X-RateLimit-Limit': str(config.rate_limit), 'X-RateLimit-Remaining': str(remaining or 0)}
+        if remaining is None:
+            return self.send_json(429, {'error': {'code': 'OVER_RATE_LIMIT'}}, limit_headers)
+
+        try:
+            start_date = datetime.strptime(params['start_date'], '%Y-%m-%d').date()
+            end_date = (
+                datetime.strptime(params['end_date'], '%Y-%m-%d').date() if params.get('end_date')
+                else start_date + timedelta(days=MAX_RANGE_DAYS)
+            )
+        except (KeyError, ValueError):
+            return self.send_json(400, {'error_message': 'Invalid start_date or end_date'}, limit_headers)
+        if not 0 <= (end_date - start_date).days <= MAX_RANGE_DAYS:
+            return self.send_json(400, {'error_message': 'Date Format Exception - Expected format (yyyy-mm-dd) - '
+                                                         'The Feed date limit is only 7 Days'}, limit_headers)
+        self.send_json(200, build_feed(start_date, end_date, config), limit_headers)
+
+    def send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+        self.state.count(status)
+
+
+class FakeFeedServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, config=None, verbose=False):
+        super().__init__(address, FakeFeedHandler)
+        self.state = FakeFeedState(config or FakeFeedConfig())
+        self.verbose = verbose
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}/neo/rest/v1/feed'
+
+
+def start_in_thread(config=None, host='127.0.0.1', port=0):
+    """Запускает сервер в фоновом потоке (порт 0 — свободный); остановка — server.shutdown()."""
+    server = FakeFeedServer((host, port), config)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,433 @@
+"""Пакетная загрузка данных NASA NeoWs в базу данных."""
+import hashlib
+import json
+import logging
+import time
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Subquery
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from . import metrics
+from .aggregates import days_condition, refresh_daily_stats
+from .caching import bump_generation
+from .models import ArchivedFlyby, Asteroid, Flyby
+from .retention import retention_cutoff
+from .stream import batched
+from .watchlist import refresh_for_asteroids
+
+logger = logging.getLogger(__name__)
+
+ASTEROID_FIELDS = (
+    'name', 'absolute_magnitude', 'is_potentially_hazardous', 'nasa_jpl_url', 'diameter_min_m', 'diameter_max_m',
+)
+# Поля, которые пишет загрузка: данные NASA и их отпечаток
+ASTEROID_WRITE_FIELDS = (*ASTEROID_FIELDS, 'fingerprint')
+FLYBY_FIELDS = ('velocity_kmh', 'miss_distance_km', 'is_hazardous')
+
+
+@dataclass
+class IngestResult:
+    """Итог загрузки: сколько строк создано и обновлено."""
+    asteroids_created: int = 0
+    asteroids_updated: int = 0
+    flybys_created: int = 0
+    flybys_updated: int = 0
+    # Дни (в текущем часовом поясе), сближения которых изменились
+    days: set = field(default_factory=set)
+    # id астероидов, сближения которых изменились
+    asteroid_ids: set = field(default_factory=set)
+
+    def __iadd__(self, other):
+        self.asteroids_created += other.asteroids_created
+        self.asteroids_updated += other.asteroids_updated
+        self.flybys_created += other.flybys_created
+        self.flybys_updated += other.flybys_updated
+        self.days |= other.days
+        self.asteroid_ids |= other.asteroid_ids
+        return self
+
+
+def get_batch_size():
+    return getattr(settings, 'NASA_INGEST_BATCH_SIZE', 500)
+
+
+def parse_approach_datetime(approach_data, date):
+    """Время сближения из close_approach_date_full, иначе полночь дня из фида."""
+    approach_date_str = approach_data.get('close_approach_date_full')
+    if approach_date_str:
+        try:
+            return timezone.make_aware(datetime.strptime(approach_date_str, '%Y-%b-%d %H:%M'))
+        except ValueError:
+            pass
+    return timezone.make_aware(datetime.combine(date, datetime.min.time()))
+
+
+def fingerprint(values):
+    """Короткий стабильный хэш JSON-представления значений."""
+    return hashlib.sha1(json.dumps(values, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _float_or_none(value):
+    return None if value is None else float(value)
+
+
+def normalize_asteroid(asteroid_data):
+    """Поля модели Asteroid из объекта фида вместе с отпечатком."""
+    nasa_id = asteroid_data.get('id')
+    if not nasa_id:
+        raise ValueError("NASA ID не найден в данных")
+    diameter = (asteroid_data.get('estimated_diameter') or {}).get('meters') or {}
+    fields = {
+        'name': asteroid_data.get('name', 'Unknown'),
+        'absolute_magnitude': asteroid_data.get('absolute_magnitude_h'),
+        'is_potentially_hazardous': bool(asteroid_data.get('is_potentially_hazardous_asteroid', False)),
+        'nasa_jpl_url': asteroid_data.get('nasa_jpl_url', '') or '',
+        'diameter_min_m': _float_or_none(diameter.get('estimated_diameter_min')),
+        'diameter_max_m': _float_or_none(diameter.get('estimated_diameter_max')),
+    }
+    fields['fingerprint'] = fingerprint([fields[name] for name in ASTEROID_FIELDS])
+    return str(nasa_id), fields
+
+
+def normalize_approach(approach_data, date):
+    """Ключевое время и поля модели Flyby из записи close_approach_data."""
+    # Скорость приходит в км/с, храним в км/ч
+    velocity_kms = float(approach_data.get('relative_velocity', {}).get('kilometers_per_second', 0))
+    miss_distance_km = float(approach_data.get('miss_distance', {}).get('kilometers', 0))
+    return parse_approach_datetime(approach_data, date), {
+        'velocity_kmh': velocity_kms * 3600,
+        'miss_distance_km': miss_distance_km,
+    }
+
+
+def iter_feed_items(data):
+    """Пары (дата, объект астероида) из уже разобранного ответа фида."""
+    if not data or 'near_earth_objects' not in data:
+        return
+    for date_str, asteroids_data in data['near_earth_objects'].items():
+        for asteroid_data in asteroids_data:
+            yield date_str, asteroid_data
+
+
+def normalize_items(items):
+    """
+    Нормализует поток пар (дата, объект астероида).
+
+    Yields:
+        tuple: (nasa_id, поля астероида, список (дата сближения, поля сближения))
+    """
+    for date_str, asteroid_data in items:
+        try:
+            date = datetime.strptime(date_str, '%Y-%m-%d').date()
+            nasa_id, fields = normalize_asteroid(asteroid_data)
+            approaches = [
+                normalize_approach(approach, date)
+                for approach in asteroid_data.get('close_approach_data', [])
+            ]
+        except (TypeError, ValueError, AttributeError) as e:
+            logger.warning("Ошибка при обработке астероида %s: %s", asteroid_data.get('id', 'unknown'), e)
+            continue
+        yield nasa_id, fields, approaches
+
+
+def content_hash(records):
+    """
+    Хэш содержимого окна по нормализованным записям.
+
+    Не зависит от порядка астероидов и от служебных полей ответа (ссылки
+    с api_key и т.п.), поэтому меняется только при изменении самих данных.
+    """
+    digests = sorted(
+        fingerprint([nasa_id, fields['fingerprint'], sorted(
+            (approach_datetime.isoformat(), flyby_fields['velocity_kmh'], flyby_fields['miss_distance_km'])
+            for approach_datetime, flyby_fields in approaches
+        )])
+        for nasa_id, fields, approaches in records
+    )
+    return hashlib.sha256('\n'.join(digests).encode()).hexdigest()
+
+
+def _chunks(items, size):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _write_asteroids(asteroids, batch_size, result):
+    """
+    Создаёт новые и обновляет изменившиеся астероиды. Возвращает nasa_id -> pk.
+
+    Изменение определяется по отпечатку: из базы читаются только id и fingerprint,
+    астероиды с совпавшим отпечатком не пишутся вовсе.
+    """
+    id_map = {}
+    to_create = []
+    to_update = []
+    now = timezone.now()
+
+    for nasa_ids in _chunks(asteroids, batch_size):
+        existing = {
+            nasa_id: (pk, stored)
+            for nasa_id, pk, stored in Asteroid.objects.filter(nasa_id__in=nasa_ids)
+            .order_by().values_list('nasa_id', 'id', 'fingerprint')
+        }
+        for nasa_id in nasa_ids:
+            fields = asteroids[nasa_id]
+            if nasa_id not in existing:
+                to_create.append(Asteroid(nasa_id=nasa_id, **fields))
+                continue
+            pk, stored = existing[nasa_id]
+            id_map[nasa_id] = pk
+            if stored != fields['fingerprint']:
+                # bulk_update не выставляет auto_now сам
+                to_update.append(Asteroid(id=pk, nasa_id=nasa_id, updated_at=now, **fields))
+
+    if to_create:
+        Asteroid.objects.bulk_create(
+            to_create,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=['nasa_id'],
+            update_fields=list(ASTEROID_WRITE_FIELDS),
+        )
+        created_ids = [asteroid.nasa_id for asteroid in to_create]
+        for nasa_ids in _chunks(created_ids, batch_size):
+            id_map.update(Asteroid.objects.filter(nasa_id__in=nasa_ids).order_by().values_list('nasa_id', 'id'))
+    if to_update:
+        Asteroid.objects.bulk_update(to_update, [*ASTEROID_WRITE_FIELDS, 'updated_at'], batch_size=batch_size)
+        # Флаг опасности продублирован в Flyby и архиве: выравниваем всю историю изменившихся астероидов
+        for asteroid_ids in _chunks([asteroid.id for asteroid in to_update], batch_size):
+            history = Flyby.objects.filter(asteroid_id__in=asteroid_ids)
+            history.update(updated_at=now, is_hazardous=Subquery(
+                Asteroid.objects.filter(pk=OuterRef('asteroid_id')).values('is_potentially_hazardous')[:1]
+            ))
+            result.days.update(history.annotate(day=TruncDate('date')).order_by().values_list('day', flat=True).distinct())
+            ArchivedFlyby.objects.filter(asteroid_id__in=asteroid_ids).update(updated_at=now, is_hazardous=Subquery(
+                Asteroid.objects.filter(pk=OuterRef('asteroid_id')).values('is_potentially_hazardous')[:1]
+            ))
+
+    result.asteroids_created += len(to_create)
+    result.asteroids_updated += len(to_update)
+    return id_map
+
+
+def _existing_flybys(model, keys, batch_size):
+    """(asteroid_id, дата) -> значения FLYBY_FIELDS для уже сохранённых ключей keys."""
+    dates = [date for _, date in keys]
+    existing = {}
+    for asteroid_ids in _chunks({asteroid_id for asteroid_id, _ in keys}, batch_size):
+        rows = model.objects.filter(
+            asteroid_id__in=asteroid_ids,
+            date__gte=min(dates),
+            date__lte=max(dates),
+        ).order_by().values_list('asteroid_id', 'date', *FLYBY_FIELDS)
+        for asteroid_id, date, *values in rows:
+            existing[(asteroid_id, date)] = tuple(values)
+    return existing
+
+
+def _drop_predictions(days, result):
+    """
+    Удаляет локальный прогноз (source=local) на дни, которые пришли из фида.
+
+    Фид перечисляет все сближения дня, так что кандидаты predict_flybys на
+    эти дни больше не нужны; в той же транзакции, что и запись фида, чтобы
+    сводки, таблицы и выгрузка не видели оба источника сразу.
+    """
+    predicted = list(
+        Flyby.objects.filter(days_condition(days), source=Flyby.SOURCE_LOCAL)
+        .order_by().values_list('id', 'asteroid_id', 'date')
+    )
+    if not predicted:
+        return
+    Flyby.objects.filter(id__in=[pk for pk, _, _ in predicted]).delete()
+    result.days.update(timezone.localdate(date) for _, _, date in predicted)
+    result.asteroid_ids.update(asteroid_id for _, asteroid_id, _ in predicted)
+
+
+def _write_flybys(flybys, id_map, batch_size, result):
+    """
+    Вставляет новые сближения и обновляет изменившиеся одним upsert на пакет.
+
+    Сближения раньше горизонта хранения, которых нет в Flyby, пишутся сразу
+    в архивную таблицу: повторная загрузка старого окна обновляет архивные
+    строки на месте, а не дублирует их в горячей таблице.
+    """
+    keyed = {}
+    for (nasa_id, date), fields in flybys.items():
+        asteroid_id = id_map.get(nasa_id)
+        if asteroid_id is not None:
+            keyed[(asteroid_id, date)] = fields
+    if not keyed:
+        return
+
+    _drop_predictions({timezone.localdate(date) for _, date in keyed}, result)
+    existing = _existing_flybys(Flyby, keyed, batch_size)
+    cutoff = retention_cutoff()
+    old_keys = [key for key in keyed if key not in existing and cutoff is not None and key[1] < cutoff]
+    archived = _existing_flybys(ArchivedFlyby, old_keys, batch_size) if old_keys else {}
+    old_keys = set(old_keys)
+
+    to_write = []
+    to_archive = []
+    now = timezone.now()
+    for key, fields in keyed.items():
+        values = tuple(fields[name] for name in FLYBY_FIELDS)
+        stored = existing.get(key, archived.get(key))
+        if stored is None:
+            result.flybys_created += 1
+        elif stored != values:
+            result.flybys_updated += 1
+        else:
+            continue
+        result.days.add(timezone.localdate(key[1]))
+        if key in old_keys:
+            to_archive.append(ArchivedFlyby(asteroid_id=key[0], date=key[1], created_at=now, updated_at=now, **fields))
+            continue
+        to_write.append(Flyby(asteroid_id=key[0], date=key[1], **fields))
+        result.asteroid_ids.add(key[0])
+
+    if to_write:
+        Flyby.objects.bulk_create(
+            to_write,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=['asteroid', 'date'],
+            update_fields=[*FLYBY_FIELDS, 'updated_at'],
+        )
+    if to_archive:
+        ArchivedFlyby.objects.bulk_create(
+            to_archive,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=['asteroid', 'date'],
+            update_fields=[*FLYBY_FIELDS, 'updated_at'],
+        )
+
+
+def _write_batch(batch, batch_size, result, stats):
+    asteroids = {}
+    flybys = {}
+    for nasa_id, fields, approaches in batch:
+        asteroids[nasa_id] = fields
+        for approach_datetime, flyby_fields in approaches:
+            flybys[(nasa_id, approach_datetime)] = {
+                **flyby_fields,
+                'is_hazardous': fields['is_potentially_hazardous'],
+            }
+    with stats.measure('write', len(batch)) if stats else nullcontext():
+        id_map = _write_asteroids(asteroids, batch_size, result)
+        _write_flybys(flybys, id_map, batch_size, result)
+
+
+def ingest_items(items, batch_size=None, stats=None):
+    """
+    Сохраняет поток пар (дата, объект астероида) пакетами фиксированного размера.
+
+    Нормализация идёт генератором, в памяти одновременно держится только один
+    пакет, поэтому расход памяти не зависит от объёма фида. Каждый пакет
+    фиксируется своей короткой транзакцией вместе с пересчётом сводок по его
+    дням и дат ближайших сближений его астероидов, а разбор следующего идёт
+    вне её: читатели и параллельные загрузки ждут блокировку не дольше записи
+    одного пакета, а производные данные всегда соответствуют записанным
+    строкам. Поколение данных меняется один раз в конце, в том числе когда
+    поток оборвался ошибкой после записанных пакетов.
+
+    Args:
+        items: Итератор пар (дата, объект астероида), например FeedStreamParser
+        batch_size: Размер пакета (по умолчанию NASA_INGEST_BATCH_SIZE)
+        stats: PipelineStats для учёта строк в секунду по стадиям
+
+    Returns:
+        IngestResult: количество созданных и обновлённых астероидов и сближений
+    """
+    records = normalize_items(stats.meter('parse', items) if stats else items)
+    if stats:
+        records = stats.meter('normalize', records, upstream='parse')
+    return ingest_records(records, batch_size=batch_size, stats=stats)
+
+
+def ingest_records(records, batch_size=None, stats=None):
+    """
+    Сохраняет уже нормализованные записи (результат normalize_items), как ingest_items.
+
+    Нужна, когда записи разобраны заранее: save_window считает по ним хэш
+    окна и пишет их же, не разбирая ответ второй раз.
+    """
+    batch_size = batch_size or get_batch_size()
+    result = IngestResult()
+    started = time.perf_counter()
+    try:
+        for batch in batched(records, batch_size):
+            batch_result = IngestResult()
+            with transaction.atomic():
+                _write_batch(batch, batch_size, batch_result, stats)
+                refresh_daily_stats(batch_result.days, batch_size=batch_size)
+                refresh_for_asteroids(batch_result.asteroid_ids, batch_size=batch_size)
+            result += batch_result
+    finally:
+        if result.days or result.asteroids_created or result.asteroids_updated:
+            bump_generation()
+    metrics.observe_ingest(result, time.perf_counter() - started)
+    return result
+
+
+def ingest_feed(data, batch_size=None):
+    """
+    Сохраняет уже разобранный ответ фида NeoWs пакетными запросами.
+
+    Args:
+        data: Словарь с данными от NASA API
+        batch_size: Размер пакета для bulk-операций (по умолчанию NASA_INGEST_BATCH_SIZE)
+
+    Returns:
+        IngestResult: количество созданных и обновлённых астероидов и сближений
+    """
+    return ingest_items(iter_feed_items(data), batch_size=batch_size)
+
+
+def drop_midnight_duplicates(batch_size=None):
+    """
+    Удаляет строки NeoWs, записанные полночью дня до перехода на ключ по
+    close_approach_date_full, если у того же астероида в тот же день уже есть
+    сближение с точным временем.
+
+    Старые загрузки брали время из close_approach_date (полночь), новые — из
+    close_approach_date_full, поэтому повторная загрузка старого окна оставила
+    рядом обе строки. Чистятся оба уровня хранения; сводки по затронутым дням
+    и даты ближайших сближений пересчитываются в той же транзакции.
+
+    Returns:
+        int: число удалённых строк
+    """
+    batch_size = batch_size or get_batch_size()
+    result = IngestResult()
+    removed = 0
+    with transaction.atomic():
+        for model in (Flyby, ArchivedFlyby):
+            timed = model.objects.filter(
+                asteroid_id=OuterRef('asteroid_id'), source=Flyby.SOURCE_NEOWS, date__date=OuterRef('day'),
+            ).exclude(date__hour=0, date__minute=0)
+            duplicates = list(
+                model.objects.filter(source=Flyby.SOURCE_NEOWS, date__hour=0, date__minute=0)
+                .annotate(day=TruncDate('date')).filter(Exists(timed))
+                .order_by().values_list('id', 'asteroid_id', 'day')
+            )
+            for chunk in _chunks(duplicates, batch_size):
+                # Вместе со строкой Flyby удаляются отметки об оповещениях по ней
+                model.objects.filter(id__in=[pk for pk, _, _ in chunk]).delete()
+            result.days.update(day for _, _, day in duplicates)
+            result.asteroid_ids.update(asteroid_id for _, asteroid_id, _ in duplicates)
+            removed += len(duplicates)
+        refresh_daily_stats(result.days, batch_size=batch_size)
+        refresh_for_asteroids(result.asteroid_ids, batch_size=batch_size)
+    if removed:
+        bump_generation()
+        logger.info("Удалено дублей сближений с полуночным ключом: %s", removed)
+    return removed
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.db import sync_replica
+from core.retention import apply_retention, retention_cutoff
+
+
+class Command(BaseCommand):
+    help = 'Переносит сближения старше горизонта хранения из Flyby в архивную таблицу'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='Горизонт хранения в днях (по умолчанию NASA_RETENTION_DAYS)')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Строк в одной транзакции переноса (по умолчанию NASA_INGEST_BATCH_SIZE)')
+
+    def handle(self, *args, **options):
+        if options['days'] is not None and options['days'] < 0:
+            raise CommandError('Горизонт хранения не может быть отрицательным')
+        cutoff = retention_cutoff(days=options['days'])
+        if cutoff is None:
+            self.stdout.write('Хранение не ограничено (горизонт 0 дней), переносить нечего')
+            return
+        moved = apply_retention(cutoff, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Перенесено в архив: {moved} (сближения раньше {cutoff:%Y-%m-%d})'))
+        target = sync_replica()
+        if target:
+            self.stdout.write(f'Реплика для чтений обновлена: {target}')
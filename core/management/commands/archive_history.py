@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.columnar import append, get_archive, get_archive_dir
+from core.management.commands.load_nasa import parse_date
+
+
+class Command(BaseCommand):
+    help = 'Строит и дописывает столбцовый архив истории сближений (NumPy, memmap)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['build', 'append', 'info'],
+                            help='build — пересобрать целиком, append — дописать новые дни, info — сводка')
+        parser.add_argument('--until', type=parse_date,
+                            help='Граница архива: дни до неё, не включая (по умолчанию сегодня)')
+        parser.add_argument('--path', help='Каталог архива (по умолчанию NASA_ARCHIVE_DIR)')
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help='Строк за одно чтение из базы (по умолчанию NASA_EXPORT_CHUNK_SIZE)')
+
+    def handle(self, *args, **options):
+        path = options['path'] or get_archive_dir()
+        if options['action'] != 'info':
+            archive = get_archive(path)
+            if options['action'] == 'append' and archive is None:
+                raise CommandError(f'Архив в {path} ещё не построен, используйте build')
+            written = append(
+                until=options['until'], path=path, rebuild=options['action'] == 'build',
+                chunk_size=options['chunk_size'],
+            )
+            self.stdout.write(self.style.SUCCESS(f'Записано строк: {written}'))
+
+        archive = get_archive(path)
+        if archive is None:
+            raise CommandError(f'Архив в {path} ещё не построен')
+        size = sum(f.stat().st_size for f in archive.path.iterdir() if f.is_file())
+        self.stdout.write(
+            f'{archive.path}: {len(archive)} сближений, {len(archive.asteroids)} астероидов, '
+            f'дни до {archive.end}, {size / 1024 / 1024:.1f} МБ'
+        )
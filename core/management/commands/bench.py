@@ -0,0 +1,96 @@
+import json
+import subprocess
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from core.bench import compare, run_bench
+
+
+def current_commit():
+    """Короткий хэш HEAD, если команда запущена из git-репозитория."""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеры производительности на синтетических данных во временной тестовой базе: '
+        'скорость загрузки, p50/p95 задержки и число запросов страниц'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--asteroids', type=int, default=1000, help='Число астероидов (по умолчанию 1000)')
+        parser.add_argument('--flybys', type=int, default=3, help='Сближений на астероид (по умолчанию 3)')
+        parser.add_argument('--users', type=int, default=10, help='Число пользователей (по умолчанию 10)')
+        parser.add_argument('--watchlist', type=int, default=20, help='Астероидов в списке пользователя (по умолчанию 20)')
+        parser.add_argument('--repeat', type=int, default=20, help='Запросов на страницу после первого (по умолчанию 20)')
+        parser.add_argument('--seed', type=int, default=0, help='Зерно генератора данных')
+        parser.add_argument('--output', '-o', help='Файл для результатов JSON, по умолчанию stdout')
+        parser.add_argument('--compare', help='JSON прошлого прогона: напечатать изменение метрик')
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1 or options['asteroids'] < 1 or options['users'] < 1:
+            raise CommandError('--asteroids, --users и --repeat должны быть положительными')
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Не удалось прочитать {options['compare']}: {e}")
+
+        results = {
+            'commit': current_commit(),
+            'started_at': datetime.now(dt_timezone.utc).isoformat(timespec='seconds'),
+            **self.run_isolated(options),
+        }
+
+        output = json.dumps(results, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+            self.stderr.write(self.style.SUCCESS(f"Результаты записаны в {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+        if baseline is not None:
+            self.print_comparison(baseline, results)
+
+    def run_isolated(self, options):
+        """
+        Прогон во временной базе, как у manage.py test: рабочие данные не
+        трогаются. Кэш процесса очищается, чтобы поколение данных рабочей
+        базы не попало в замеры.
+        """
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        cache.clear()
+        try:
+            return run_bench(
+                asteroids=options['asteroids'],
+                flybys_per_asteroid=options['flybys'],
+                users=options['users'],
+                watchlist_per_user=options['watchlist'],
+                repeat=options['repeat'],
+                seed=options['seed'],
+            )
+        finally:
+            cache.clear()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def print_comparison(self, baseline, results):
+        self.stderr.write(self.style.MIGRATE_HEADING(f"Сравнение с {baseline.get('commit') or 'прошлым прогоном'}"))
+        if baseline.get('params') != results.get('params'):
+            self.stderr.write(self.style.WARNING('Параметры прогонов различаются, сравнение приблизительное'))
+        for name, old, new, change in compare(baseline, results):
+            delta = f'{change:+.1f}%' if change is not None else '—'
+            self.stderr.write(f'{name:45} {old:>12} {new:>12} {delta:>9}')
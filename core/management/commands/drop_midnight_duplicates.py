@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from core.db import sync_replica
+from core.ingest import drop_midnight_duplicates
+
+
+class Command(BaseCommand):
+    help = 'Удаляет сближения NeoWs с полуночным ключом, у которых есть дубль с точным временем'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Строк в одном запросе удаления (по умолчанию NASA_INGEST_BATCH_SIZE)')
+
+    def handle(self, *args, **options):
+        removed = drop_midnight_duplicates(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Удалено дублей: {removed}'))
+        target = sync_replica()
+        if target:
+            self.stdout.write(f'Реплика для чтений обновлена: {target}')
@@ -0,0 +1,52 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from core.queries import view_queries
+
+# Полный проход по таблице без индекса: SQLite пишет "SCAN core_flyby", PostgreSQL — "Seq Scan on core_flyby"
+SEQ_SCAN_PATTERNS = (
+    re.compile(r'\bSCAN (?P<table>\w+)(?! USING)(?:\s|$)'),
+    re.compile(r'Seq Scan on (?P<table>\w+)'),
+)
+
+
+def find_seq_scans(plan):
+    """Таблицы, которые план читает последовательным проходом."""
+    tables = set()
+    for line in plan.splitlines():
+        for pattern in SEQ_SCAN_PATTERNS:
+            match = pattern.search(line)
+            if match:
+                tables.add(match.group('table'))
+    return tables
+
+
+class Command(BaseCommand):
+    help = 'Печатает EXPLAIN для запросов страниц index и watchlist'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user-id', type=int, default=1, help='Пользователь для запросов списка отслеживания')
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Завершиться с ошибкой, если в планах есть последовательный проход по таблицам core_*',
+        )
+
+    def handle(self, *args, **options):
+        offenders = []
+        for name, queryset in view_queries(user=options['user_id']):
+            plan = queryset.explain()
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(plan)
+            self.stdout.write('')
+            scans = sorted(table for table in find_seq_scans(plan) if table.startswith('core_'))
+            if scans:
+                offenders.append(f"{name}: {', '.join(scans)}")
+
+        if not offenders:
+            self.stdout.write(self.style.SUCCESS(f'Последовательных проходов нет ({connection.vendor})'))
+        elif options['check']:
+            raise CommandError('Последовательный проход в запросах:\n' + '\n'.join(offenders))
+        else:
+            for offender in offenders:
+                self.stdout.write(self.style.WARNING(f'Последовательный проход: {offender}'))
@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.columnar import get_archive, get_archive_dir
+from core.export import FORMATS, export_rows, export_stream
+from core.management.commands.load_nasa import parse_date
+
+
+class Command(BaseCommand):
+    help = 'Выгружает историю сближений в CSV или NDJSON потоком'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=FORMATS, default='csv', help='Формат выгрузки (по умолчанию csv)')
+        parser.add_argument('--output', '-o', help='Файл для записи, по умолчанию stdout')
+        parser.add_argument('--gzip', action='store_true', help='Сжать выгрузку gzip')
+        parser.add_argument('--start', type=parse_date, help='Первый день (YYYY-MM-DD)')
+        parser.add_argument('--end', type=parse_date, help='Последний день (YYYY-MM-DD)')
+        hazard = parser.add_mutually_exclusive_group()
+        hazard.add_argument('--hazardous', dest='hazardous', action='store_const', const=True,
+                            help='Только потенциально опасные')
+        hazard.add_argument('--safe', dest='hazardous', action='store_const', const=False,
+                            help='Только безопасные')
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help='Строк за одно чтение из базы (по умолчанию NASA_EXPORT_CHUNK_SIZE)')
+        parser.add_argument('--archive', action='store_true',
+                            help='Читать столбцовый архив (archive_history) вместо базы')
+        parser.add_argument('--with-archived', action='store_true',
+                            help='Добавить сближения, перенесённые apply_retention в архивную таблицу')
+
+    def handle(self, *args, **options):
+        if options['start'] and options['end'] and options['end'] < options['start']:
+            raise CommandError('Конец диапазона раньше начала')
+        if options['archive'] and options['with_archived']:
+            raise CommandError('--archive и --with-archived несовместимы')
+
+        if options['archive']:
+            archive = get_archive()
+            if archive is None:
+                raise CommandError(f'Архив в {get_archive_dir()} ещё не построен: manage.py archive_history build')
+            rows = archive.export_rows(options['start'], options['end'], options['hazardous'], options['chunk_size'])
+        else:
+            rows = export_rows(
+                options['start'], options['end'], options['hazardous'], options['chunk_size'],
+                archived=options['with_archived'],
+            )
+        chunks = export_stream(options['format'], rows, compress=options['gzip'])
+
+        if options['output']:
+            written = 0
+            with open(options['output'], 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    written += len(chunk)
+            self.stderr.write(self.style.SUCCESS(f"Записано {written} байт в {options['output']}"))
+            return
+
+        if options['gzip'] and self.stdout.isatty():
+            raise CommandError('Сжатая выгрузка не выводится в терминал, укажите --output')
+        out = getattr(self.stdout._out, 'buffer', None)
+        if out is None:
+            # Текстовый поток без буфера байт (например, StringIO): куски режутся по границам строк
+            if options['gzip']:
+                raise CommandError('Сжатая выгрузка пишется только в файл или двоичный stdout')
+            for chunk in chunks:
+                self.stdout.write(chunk.decode(), ending='')
+            return
+        for chunk in chunks:
+            out.write(chunk)
+        out.flush()
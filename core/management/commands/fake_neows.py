@@ -0,0 +1,70 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.fakefeed import DROP, FakeFeedConfig, FakeFeedServer
+
+
+def parse_errors(value):
+    """Список кодов ошибок через запятую; drop — обрыв соединения без ответа."""
+    errors = []
+    for item in value.split(','):
+        item = item.strip().lower()
+        if item == DROP:
+            errors.append(DROP)
+        elif item.isdigit() and 400 <= int(item) < 600:
+            errors.append(int(item))
+        else:
+            raise CommandError(f'Неверная ошибка {item!r}: ожидается код 4xx/5xx или {DROP}')
+    return tuple(errors)
+
+
+class Command(BaseCommand):
+    help = 'Локальный сервер-замена фида NeoWs с синтетическими данными, задержкой, квотами и ошибками'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1', help='Адрес (по умолчанию 127.0.0.1)')
+        parser.add_argument('--port', type=int, default=8765, help='Порт (по умолчанию 8765)')
+        parser.add_argument('--per-day', type=int, default=20, help='Астероидов в дне фида (по умолчанию 20)')
+        parser.add_argument('--pool-size', type=int, default=2000, help='Всего разных астероидов (по умолчанию 2000)')
+        parser.add_argument('--seed', type=int, default=0, help='Зерно данных и ошибок')
+        parser.add_argument('--latency', type=float, default=0.0, help='Задержка ответа, с')
+        parser.add_argument('--jitter', type=float, default=0.0, help='Случайная добавка к задержке до указанного числа секунд')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Доля запросов с ошибкой, 0..1')
+        parser.add_argument(
+            '--errors', type=parse_errors, default=(500, 503),
+            help=f'Ошибки через запятую, например 500,503,{DROP} (по умолчанию 500,503)',
+        )
+        parser.add_argument('--retry-after', type=int, default=None, help='Retry-After в ответах с ошибкой, с')
+        parser.add_argument('--rate-limit', type=int, default=1000, help='Запросов на ключ за период (по умолчанию 1000)')
+        parser.add_argument('--rate-period', type=int, default=3600, help='Период квоты, с (по умолчанию 3600)')
+
+    def handle(self, *args, **options):
+        if not 0 <= options['error_rate'] <= 1:
+            raise CommandError('--error-rate должен быть от 0 до 1')
+        config = FakeFeedConfig(
+            per_day=options['per_day'],
+            pool_size=max(options['pool_size'], options['per_day']),
+            seed=options['seed'],
+            latency=options['latency'],
+            jitter=options['jitter'],
+            error_rate=options['error_rate'],
+            errors=options['errors'],
+            retry_after=options['retry_after'],
+            rate_limit=options['rate_limit'],
+            rate_period=options['rate_period'],
+        )
+        try:
+            server = FakeFeedServer((options['host'], options['port']), config, verbose=options['verbosity'] > 1)
+        except OSError as e:
+            raise CommandError(f"Не удалось открыть {options['host']}:{options['port']}: {e}")
+
+        self.stdout.write(self.style.SUCCESS(f'Фид NeoWs: {server.url}'))
+        self.stdout.write(f'Загрузка через него: python manage.py load_nasa --base-url {server.url}')
+        self.stdout.write(f'или NASA_NEO_API_URL={server.url}. Остановка — Ctrl+C.')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            state = server.state
+            statuses = ', '.join(f'{status}: {count}' for status, count in sorted(state.statuses.items(), key=str))
+            self.stdout.write(f'Запросов: {state.requests}; ответы: {statuses or "нет"}')
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.db import sync_replica
+from core.orbits import import_file
+
+
+class Command(BaseCommand):
+    help = 'Загружает элементы орбит из ответов NeoWs lookup/browse (JSON) или файла MPCORB.DAT'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл с элементами')
+        parser.add_argument('--format', choices=['auto', 'neows', 'mpc'], default='auto',
+                            help='Формат файла (auto — JSON считается ответом NeoWs, остальное — MPCORB)')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Размер пачки записи (по умолчанию NASA_INGEST_BATCH_SIZE)')
+
+    def handle(self, *args, **options):
+        try:
+            result = import_file(options['path'], options['format'], options['batch_size'])
+        except OSError as e:
+            raise CommandError(f"Не удалось прочитать {options['path']}: {e}")
+        except ValueError as e:
+            raise CommandError(f'Файл не разобран: {e}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Элементы обновлены у {result.updated} астероидов, создано {result.created}, '
+            f'без пары в базе: {len(result.unmatched)}'
+        ))
+        target = sync_replica()
+        if target:
+            self.stdout.write(f'Реплика для чтений обновлена: {target}')
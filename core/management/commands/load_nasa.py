@@ -1,78 +1,201 @@
-import requests
-from django.core.management.base import BaseCommand
-from django.conf import settings  
-from django.utils import timezone 
-from core.models import Asteroid, Flyby
+import asyncio
 from datetime import datetime, timedelta
 
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from django.utils import timezone
+from core.alerts import run_alerts
+from core.backfill import (
+    ApiKeyPool, RateLimitExhausted, arun_backfill, get_freshness, run_backfill, split_windows, stale_windows, window_states,
+)
+from core.db import sync_replica
+from core.ingest import IngestResult, ingest_items
+from core.retention import apply_retention
+from core.services import NASANeoWsService
+from core.stream import FeedStreamParser, PipelineStats, iter_file
+from core.watchlist import refresh_passed
+
+
+def parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f'Неверная дата {value!r}, ожидается YYYY-MM-DD')
+
+
 class Command(BaseCommand):
     help = 'Загружает данные об астероидах с NASA API'
 
-    def handle(self, *args, **kwargs):
-        api_key = getattr(settings, 'NASA_API_KEY', 'DEMO_KEY')
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=parse_date, help='Начало диапазона (YYYY-MM-DD), по умолчанию сегодня')
+        parser.add_argument('--end', type=parse_date, help='Конец диапазона (YYYY-MM-DD), по умолчанию начало + 7 дней')
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help='Число параллельных запросов к API (по умолчанию NASA_FETCH_WORKERS)',
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Загрузить заново окна, уже отмеченные как загруженные',
+        )
+        parser.add_argument(
+            '--max-age', type=int, default=None,
+            help='Перепроверять окна, проверенные больше указанного числа секунд назад '
+                 '(по умолчанию NASA_SYNC_FRESHNESS для текущей недели и никогда для --start)',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=None,
+            help='Размер пакета для записи в базу (по умолчанию NASA_INGEST_BATCH_SIZE)',
+        )
+        parser.add_argument('--file', help='Загрузить сохранённый ответ фида из JSON-файла вместо запроса к API')
+        parser.add_argument(
+            '--async', dest='use_async', action='store_true',
+            help='Запрашивать окна асинхронным клиентом в одном цикле событий вместо пула потоков',
+        )
+        parser.add_argument(
+            '--base-url', help='Адрес фида вместо NASA_NEO_API_URL, например локального fake_neows',
+        )
+        parser.add_argument('--no-alerts', action='store_true', help='Не рассылать оповещения после загрузки')
+        parser.add_argument(
+            '--no-retention', action='store_true',
+            help='Не переносить сближения старше NASA_RETENTION_DAYS в архивную таблицу после загрузки',
+        )
 
-        if not api_key:
-             self.stdout.write(self.style.WARNING('API ключ не найден, используется DEMO_KEY'))
+    def handle(self, *args, **options):
+        stats = PipelineStats()
+        if options['file']:
+            self.load_file(options['file'], options['batch_size'], stats)
+            self.apply_retention(options)
+            self.refresh_watchlist()
+            self.sync_replica()
+            self.send_alerts(options)
+            return
 
-        today = timezone.now().date()
-        end_date = today + timedelta(days=7)
-        
-        start_str = today.strftime('%Y-%m-%d')
-        end_str = end_date.strftime('%Y-%m-%d')
-        
-        url = f'https://api.nasa.gov/neo/rest/v1/feed?start_date={start_str}&end_date={end_str}&api_key={api_key}'
-        
-        self.stdout.write(f'Запрашиваем данные: {start_str} - {end_str}...')
+        if options['base_url']:
+            NASANeoWsService.set_base_url(options['base_url'])
+            self.stdout.write(f"Фид: {options['base_url']}")
 
-        try:
-            response = requests.get(url, timeout=10) 
-            
-            if response.status_code != 200:
-                self.stdout.write(self.style.ERROR(f'ОШИБКА API: {response.status_code}'))
-                self.stdout.write(self.style.ERROR(f'Детали: {response.text}'))
+        if not getattr(settings, 'NASA_API_KEY', '') and not getattr(settings, 'NASA_API_KEYS', []):
+            self.stdout.write(self.style.WARNING('API ключ не найден, используется DEMO_KEY'))
+
+        start_date = options['start'] or timezone.now().date()
+        end_date = options['end'] or start_date + timedelta(days=7)
+        if end_date < start_date:
+            raise CommandError('Конец диапазона раньше начала')
+
+        windows = split_windows(start_date, end_date)
+        states = window_states(windows)
+        if not options['force']:
+            # Историю по умолчанию не перепроверяем, текущую неделю — когда окно устарело
+            if options['max_age'] is not None:
+                max_age = timedelta(seconds=options['max_age'])
+            else:
+                max_age = None if options['start'] else get_freshness()
+            skipped = len(windows)
+            windows = stale_windows(windows, states, max_age=max_age)
+            skipped -= len(windows)
+            if skipped:
+                self.stdout.write(f'Пропущено свежих окон: {skipped}')
+
+        self.stdout.write(f'Запрашиваем данные: {start_date:%Y-%m-%d} - {end_date:%Y-%m-%d} (окон: {len(windows)})...')
+
+        total = IngestResult()
+        failed = []
+        key_pool = ApiKeyPool(NASANeoWsService.get_api_keys())
+
+        def on_window(window, result, error):
+            nonlocal total
+            label = f'{window[0]:%Y-%m-%d} - {window[1]:%Y-%m-%d}'
+            if error is not None:
+                failed.append(window)
+                self.stdout.write(self.style.ERROR(f'  {label}: {error}'))
                 return
+            total += result
+            self.stdout.write(
+                f'  {label}: астероидов +{result.asteroids_created}/~{result.asteroids_updated}, '
+                f'сближений +{result.flybys_created}/~{result.flybys_updated}'
+            )
+
+        backfill_options = dict(
+            workers=options['workers'],
+            key_pool=key_pool,
+            batch_size=options['batch_size'],
+            on_window=on_window,
+            stats=stats,
+            known_hashes={window: state.content_hash for window, state in states.items()},
+        )
+        client = NASANeoWsService.async_client() if options['use_async'] else NASANeoWsService.get_client()
+        try:
+            if options['use_async']:
+                asyncio.run(self.run_async(client, windows, backfill_options))
+            else:
+                run_backfill(windows, **backfill_options)
+        except RateLimitExhausted as e:
+            self.stdout.write(self.style.WARNING(
+                f'{e}. Загруженные окна сохранены, повторный запуск продолжит с места остановки.'
+            ))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'УРА! Астероидов: создано {total.asteroids_created}, обновлено {total.asteroids_updated}; '
+            f'сближений: создано {total.flybys_created}, обновлено {total.flybys_updated}'
+        ))
+        if failed:
+            self.stdout.write(self.style.WARNING(f'Не загружено окон: {len(failed)}'))
+
+        client_stats = client.stats.summary()
+        self.stdout.write(
+            f"Запросов к API: {client_stats['requests']}, повторов: {client_stats['retries']}, "
+            f"ошибок: {client_stats['failures']}, p50: {client_stats['latency_p50'] or 0:.2f} с, "
+            f"p95: {client_stats['latency_p95'] or 0:.2f} с"
+        )
+        self.write_stats(stats)
+        self.apply_retention(options)
+        self.refresh_watchlist()
+        self.sync_replica()
+        self.send_alerts(options)
+
+    async def run_async(self, client, windows, backfill_options):
+        async with client:
+            await arun_backfill(windows, client=client, **backfill_options)
+
+    def apply_retention(self, options):
+        if options['no_retention']:
+            return
+        moved = apply_retention(batch_size=options['batch_size'])
+        if moved:
+            self.stdout.write(f'Перенесено в архив сближений: {moved}')
+
+    def refresh_watchlist(self):
+        # Страница списка отслеживания только читает; прошедшие сближения сдвигаем здесь
+        updated = refresh_passed()
+        if updated:
+            self.stdout.write(f'Списки отслеживания: сдвинуто прошедших сближений {updated}')
+
+    def sync_replica(self):
+        # Файл-реплику SQLite обновляем сами; другие реплики следуют за базой без нас
+        target = sync_replica()
+        if target:
+            self.stdout.write(f'Реплика для чтений обновлена: {target}')
+
+    def send_alerts(self, options):
+        if options['no_alerts']:
+            return
+        result = run_alerts()
+        if result.created or result.sent:
+            self.stdout.write(f'Оповещения: новых {result.created}, отправлено {result.sent} ({result.users} писем)')
+
+    def load_file(self, path, batch_size, stats):
+        self.stdout.write(f'Загружаем дамп фида: {path}...')
+        try:
+            result = ingest_items(FeedStreamParser(iter_file(path)), batch_size=batch_size, stats=stats)
+        except OSError as e:
+            raise CommandError(f'Не удалось прочитать {path}: {e}')
+        self.stdout.write(self.style.SUCCESS(
+            f'УРА! Астероидов: создано {result.asteroids_created}, обновлено {result.asteroids_updated}; '
+            f'сближений: создано {result.flybys_created}, обновлено {result.flybys_updated}'
+        ))
+        self.write_stats(stats)
 
-            data = response.json()
-            count = 0
-            
-            if 'near_earth_objects' not in data:
-                 self.stdout.write(self.style.WARNING('API не вернул объектов.'))
-                 return
-
-            for date_str, asteroids in data['near_earth_objects'].items():
-                for item in asteroids:
-                    try:
-                        asteroid, created = Asteroid.objects.update_or_create(
-                            nasa_id=str(item['id']), 
-                            defaults={
-                                'name': item['name'],
-                                'absolute_magnitude': item['absolute_magnitude_h'],
-                                'is_potentially_hazardous': item['is_potentially_hazardous_asteroid'],
-                                'nasa_jpl_url': item['nasa_jpl_url']
-                            }
-                        )
-                        
-                        for close_data in item['close_approach_data']:
-                           
-                            flyby_date_str = close_data['close_approach_date']
-                           
-                            flyby_date_obj = datetime.strptime(flyby_date_str, '%Y-%m-%d')
-                       
-                            flyby_date_aware = timezone.make_aware(flyby_date_obj)
-
-                            Flyby.objects.update_or_create(
-                                asteroid=asteroid,
-                                date=flyby_date_aware, 
-                                defaults={
-                                    'velocity_kmh': float(close_data['relative_velocity']['kilometers_per_hour']),
-                                    'miss_distance_km': float(close_data['miss_distance']['kilometers'])
-                                }
-                            )
-                        count += 1
-                    except Exception as e:
-                        self.stdout.write(self.style.WARNING(f"Ошибка с астероидом {item.get('name')}: {e}"))
-            
-            self.stdout.write(self.style.SUCCESS(f'УРА! Успешно обработано астероидов: {count}'))
-
-        except Exception as e:
-            self.stdout.write(self.style.ERROR(f'Критическая ошибка скрипта: {e}'))
\ No newline at end of file
+    def write_stats(self, stats):
+        for stage in stats.report():
+            rate = f"{stage['rows_per_sec']:.0f} строк/с" if stage['rows_per_sec'] else '—'
+            self.stdout.write(f"  {stage['stage']}: {stage['rows']} строк за {stage['seconds']:.3f} с ({rate})")
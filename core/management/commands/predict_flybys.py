@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from core.db import sync_replica
+from core.management.commands.load_nasa import parse_date
+from core.orbits import predict_flybys
+
+
+class Command(BaseCommand):
+    help = 'Рассчитывает сближения по элементам орбит на дни, которых нет в данных NeoWs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=parse_date, help='Первый день прогноза (по умолчанию сегодня)')
+        parser.add_argument('--days', type=int, default=settings.NASA_PREDICT_DAYS,
+                            help='Горизонт прогноза в днях (по умолчанию NASA_PREDICT_DAYS)')
+        parser.add_argument('--step', type=float, default=0.25,
+                            help='Шаг грубой сетки в сутках (по умолчанию 0.25)')
+        parser.add_argument('--max-distance-km', type=float, default=settings.NASA_PREDICT_MAX_DISTANCE_KM,
+                            help='Порог дистанции сближения, км (по умолчанию NASA_PREDICT_MAX_DISTANCE_KM)')
+        parser.add_argument('--chunk-size', type=int, default=256,
+                            help='Объектов в одном векторизованном проходе (по умолчанию 256)')
+
+    def handle(self, *args, **options):
+        if options['days'] < 1:
+            raise CommandError('Горизонт должен быть не меньше одного дня')
+        if not 0 < options['step'] <= 1:
+            raise CommandError('Шаг сетки должен быть в пределах (0, 1] суток')
+        result = predict_flybys(
+            start=options['start'],
+            days=options['days'],
+            step=options['step'],
+            max_distance_km=options['max_distance_km'],
+            chunk_size=options['chunk_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Объектов: {result.objects}, сближений записано {result.created}, '
+            f'удалено прежних {result.removed}, пропущено на днях NeoWs {result.skipped} '
+            f'за {result.seconds:.2f} с'
+        ))
+        target = sync_replica()
+        if target:
+            self.stdout.write(f'Реплика для чтений обновлена: {target}')
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from core.watchlist import refresh_passed
+
+
+class Command(BaseCommand):
+    help = 'Сдвигает дату ближайшего сближения в списках отслеживания, если сближение уже прошло'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Строк в одном UPDATE')
+
+    def handle(self, *args, **options):
+        updated = refresh_passed(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Обновлено строк списков отслеживания: {updated}'))
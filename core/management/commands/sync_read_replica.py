@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.db import copy_to_replica, get_read_alias, replica_is_sqlite
+
+
+class Command(BaseCommand):
+    help = 'Копирует основную базу SQLite в файл реплики для чтений (NASA_READ_DB_NAME)'
+
+    def handle(self, *args, **options):
+        if not get_read_alias():
+            raise CommandError('Реплика не настроена: задайте NASA_READ_DB_NAME')
+        if not replica_is_sqlite():
+            raise CommandError('Реплика не SQLite: её обновляет репликация самой базы')
+        self.stdout.write(self.style.SUCCESS(f'Реплика обновлена: {copy_to_replica()}'))
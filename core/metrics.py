@@ -0,0 +1,270 @@
+"""Метрики процесса в текстовом формате Prometheus без внешних зависимостей.
+
+Счётчики и гистограммы живут в памяти процесса: каждый воркер gunicorn/uvicorn
+отдаёт свои значения, Prometheus суммирует их по instance. Наблюдение — это
+поиск серии по меткам и несколько сложений под блокировкой, без обращений к
+базе и сети.
+
+Время и число SQL-запросов запроса считает обёртка курсора, которую
+connection_created ставит на каждое соединение; счётчик запроса лежит в
+contextvar, поэтому запросы асинхронных представлений, выполняемые в потоке
+sync_to_async, тоже попадают к своему запросу.
+"""
+import bisect
+import contextvars
+import threading
+import time
+from dataclasses import dataclass
+
+from django.template.backends.django import DjangoTemplates, Template
+
+# Границы гистограмм по умолчанию, секунды
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name}: ожидаются метки {self.labelnames}, получены {tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            series = sorted(self._series.items())
+            lines.extend(self._render_series(key, value) for key, value in series)
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._series.get(self._key(labels), 0)
+
+    def _render_series(self, key, value):
+        return f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = value
+
+
+@dataclass
+class _HistogramSeries:
+    counts: list
+    total: float = 0.0
+    count: int = 0
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _HistogramSeries(counts=[0] * (len(self.buckets) + 1))
+            series.counts[index] += 1
+            series.total += value
+            series.count += 1
+
+    def count(self, **labels):
+        series = self._series.get(self._key(labels))
+        return series.count if series else 0
+
+    def _render_series(self, key, series):
+        lines = []
+        cumulative = 0
+        for bound, count in zip((*self.buckets, float('inf')), series.counts):
+            cumulative += count
+            labels = _format_labels(self.labelnames, key, [('le', _format_value(float(bound)))])
+            lines.append(f'{self.name}_bucket{labels} {cumulative}')
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f'{self.name}_sum{labels} {_format_value(series.total)}')
+        lines.append(f'{self.name}_count{labels} {series.count}')
+        return '\n'.join(lines)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        return '\n'.join(metric.render() for metric in self._metrics.values()) + '\n'
+
+    def clear(self):
+        for metric in self._metrics.values():
+            metric.clear()
+
+
+REGISTRY = Registry()
+
+REQUEST_DURATION = REGISTRY.register(Histogram(
+    'neo_http_request_duration_seconds', 'Время обработки запроса до ответа', ('view', 'method'),
+))
+REQUESTS = REGISTRY.register(Counter(
+    'neo_http_requests_total', 'Запросы по представлению и коду ответа', ('view', 'method', 'status'),
+))
+REQUEST_DB_DURATION = REGISTRY.register(Histogram(
+    'neo_http_request_db_seconds', 'Время SQL-запросов за один HTTP-запрос', ('view',),
+))
+REQUEST_DB_QUERIES = REGISTRY.register(Histogram(
+    'neo_http_request_db_queries', 'Число SQL-запросов за один HTTP-запрос', ('view',), buckets=QUERY_BUCKETS,
+))
+TEMPLATE_DURATION = REGISTRY.register(Histogram(
+    'neo_template_render_seconds', 'Время отрисовки шаблона', ('template',),
+))
+NEOWS_DURATION = REGISTRY.register(Histogram(
+    'neo_neows_request_duration_seconds', 'Задержка запросов к NeoWs по исходу попытки', ('outcome',),
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+))
+NEOWS_RATE_LIMIT_REMAINING = REGISTRY.register(Gauge(
+    'neo_neows_rate_limit_remaining', 'Остаток квоты ключа по X-RateLimit-Remaining', ('key',),
+))
+INGEST_ROWS = REGISTRY.register(Counter(
+    'neo_ingest_rows_total', 'Записанные загрузкой строки', ('model', 'action'),
+))
+INGEST_DURATION = REGISTRY.register(Histogram(
+    'neo_ingest_duration_seconds', 'Время одной загрузки в базу',
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+))
+
+
+@dataclass
+class QueryStats:
+    """
+    SQL-запросы текущего контекста. Учёт вкладывается: запросы вложенного
+    учёта (например, профилировщика) попадают и во внешний, через parent.
+    """
+    count: int = 0
+    seconds: float = 0.0
+    # Список {'sql', 'ms'} или None, если текст запросов не нужен
+    log: list | None = None
+    parent: 'QueryStats | None' = None
+
+
+_query_stats = contextvars.ContextVar('neo_query_stats', default=None)
+
+
+def start_query_stats(log=False):
+    """Начинает учёт SQL-запросов в текущем контексте; вернуть токен в stop_query_stats."""
+    stats = QueryStats(log=[] if log else None, parent=_query_stats.get())
+    return stats, _query_stats.set(stats)
+
+
+def stop_query_stats(token):
+    _query_stats.reset(token)
+
+
+def query_timer(execute, sql, params, many, context):
+    """Обёртка курсора: время и число запросов, если для контекста открыт учёт."""
+    stats = _query_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        while stats is not None:
+            stats.seconds += elapsed
+            stats.count += 1
+            if stats.log is not None:
+                stats.log.append({'sql': sql, 'params': repr(params)[:500], 'ms': round(elapsed * 1000, 3)})
+            stats = stats.parent
+
+
+def install_query_timer(sender, connection, **kwargs):
+    """Приёмник connection_created: ставит query_timer на новое соединение."""
+    if query_timer not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_timer)
+
+
+def key_label(api_key):
+    """Ключ API в метке без раскрытия: последние четыре символа."""
+    return f'…{api_key[-4:]}' if api_key and len(api_key) > 8 else api_key or 'none'
+
+
+def observe_ingest(result, seconds):
+    """Итог загрузки в счётчики строк и гистограмму времени."""
+    INGEST_DURATION.observe(seconds)
+    for model, action, amount in (
+        ('asteroid', 'created', result.asteroids_created),
+        ('asteroid', 'updated', result.asteroids_updated),
+        ('flyby', 'created', result.flybys_created),
+        ('flyby', 'updated', result.flybys_updated),
+    ):
+        if amount:
+            INGEST_ROWS.inc(amount, model=model, action=action)
+
+
+class InstrumentedTemplate(Template):
+    def render(self, context=None, request=None):
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            TEMPLATE_DURATION.observe(time.perf_counter() - started, template=self.origin.template_name or '<string>')
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """Шаблонный бэкенд Django, который пишет время отрисовки в neo_template_render_seconds."""
+
+    def from_string(self, template_code):
+        return InstrumentedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return InstrumentedTemplate(template.template, self)
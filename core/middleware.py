@@ -0,0 +1,56 @@
+"""Middleware метрик запросов: время, SQL-запросы и код ответа по представлению."""
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from . import metrics
+
+
+def view_label(request):
+    """Имя маршрута как метка: ограниченное множество значений в отличие от пути."""
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else '<unresolved>'
+
+
+class MetricsMiddleware:
+    """
+    Пишет neo_http_* метрики на каждый запрос. Для потоковых ответов (SSE,
+    выгрузки) время считается до начала ответа, а не до конца потока.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, token = metrics.start_query_stats()
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.stop_query_stats(token)
+        self.observe(request, response, time.perf_counter() - started, stats)
+        return response
+
+    async def __acall__(self, request):
+        stats, token = metrics.start_query_stats()
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.stop_query_stats(token)
+        self.observe(request, response, time.perf_counter() - started, stats)
+        return response
+
+    @staticmethod
+    def observe(request, response, seconds, stats):
+        view = view_label(request)
+        metrics.REQUEST_DURATION.observe(seconds, view=view, method=request.method)
+        metrics.REQUESTS.inc(view=view, method=request.method, status=response.status_code)
+        metrics.REQUEST_DB_DURATION.observe(stats.seconds, view=view)
+        metrics.REQUEST_DB_QUERIES.observe(stats.count, view=view)
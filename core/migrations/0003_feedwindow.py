@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-17 02:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_alter_asteroid_id_alter_flyby_id_alter_watchlist_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedWindow',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_date', models.DateField(verbose_name='Начало окна')),
+                ('end_date', models.DateField(verbose_name='Конец окна')),
+                ('asteroid_count', models.PositiveIntegerField(default=0, verbose_name='Астероидов в ответе')),
+                ('completed_at', models.DateTimeField(verbose_name='Дата загрузки')),
+            ],
+            options={
+                'verbose_name': 'Окно загрузки',
+                'verbose_name_plural': 'Окна загрузки',
+                'ordering': ['-start_date'],
+                'unique_together': {('start_date', 'end_date')},
+            },
+        ),
+    ]
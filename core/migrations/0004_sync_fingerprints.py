@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-17 02:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_feedwindow'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='asteroid',
+            name='fingerprint',
+            field=models.CharField(blank=True, default='', max_length=40, verbose_name='Отпечаток данных NASA'),
+        ),
+        migrations.AddField(
+            model_name='feedwindow',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', max_length=64, verbose_name='Хэш содержимого'),
+        ),
+        migrations.AddField(
+            model_name='feedwindow',
+            name='fetched_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Дата последней проверки'),
+        ),
+    ]
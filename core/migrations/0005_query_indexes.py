@@ -0,0 +1,46 @@
+# Generated by Django 5.2.8 on 2026-10-17 02:20
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_hazardous_flag(apps, schema_editor):
+    Asteroid = apps.get_model('core', 'Asteroid')
+    Flyby = apps.get_model('core', 'Flyby')
+    Flyby.objects.update(is_hazardous=Subquery(
+        Asteroid.objects.filter(pk=OuterRef('asteroid_id')).values('is_potentially_hazardous')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_sync_fingerprints'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flyby',
+            name='is_hazardous',
+            field=models.BooleanField(default=False, verbose_name='Потенциально опасный'),
+        ),
+        migrations.RunPython(copy_hazardous_flag, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='asteroid',
+            index=models.Index(fields=['is_potentially_hazardous'], name='asteroid_hazardous_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='flyby',
+            index=models.Index(fields=['date', 'asteroid'], name='flyby_date_asteroid_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='flyby',
+            index=models.Index(fields=['is_hazardous', 'date', 'asteroid'], name='flyby_hazard_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='watchlist',
+            index=models.Index(fields=['user', '-added_at'], name='watchlist_user_added_idx'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.8 on 2026-10-17 02:22
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Q
+from django.db.models.functions import TruncDate
+
+
+def build_daily_stats(apps, schema_editor):
+    Flyby = apps.get_model('core', 'Flyby')
+    DailyFlybyStats = apps.get_model('core', 'DailyFlybyStats')
+    rows = (
+        Flyby.objects.annotate(day=TruncDate('date'))
+        .order_by()
+        .values('day')
+        .annotate(
+            asteroid_count=Count('asteroid_id', distinct=True),
+            hazardous_count=Count('asteroid_id', distinct=True, filter=Q(is_hazardous=True)),
+            min_miss_distance_km=Min('miss_distance_km'),
+            max_velocity_kmh=Max('velocity_kmh'),
+        )
+    )
+    DailyFlybyStats.objects.bulk_create(
+        [DailyFlybyStats(date=row.pop('day'), **row) for row in rows],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyFlybyStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True, verbose_name='День')),
+                ('asteroid_count', models.PositiveIntegerField(default=0, verbose_name='Астероидов')),
+                ('hazardous_count', models.PositiveIntegerField(default=0, verbose_name='Потенциально опасных')),
+                ('min_miss_distance_km', models.FloatField(blank=True, null=True, verbose_name='Минимальная дистанция промаха (км)')),
+                ('max_velocity_kmh', models.FloatField(blank=True, null=True, verbose_name='Максимальная скорость (км/ч)')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата пересчёта')),
+            ],
+            options={
+                'verbose_name': 'Статистика за день',
+                'verbose_name_plural': 'Статистика по дням',
+                'ordering': ['date'],
+            },
+        ),
+        migrations.RunPython(build_daily_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-17 02:23
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def create_generation(apps, schema_editor):
+    DataGeneration = apps.get_model('core', 'DataGeneration')
+    DataGeneration.objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_dailyflybystats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataGeneration',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.PositiveBigIntegerField(default=0, verbose_name='Поколение')),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата изменения')),
+            ],
+            options={
+                'verbose_name': 'Поколение данных',
+                'verbose_name_plural': 'Поколение данных',
+            },
+        ),
+        migrations.RunPython(create_generation, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.8 on 2026-10-17 02:28
+
+import datetime
+import django.core.validators
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_datageneration'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlertRule',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('enabled', models.BooleanField(default=True, verbose_name='Включено')),
+                ('max_miss_distance_km', models.FloatField(blank=True, help_text='Пусто — любая дистанция', null=True, verbose_name='Дистанция промаха не больше (км)')),
+                ('lookahead', models.DurationField(default=datetime.timedelta(days=7), validators=[django.core.validators.MinValueValidator(datetime.timedelta(seconds=3600)), django.core.validators.MaxValueValidator(datetime.timedelta(days=30))], verbose_name='Горизонт оповещения')),
+                ('hazardous_only', models.BooleanField(default=False, verbose_name='Только потенциально опасные')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата изменения')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='alert_rule', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Правило оповещений',
+                'verbose_name_plural': 'Правила оповещений',
+            },
+        ),
+        migrations.CreateModel(
+            name='AlertDelivery',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='Дата отправки')),
+                ('flyby', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alert_deliveries', to='core.flyby', verbose_name='Сближение')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alert_deliveries', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Оповещение',
+                'verbose_name_plural': 'Оповещения',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['sent_at', 'user'], name='alert_unsent_idx')],
+                'unique_together': {('user', 'flyby')},
+            },
+        ),
+    ]
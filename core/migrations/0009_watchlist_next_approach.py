@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-17 02:30
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+
+def fill_next_approach(apps, schema_editor):
+    Flyby = apps.get_model('core', 'Flyby')
+    Watchlist = apps.get_model('core', 'Watchlist')
+    Watchlist.objects.update(next_approach_at=Subquery(
+        Flyby.objects.filter(asteroid_id=OuterRef('asteroid_id'), date__gte=timezone.now())
+        .order_by('date').values('date')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_alerts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='watchlist',
+            name='next_approach_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Ближайшее сближение'),
+        ),
+        migrations.AddIndex(
+            model_name='watchlist',
+            index=models.Index(fields=['user', 'next_approach_at'], name='watchlist_user_next_idx'),
+        ),
+        migrations.RunPython(fill_next_approach, migrations.RunPython.noop),
+    ]
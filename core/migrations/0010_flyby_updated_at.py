@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 02:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_watchlist_next_approach'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flyby',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата обновления'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.8 on 2026-10-17 02:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_flyby_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfileCapture',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Дата')),
+                ('trigger', models.CharField(choices=[('manual', 'По запросу сотрудника'), ('threshold', 'Порог времени')], max_length=16, verbose_name='Причина')),
+                ('method', models.CharField(max_length=8, verbose_name='Метод')),
+                ('path', models.CharField(max_length=500, verbose_name='Путь')),
+                ('view_name', models.CharField(blank=True, db_index=True, max_length=100, verbose_name='Представление')),
+                ('status_code', models.PositiveSmallIntegerField(verbose_name='Код ответа')),
+                ('duration_ms', models.FloatField(verbose_name='Время (мс)')),
+                ('db_ms', models.FloatField(verbose_name='Время SQL (мс)')),
+                ('query_count', models.PositiveIntegerField(verbose_name='SQL-запросов')),
+                ('sql_log', models.JSONField(default=list, verbose_name='Журнал SQL')),
+                ('profile_text', models.TextField(blank=True, verbose_name='Профиль')),
+                ('profile_data', models.BinaryField(blank=True, null=True, verbose_name='Данные pstats')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Профиль запроса',
+                'verbose_name_plural': 'Профили запросов',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
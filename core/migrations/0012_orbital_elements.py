@@ -0,0 +1,58 @@
+# Generated by Django 5.2.8 on 2026-10-17 02:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_profilecapture'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='asteroid',
+            name='ascending_node_deg',
+            field=models.FloatField(blank=True, null=True, verbose_name='Долгота восходящего узла (°)'),
+        ),
+        migrations.AddField(
+            model_name='asteroid',
+            name='eccentricity',
+            field=models.FloatField(blank=True, null=True, verbose_name='Эксцентриситет'),
+        ),
+        migrations.AddField(
+            model_name='asteroid',
+            name='inclination_deg',
+            field=models.FloatField(blank=True, null=True, verbose_name='Наклонение (°)'),
+        ),
+        migrations.AddField(
+            model_name='asteroid',
+            name='mean_anomaly_deg',
+            field=models.FloatField(blank=True, null=True, verbose_name='Средняя аномалия на эпоху (°)'),
+        ),
+        migrations.AddField(
+            model_name='asteroid',
+            name='orbit_epoch_jd',
+            field=models.FloatField(blank=True, null=True, verbose_name='Эпоха элементов (JD)'),
+        ),
+        migrations.AddField(
+            model_name='asteroid',
+            name='orbit_source',
+            field=models.CharField(blank=True, default='', max_length=20, verbose_name='Источник элементов'),
+        ),
+        migrations.AddField(
+            model_name='asteroid',
+            name='perihelion_arg_deg',
+            field=models.FloatField(blank=True, null=True, verbose_name='Аргумент перигелия (°)'),
+        ),
+        migrations.AddField(
+            model_name='asteroid',
+            name='semi_major_axis_au',
+            field=models.FloatField(blank=True, null=True, verbose_name='Большая полуось (а.е.)'),
+        ),
+        migrations.AddField(
+            model_name='flyby',
+            name='source',
+            field=models.CharField(choices=[('neows', 'NASA NeoWs'), ('local', 'Локальный прогноз')], default='neows', max_length=8, verbose_name='Источник'),
+        ),
+    ]
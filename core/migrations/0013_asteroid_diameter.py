@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-17 02:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_orbital_elements'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='asteroid',
+            name='diameter_max_m',
+            field=models.FloatField(blank=True, null=True, verbose_name='Диаметр, до (м)'),
+        ),
+        migrations.AddField(
+            model_name='asteroid',
+            name='diameter_min_m',
+            field=models.FloatField(blank=True, null=True, verbose_name='Диаметр, от (м)'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.8 on 2026-10-17 03:05
+
+from django.db import migrations
+
+# Снимок SQL на момент миграции; актуальная версия и восстановление триггеров — core.search
+FORWARD = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS core_asteroid_search USING fts5(
+        name, nasa_id, content='core_asteroid', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='1 2 3 4'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_asteroid_search_ai AFTER INSERT ON core_asteroid BEGIN
+        INSERT INTO core_asteroid_search(rowid, name, nasa_id) VALUES (new.id, new.name, new.nasa_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_asteroid_search_ad AFTER DELETE ON core_asteroid BEGIN
+        INSERT INTO core_asteroid_search(core_asteroid_search, rowid, name, nasa_id)
+        VALUES ('delete', old.id, old.name, old.nasa_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_asteroid_search_au AFTER UPDATE OF name, nasa_id ON core_asteroid BEGIN
+        INSERT INTO core_asteroid_search(core_asteroid_search, rowid, name, nasa_id)
+        VALUES ('delete', old.id, old.name, old.nasa_id);
+        INSERT INTO core_asteroid_search(rowid, name, nasa_id) VALUES (new.id, new.name, new.nasa_id);
+    END
+    """,
+    "INSERT INTO core_asteroid_search(core_asteroid_search) VALUES ('rebuild')",
+]
+BACKWARD = [
+    'DROP TRIGGER IF EXISTS core_asteroid_search_ai',
+    'DROP TRIGGER IF EXISTS core_asteroid_search_ad',
+    'DROP TRIGGER IF EXISTS core_asteroid_search_au',
+    'DROP TABLE IF EXISTS core_asteroid_search',
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        # FTS5 есть только в SQLite; на других базах поиск работает без индекса
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_asteroid_diameter'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(FORWARD), run(BACKWARD)),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-17 03:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_asteroid_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedFlyby',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateTimeField(verbose_name='Дата сближения')),
+                ('velocity_kmh', models.FloatField(verbose_name='Скорость (км/ч)')),
+                ('miss_distance_km', models.FloatField(verbose_name='Дистанция промаха (км)')),
+                ('is_hazardous', models.BooleanField(default=False, verbose_name='Потенциально опасный')),
+                ('source', models.CharField(choices=[('neows', 'NASA NeoWs'), ('local', 'Локальный прогноз')], default='neows', max_length=8, verbose_name='Источник')),
+                ('created_at', models.DateTimeField(verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(verbose_name='Дата обновления')),
+                ('asteroid', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_flybys', to='core.asteroid', verbose_name='Астероид')),
+            ],
+            options={
+                'verbose_name': 'Архивное сближение',
+                'verbose_name_plural': 'Архив сближений',
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['date', 'asteroid'], name='archived_flyby_date_idx')],
+                'unique_together': {('asteroid', 'date')},
+            },
+        ),
+    ]
@@ -1,3 +1,6 @@
+from datetime import timedelta
+
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
@@ -10,13 +13,34 @@ class Asteroid(models.Model):
     absolute_magnitude = models.FloatField(null=True, blank=True, verbose_name='Абсолютная звёздная величина')
     is_potentially_hazardous = models.BooleanField(default=False, verbose_name='Потенциально опасный')
     nasa_jpl_url = models.URLField(max_length=500, blank=True, verbose_name='URL на сайте NASA JPL')
+    fingerprint = models.CharField(max_length=40, blank=True, default='', verbose_name='Отпечаток данных NASA')
+    # Оценка диаметра NeoWs (estimated_diameter.meters): границы для альбедо 0,25 и 0,05
+    diameter_min_m = models.FloatField(null=True, blank=True, verbose_name='Диаметр, от (м)')
+    diameter_max_m = models.FloatField(null=True, blank=True, verbose_name='Диаметр, до (м)')
+    # Оскулирующие элементы орбиты (гелиоцентрические, эклиптика J2000) для локального прогноза сближений
+    orbit_epoch_jd = models.FloatField(null=True, blank=True, verbose_name='Эпоха элементов (JD)')
+    semi_major_axis_au = models.FloatField(null=True, blank=True, verbose_name='Большая полуось (а.е.)')
+    eccentricity = models.FloatField(null=True, blank=True, verbose_name='Эксцентриситет')
+    inclination_deg = models.FloatField(null=True, blank=True, verbose_name='Наклонение (°)')
+    ascending_node_deg = models.FloatField(null=True, blank=True, verbose_name='Долгота восходящего узла (°)')
+    perihelion_arg_deg = models.FloatField(null=True, blank=True, verbose_name='Аргумент перигелия (°)')
+    mean_anomaly_deg = models.FloatField(null=True, blank=True, verbose_name='Средняя аномалия на эпоху (°)')
+    orbit_source = models.CharField(max_length=20, blank=True, default='', verbose_name='Источник элементов')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
 
+    ORBIT_FIELDS = (
+        'orbit_epoch_jd', 'semi_major_axis_au', 'eccentricity', 'inclination_deg',
+        'ascending_node_deg', 'perihelion_arg_deg', 'mean_anomaly_deg',
+    )
+
     class Meta:
         verbose_name = 'Астероид'
         verbose_name_plural = 'Астероиды'
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['is_potentially_hazardous'], name='asteroid_hazardous_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.nasa_id})"
@@ -24,17 +48,67 @@ class Asteroid(models.Model):
 
 class Flyby(models.Model):
     """Модель сближения астероида с Землёй."""
+    SOURCE_NEOWS = 'neows'
+    SOURCE_LOCAL = 'local'
+    SOURCE_CHOICES = [
+        (SOURCE_NEOWS, 'NASA NeoWs'),
+        (SOURCE_LOCAL, 'Локальный прогноз'),
+    ]
+
     asteroid = models.ForeignKey(Asteroid, on_delete=models.CASCADE, related_name='flybys', verbose_name='Астероид')
     date = models.DateTimeField(verbose_name='Дата сближения')
     velocity_kmh = models.FloatField(verbose_name='Скорость (км/ч)')
     miss_distance_km = models.FloatField(verbose_name='Дистанция промаха (км)')
+    # Копия Asteroid.is_potentially_hazardous, поддерживается загрузкой: фильтр по опасности без JOIN
+    is_hazardous = models.BooleanField(default=False, verbose_name='Потенциально опасный')
+    # local — кандидат, рассчитанный predict_flybys по элементам орбиты, а не пришедший из фида
+    source = models.CharField(max_length=8, choices=SOURCE_CHOICES, default=SOURCE_NEOWS, verbose_name='Источник')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    # Время последней записи загрузкой: по нему живая лента находит изменившиеся сближения
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
 
     class Meta:
         verbose_name = 'Сближение'
         verbose_name_plural = 'Сближения'
         ordering = ['-date']
         unique_together = ['asteroid', 'date']
+        indexes = [
+            # Диапазон дат с сортировкой и COUNT(DISTINCT asteroid_id) только по индексу
+            models.Index(fields=['date', 'asteroid'], name='flyby_date_asteroid_idx'),
+            models.Index(fields=['is_hazardous', 'date', 'asteroid'], name='flyby_hazard_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.asteroid.name} - {self.date.strftime('%Y-%m-%d %H:%M')}"
+
+
+class ArchivedFlyby(models.Model):
+    """
+    Сближение старше горизонта хранения, перенесённое из Flyby (core.retention).
+
+    Те же столбцы, что у Flyby; даты создания и обновления копируются как есть.
+    """
+    asteroid = models.ForeignKey(
+        Asteroid, on_delete=models.CASCADE, related_name='archived_flybys', verbose_name='Астероид',
+    )
+    date = models.DateTimeField(verbose_name='Дата сближения')
+    velocity_kmh = models.FloatField(verbose_name='Скорость (км/ч)')
+    miss_distance_km = models.FloatField(verbose_name='Дистанция промаха (км)')
+    is_hazardous = models.BooleanField(default=False, verbose_name='Потенциально опасный')
+    source = models.CharField(
+        max_length=8, choices=Flyby.SOURCE_CHOICES, default=Flyby.SOURCE_NEOWS, verbose_name='Источник',
+    )
+    created_at = models.DateTimeField(verbose_name='Дата создания')
+    updated_at = models.DateTimeField(verbose_name='Дата обновления')
+
+    class Meta:
+        verbose_name = 'Архивное сближение'
+        verbose_name_plural = 'Архив сближений'
+        ordering = ['-date']
+        unique_together = ['asteroid', 'date']
+        indexes = [
+            models.Index(fields=['date', 'asteroid'], name='archived_flyby_date_idx'),
+        ]
 
     def __str__(self):
         return f"{self.asteroid.name} - {self.date.strftime('%Y-%m-%d %H:%M')}"
@@ -46,12 +120,150 @@ class Watchlist(models.Model):
     asteroid = models.ForeignKey(Asteroid, on_delete=models.CASCADE, related_name='watchlist_items', verbose_name='Астероид')
     user_notes = models.TextField(blank=True, verbose_name='Заметки пользователя')
     added_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата добавления')
+    # Ближайшее предстоящее сближение астероида; пересчитывается загрузкой и страницей списка
+    next_approach_at = models.DateTimeField(null=True, blank=True, verbose_name='Ближайшее сближение')
 
     class Meta:
         verbose_name = 'Элемент списка отслеживания'
         verbose_name_plural = 'Списки отслеживания'
         ordering = ['-added_at']
         unique_together = ['user', 'asteroid']
+        indexes = [
+            models.Index(fields=['user', '-added_at'], name='watchlist_user_added_idx'),
+            models.Index(fields=['user', 'next_approach_at'], name='watchlist_user_next_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.asteroid.name}"
+
+
+class FeedWindow(models.Model):
+    """Окно дат фида NeoWs, загруженное в базу (контрольная точка для дозагрузки)."""
+    start_date = models.DateField(verbose_name='Начало окна')
+    end_date = models.DateField(verbose_name='Конец окна')
+    asteroid_count = models.PositiveIntegerField(default=0, verbose_name='Астероидов в ответе')
+    content_hash = models.CharField(max_length=64, blank=True, default='', verbose_name='Хэш содержимого')
+    completed_at = models.DateTimeField(verbose_name='Дата загрузки')
+    fetched_at = models.DateTimeField(null=True, blank=True, verbose_name='Дата последней проверки')
+
+    class Meta:
+        verbose_name = 'Окно загрузки'
+        verbose_name_plural = 'Окна загрузки'
+        ordering = ['-start_date']
+        unique_together = ['start_date', 'end_date']
+
+    def __str__(self):
+        return f"{self.start_date:%Y-%m-%d} - {self.end_date:%Y-%m-%d}"
+
+
+class DailyFlybyStats(models.Model):
+    """Агрегаты сближений за день; пересчитываются загрузкой для затронутых дней."""
+    date = models.DateField(unique=True, verbose_name='День')
+    asteroid_count = models.PositiveIntegerField(default=0, verbose_name='Астероидов')
+    hazardous_count = models.PositiveIntegerField(default=0, verbose_name='Потенциально опасных')
+    min_miss_distance_km = models.FloatField(null=True, blank=True, verbose_name='Минимальная дистанция промаха (км)')
+    max_velocity_kmh = models.FloatField(null=True, blank=True, verbose_name='Максимальная скорость (км/ч)')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата пересчёта')
+
+    class Meta:
+        verbose_name = 'Статистика за день'
+        verbose_name_plural = 'Статистика по дням'
+        ordering = ['date']
+
+    def __str__(self):
+        return f"{self.date:%Y-%m-%d}: {self.asteroid_count}"
+
+
+class DataGeneration(models.Model):
+    """Номер поколения данных: увеличивается после каждой загрузки, изменившей данные."""
+    value = models.PositiveBigIntegerField(default=0, verbose_name='Поколение')
+    changed_at = models.DateTimeField(default=timezone.now, verbose_name='Дата изменения')
+
+    class Meta:
+        verbose_name = 'Поколение данных'
+        verbose_name_plural = 'Поколение данных'
+
+    def __str__(self):
+        return f"#{self.value} ({self.changed_at:%Y-%m-%d %H:%M})"
+
+
+class AlertRule(models.Model):
+    """Пороги оповещений пользователя о сближениях отслеживаемых астероидов."""
+    MAX_LOOKAHEAD = timedelta(days=30)
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='alert_rule', verbose_name='Пользователь')
+    enabled = models.BooleanField(default=True, verbose_name='Включено')
+    max_miss_distance_km = models.FloatField(
+        null=True, blank=True, verbose_name='Дистанция промаха не больше (км)',
+        help_text='Пусто — любая дистанция',
+    )
+    # Интервал, а не число дней: окно rule.lookahead складывается с текущим временем прямо в SQL
+    lookahead = models.DurationField(
+        default=timedelta(days=7),
+        validators=[MinValueValidator(timedelta(hours=1)), MaxValueValidator(MAX_LOOKAHEAD)],
+        verbose_name='Горизонт оповещения',
+    )
+    hazardous_only = models.BooleanField(default=False, verbose_name='Только потенциально опасные')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата изменения')
+
+    class Meta:
+        verbose_name = 'Правило оповещений'
+        verbose_name_plural = 'Правила оповещений'
+
+    def __str__(self):
+        return f"{self.user.username}: {self.lookahead.days} дн."
+
+
+class AlertDelivery(models.Model):
+    """Оповещение пользователя о сближении; уникальность пары исключает повторы."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='alert_deliveries', verbose_name='Пользователь')
+    flyby = models.ForeignKey(Flyby, on_delete=models.CASCADE, related_name='alert_deliveries', verbose_name='Сближение')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name='Дата отправки')
+
+    class Meta:
+        verbose_name = 'Оповещение'
+        verbose_name_plural = 'Оповещения'
+        ordering = ['-created_at']
+        unique_together = ['user', 'flyby']
+        indexes = [
+            models.Index(fields=['sent_at', 'user'], name='alert_unsent_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.flyby}"
+
+
+class ProfileCapture(models.Model):
+    """Профиль медленного запроса: cProfile и журнал SQL, снятые ProfilingMiddleware."""
+    TRIGGER_MANUAL = 'manual'
+    TRIGGER_THRESHOLD = 'threshold'
+    TRIGGER_CHOICES = [
+        (TRIGGER_MANUAL, 'По запросу сотрудника'),
+        (TRIGGER_THRESHOLD, 'Порог времени'),
+    ]
+
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Дата')
+    trigger = models.CharField(max_length=16, choices=TRIGGER_CHOICES, verbose_name='Причина')
+    user = models.ForeignKey(
+        User, null=True, blank=True, on_delete=models.SET_NULL, related_name='+', verbose_name='Пользователь',
+    )
+    method = models.CharField(max_length=8, verbose_name='Метод')
+    path = models.CharField(max_length=500, verbose_name='Путь')
+    view_name = models.CharField(max_length=100, blank=True, db_index=True, verbose_name='Представление')
+    status_code = models.PositiveSmallIntegerField(verbose_name='Код ответа')
+    duration_ms = models.FloatField(verbose_name='Время (мс)')
+    db_ms = models.FloatField(verbose_name='Время SQL (мс)')
+    query_count = models.PositiveIntegerField(verbose_name='SQL-запросов')
+    sql_log = models.JSONField(default=list, verbose_name='Журнал SQL')
+    # Текстовая сводка pstats и сырые данные для snakeviz/pstats; пусто, если профиль не снимался
+    profile_text = models.TextField(blank=True, verbose_name='Профиль')
+    profile_data = models.BinaryField(null=True, blank=True, verbose_name='Данные pstats')
+
+    class Meta:
+        verbose_name = 'Профиль запроса'
+        verbose_name_plural = 'Профили запросов'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.method} {self.path} — {self.duration_ms:.0f} мс"
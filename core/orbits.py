@@ -0,0 +1,314 @@
+"""Элементы орбит астероидов и локальный прогноз сближений по ним.
+
+Элементы импортируются из ответов NeoWs lookup/browse (orbital_data) или из
+файла в формате MPCORB.DAT Центра малых планет. Прогноз считает сближения
+всех астероидов с элементами одним векторизованным проходом (propagator)
+и пишет их в Flyby с source=local только на дни, которых ещё нет в данных
+фида: загруженное из NeoWs всегда важнее расчёта.
+"""
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .aggregates import refresh_daily_stats
+from .caching import bump_generation
+from .ingest import normalize_asteroid
+from .models import Asteroid, Flyby
+from .propagator import AU_KM, J2000_JD, Elements, find_approaches
+from .queries import day_start
+from .watchlist import refresh_for_asteroids
+
+logger = logging.getLogger(__name__)
+
+# Источник элементов орбиты (Asteroid.orbit_source); не путать с Flyby.source
+ORBIT_SOURCE_NEOWS = 'neows'
+ORBIT_SOURCE_MPC = 'mpc'
+# Поле модели -> ключ orbital_data ответа NeoWs
+NEOWS_ORBIT_KEYS = {
+    'orbit_epoch_jd': 'epoch_osculation',
+    'semi_major_axis_au': 'semi_major_axis',
+    'eccentricity': 'eccentricity',
+    'inclination_deg': 'inclination',
+    'ascending_node_deg': 'ascending_node_longitude',
+    'perihelion_arg_deg': 'perihelion_argument',
+    'mean_anomaly_deg': 'mean_anomaly',
+}
+# Нумерованные астероиды в NeoWs: id = 2000000 + номер
+NUMBERED_ID_BASE = 2_000_000
+
+
+def date_to_jd(day):
+    """Юлианская дата полуночи дня."""
+    return day.toordinal() + 1721424.5
+
+
+J2000 = datetime(2000, 1, 1, 12, tzinfo=dt_timezone.utc)
+
+
+def datetime_to_jd(moment):
+    """Юлианская дата момента с часовым поясом."""
+    return J2000_JD + (moment - J2000) / timedelta(days=1)
+
+
+def jd_to_datetime(jd):
+    """Момент UTC для юлианской даты, с точностью до минуты, как в фиде."""
+    moment = J2000 + timedelta(days=float(jd) - J2000_JD)
+    return (moment + timedelta(seconds=30)).replace(second=0, microsecond=0)
+
+
+def neows_elements(asteroid_data):
+    """Элементы из orbital_data объекта NeoWs; ValueError, если чего-то нет."""
+    orbital = asteroid_data.get('orbital_data') or {}
+    try:
+        return {name: float(orbital[key]) for name, key in NEOWS_ORBIT_KEYS.items()}
+    except (KeyError, TypeError) as e:
+        raise ValueError(f'нет элемента орбиты {e}') from e
+
+
+def iter_neows_objects(data):
+    """Объекты из ответа lookup (один объект), browse ({'near_earth_objects': [...]}) или списка."""
+    if isinstance(data, list):
+        yield from data
+    elif isinstance(data, dict) and isinstance(data.get('near_earth_objects'), list):
+        yield from data['near_earth_objects']
+    elif isinstance(data, dict):
+        yield data
+
+
+def _unpack_digit(char):
+    """Цифра упакованного формата MPC: 0-9, затем A=10 ... V=31."""
+    return int(char) if char.isdigit() else ord(char) - ord('A') + 10
+
+
+def unpack_epoch(packed):
+    """Упакованная эпоха MPC (например, K2555 = 2025-05-05) в JD."""
+    century = {'I': 1800, 'J': 1900, 'K': 2000}[packed[0]]
+    day = date(century + int(packed[1:3]), _unpack_digit(packed[3]), _unpack_digit(packed[4]))
+    return date_to_jd(day)
+
+
+def parse_mpc_line(line):
+    """
+    Строка MPCORB.DAT: (номер или None, обозначение, элементы).
+
+    Колонки по описанию формата MPC: эпоха 21-25, M 27-35, ω 38-46, Ω 49-57,
+    i 60-68, e 71-79, a 93-103, читаемое обозначение 167-194.
+    """
+    elements = {
+        'orbit_epoch_jd': unpack_epoch(line[20:25].strip()),
+        'mean_anomaly_deg': float(line[26:35]),
+        'perihelion_arg_deg': float(line[37:46]),
+        'ascending_node_deg': float(line[48:57]),
+        'inclination_deg': float(line[59:68]),
+        'eccentricity': float(line[70:79]),
+        'semi_major_axis_au': float(line[92:103]),
+    }
+    readable = line[166:194].strip()
+    number = None
+    if readable.startswith('('):
+        number = int(readable[1:readable.index(')')])
+        designation = readable[readable.index(')') + 1:].strip()
+    else:
+        designation = readable
+    return number, designation, elements
+
+
+def iter_mpc_records(lines):
+    """Записи MPCORB.DAT; заголовок до строки из дефисов и короткие строки пропускаются."""
+    lines = list(lines)
+    if any(line.startswith('-----') for line in lines):
+        lines = lines[next(i for i, line in enumerate(lines) if line.startswith('-----')) + 1:]
+    for line in lines:
+        if len(line.rstrip()) < 103:
+            continue
+        try:
+            yield parse_mpc_line(line)
+        except (ValueError, KeyError, IndexError) as e:
+            logger.warning("Пропущена строка MPC %r: %s", line[:20], e)
+
+
+@dataclass
+class OrbitImportResult:
+    updated: int = 0
+    created: int = 0
+    unmatched: list = field(default_factory=list)
+
+
+def _save_elements(by_nasa_id, source, batch_size, result):
+    """Записывает элементы существующим астероидам; возвращает nasa_id без астероида в базе."""
+    now = timezone.now()
+    missing = set(by_nasa_id)
+    nasa_ids = list(by_nasa_id)
+    for i in range(0, len(nasa_ids), batch_size):
+        rows = Asteroid.objects.filter(nasa_id__in=nasa_ids[i:i + batch_size]).order_by().values_list('nasa_id', 'id')
+        updates = [
+            Asteroid(id=pk, nasa_id=nasa_id, orbit_source=source, updated_at=now, **by_nasa_id[nasa_id])
+            for nasa_id, pk in rows
+        ]
+        Asteroid.objects.bulk_update(
+            updates, [*Asteroid.ORBIT_FIELDS, 'orbit_source', 'updated_at'], batch_size=batch_size,
+        )
+        result.updated += len(updates)
+        missing -= {asteroid.nasa_id for asteroid in updates}
+    return missing
+
+
+def import_neows(data, batch_size=None):
+    """
+    Элементы из ответов NeoWs lookup/browse. Астероиды, которых ещё нет в
+    базе, создаются из тех же объектов.
+    """
+    batch_size = batch_size or getattr(settings, 'NASA_INGEST_BATCH_SIZE', 500)
+    result = OrbitImportResult()
+    elements, objects = {}, {}
+    for asteroid_data in iter_neows_objects(data):
+        try:
+            nasa_id, fields = normalize_asteroid(asteroid_data)
+            elements[nasa_id] = neows_elements(asteroid_data)
+        except ValueError as e:
+            result.unmatched.append(str(asteroid_data.get('id', 'unknown')))
+            logger.warning("Нет элементов орбиты для %s: %s", asteroid_data.get('id', 'unknown'), e)
+            continue
+        objects[nasa_id] = fields
+
+    with transaction.atomic():
+        missing = _save_elements(elements, ORBIT_SOURCE_NEOWS, batch_size, result)
+        Asteroid.objects.bulk_create(
+            [
+                Asteroid(nasa_id=nasa_id, orbit_source=ORBIT_SOURCE_NEOWS, **objects[nasa_id], **elements[nasa_id])
+                for nasa_id in sorted(missing)
+            ],
+            batch_size=batch_size,
+        )
+        result.created = len(missing)
+    return result
+
+
+def import_mpc(lines, batch_size=None):
+    """
+    Элементы из MPCORB.DAT. Нумерованные объекты сопоставляются по id NeoWs
+    (2000000 + номер), остальные — по названию вида «(2020 AB)»; объекты без
+    пары в базе пропускаются: у них нет id NeoWs.
+    """
+    batch_size = batch_size or getattr(settings, 'NASA_INGEST_BATCH_SIZE', 500)
+    result = OrbitImportResult()
+    by_nasa_id, by_name = {}, {}
+    for number, designation, elements in iter_mpc_records(lines):
+        if number is not None:
+            by_nasa_id[str(NUMBERED_ID_BASE + number)] = elements
+        elif designation:
+            by_name[f'({designation})'] = elements
+
+    with transaction.atomic():
+        names = list(by_name)
+        for i in range(0, len(names), batch_size):
+            for name, nasa_id in Asteroid.objects.filter(name__in=names[i:i + batch_size]).values_list('name', 'nasa_id'):
+                by_nasa_id[nasa_id] = by_name.pop(name)
+        result.unmatched = sorted(_save_elements(by_nasa_id, ORBIT_SOURCE_MPC, batch_size, result)) + sorted(by_name)
+    return result
+
+
+def import_file(path, fmt='auto', batch_size=None):
+    """Импорт из файла: JSON NeoWs или MPCORB.DAT (auto — по первому непустому символу)."""
+    with open(path, encoding='utf-8') as f:
+        content = f.read()
+    if fmt == 'auto':
+        fmt = 'neows' if content.lstrip()[:1] in ('{', '[') else 'mpc'
+    if fmt == 'neows':
+        return import_neows(json.loads(content), batch_size)
+    return import_mpc(content.splitlines(), batch_size)
+
+
+@dataclass
+class PredictionResult:
+    objects: int = 0
+    created: int = 0
+    removed: int = 0
+    skipped: int = 0
+    seconds: float = 0.0
+
+
+def catalogue():
+    """Астероиды с элементами орбиты: (id, флаг опасности) и Elements в том же порядке."""
+    rows = list(
+        Asteroid.objects.filter(eccentricity__lt=1, **{f'{name}__isnull': False for name in Asteroid.ORBIT_FIELDS})
+        .order_by('id')
+        .values_list('id', 'is_potentially_hazardous', *Asteroid.ORBIT_FIELDS)
+    )
+    return [row[:2] for row in rows], Elements.from_rows([row[2:] for row in rows])
+
+
+def predict_flybys(start=None, days=365, step=0.25, max_distance_km=None, chunk_size=256, batch_size=None):
+    """
+    Пересчитывает локальный прогноз сближений на [start, start + days).
+
+    Прежний прогноз в интервале удаляется; новый не пишется на дни, где уже
+    есть сближения из фида NeoWs. Агрегаты дней, next_approach_at списков
+    отслеживания и поколение данных обновляются как после загрузки.
+    """
+    batch_size = batch_size or getattr(settings, 'NASA_INGEST_BATCH_SIZE', 500)
+    max_distance_km = max_distance_km or getattr(settings, 'NASA_PREDICT_MAX_DISTANCE_KM', 0.05 * AU_KM)
+    start = start or timezone.localdate()
+    end = start + timedelta(days=days)
+    started = time.perf_counter()
+
+    asteroids, elements = catalogue()
+    approaches = find_approaches(
+        elements,
+        datetime_to_jd(day_start(start)),
+        datetime_to_jd(day_start(end)),
+        step=step,
+        max_distance_au=max_distance_km / AU_KM,
+        chunk_size=chunk_size,
+    )
+    result = PredictionResult(objects=len(asteroids))
+
+    window = Flyby.objects.filter(date__gte=day_start(start), date__lt=day_start(end))
+    covered = set(
+        window.filter(source=Flyby.SOURCE_NEOWS).annotate(day=TruncDate('date'))
+        .order_by().values_list('day', flat=True).distinct()
+    )
+    predicted = []
+    for index, jd, distance_au, velocity_kmh in zip(
+        approaches.index, approaches.jd, approaches.distance_au, approaches.velocity_kmh,
+    ):
+        moment = jd_to_datetime(jd)
+        if timezone.localdate(moment) in covered:
+            result.skipped += 1
+            continue
+        asteroid_id, hazardous = asteroids[index]
+        predicted.append(Flyby(
+            asteroid_id=asteroid_id,
+            date=moment,
+            velocity_kmh=float(velocity_kmh),
+            miss_distance_km=float(distance_au) * AU_KM,
+            is_hazardous=hazardous,
+            source=Flyby.SOURCE_LOCAL,
+        ))
+
+    with transaction.atomic():
+        previous = window.filter(source=Flyby.SOURCE_LOCAL)
+        touched = set(previous.order_by().values_list('asteroid_id', flat=True).distinct())
+        days_changed = {
+            timezone.localdate(moment) for moment in previous.order_by().values_list('date', flat=True)
+        }
+        result.removed, _ = previous.delete()
+        # Совпадение момента с записью фида (тот же астероид и минута) оставляет запись фида
+        Flyby.objects.bulk_create(predicted, batch_size=batch_size, ignore_conflicts=True)
+        result.created = len(predicted)
+        touched |= {flyby.asteroid_id for flyby in predicted}
+        days_changed |= {timezone.localdate(flyby.date) for flyby in predicted}
+
+        refresh_daily_stats(days_changed, batch_size=batch_size)
+        refresh_for_asteroids(touched, batch_size=batch_size)
+        if days_changed:
+            bump_generation()
+    result.seconds = time.perf_counter() - started
+    return result
@@ -0,0 +1,134 @@
+"""Keyset-пагинация: страница определяется значениями ключа сортировки последней строки."""
+import base64
+import json
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import F, Q
+
+
+class InvalidCursor(ValueError):
+    """Курсор повреждён или не соответствует ключу сортировки."""
+
+
+@dataclass
+class KeysetPage:
+    items: list
+    next_cursor: str | None
+    page_size: int
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def get_page_size(value, default=None, maximum=None):
+    """Размер страницы из параметра запроса, ограниченный maximum (по умолчанию NASA_PAGE_SIZE_MAX)."""
+    default = default or getattr(settings, 'NASA_PAGE_SIZE', 50)
+    maximum = maximum or getattr(settings, 'NASA_PAGE_SIZE_MAX', 500)
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, maximum))
+
+
+def encode_cursor(values):
+    payload = json.dumps([value.isoformat() if hasattr(value, 'isoformat') else value for value in values])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, model, fields):
+    """Значения ключа из курсора, приведённые к типам полей модели."""
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(f"Некорректный курсор: {e}") from e
+    if not isinstance(raw, list) or len(raw) != len(fields):
+        raise InvalidCursor("Курсор не соответствует сортировке")
+    try:
+        return [model._meta.get_field(field.lstrip('-')).to_python(value) for field, value in zip(fields, raw)]
+    except ValidationError as e:
+        raise InvalidCursor(f"Некорректный курсор: {e}") from e
+
+
+def _nullable(model, field):
+    return model._meta.get_field(field.lstrip('-')).null
+
+
+def _ordering(model, fields):
+    """Сортировка по ключу; NULL у допускающих его полей идут последними в обоих направлениях."""
+    ordering = []
+    for field in fields:
+        name = field.lstrip('-')
+        if not _nullable(model, field):
+            ordering.append(field)
+        elif field.startswith('-'):
+            ordering.append(F(name).desc(nulls_last=True))
+        else:
+            ordering.append(F(name).asc(nulls_last=True))
+    return ordering
+
+
+def _after(model, fields, values):
+    """Условие «строго после» для ключа (f1, f2, ...) с учётом направления сортировки и NULL."""
+    condition = Q()
+    prefix = Q()
+    for field, value in zip(fields, values):
+        name = field.lstrip('-')
+        nullable = _nullable(model, field)
+        if value is None:
+            # После NULL на этом уровне ничего нет: остаются только совпадения по нему
+            prefix &= Q(**{f'{name}__isnull': True})
+            continue
+        step = Q(**{f'{name}__{"lt" if field.startswith("-") else "gt"}': value})
+        if nullable:
+            step |= Q(**{f'{name}__isnull': True})
+        condition |= prefix & step
+        prefix &= Q(**{name: value})
+    return condition
+
+
+def _page_queryset(queryset, fields, cursor, page_size):
+    model = queryset.model
+    queryset = queryset.order_by(*_ordering(model, fields))
+    if cursor:
+        queryset = queryset.filter(_after(model, fields, decode_cursor(cursor, model, fields)))
+    return queryset[:page_size + 1]
+
+
+def _make_page(items, fields, page_size):
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        last = items[-1]
+        values = [
+            last[field.lstrip('-')] if isinstance(last, dict) else getattr(last, field.lstrip('-'))
+            for field in fields
+        ]
+        next_cursor = encode_cursor(values)
+    return KeysetPage(items=items, next_cursor=next_cursor, page_size=page_size)
+
+
+def keyset_page(queryset, fields, cursor=None, page_size=None):
+    """
+    Страница queryset после курсора в порядке fields.
+
+    Последнее поле ключа должно быть уникальным (обычно id), тогда страницы не
+    пересекаются и не теряют строки. Строки с NULL в поле ключа идут в конце.
+    Стоимость запроса не зависит от номера страницы: вместо OFFSET
+    используется условие по индексу ключа.
+
+    Raises:
+        InvalidCursor: курсор не удалось разобрать
+    """
+    page_size = page_size or get_page_size(None)
+    return _make_page(list(_page_queryset(queryset, fields, cursor, page_size)), fields, page_size)
+
+
+async def akeyset_page(queryset, fields, cursor=None, page_size=None):
+    """Асинхронный вариант keyset_page для асинхронных представлений."""
+    page_size = page_size or get_page_size(None)
+    items = [item async for item in _page_queryset(queryset, fields, cursor, page_size)]
+    return _make_page(items, fields, page_size)
@@ -0,0 +1,189 @@
+"""Снятие профилей медленных запросов в рабочем режиме.
+
+Профиль снимается двумя способами:
+
+* по запросу сотрудника (is_staff): заголовок X-Profile: 1 или ?_profile=1;
+  номер сохранённого профиля приходит в заголовке ответа X-Profile-Capture;
+* автоматически, если запрос дольше NASA_PROFILE_THRESHOLD_MS. Включить
+  cProfile задним числом нельзя, поэтому профилируется доля запросов
+  NASA_PROFILE_SAMPLE_RATE, а журнал SQL собирается для всех; медленный
+  запрос вне выборки сохраняется без cProfile.
+
+Сохранение ограничено NASA_PROFILE_MAX_PER_MINUTE профилями в минуту через
+кэш и NASA_PROFILE_KEEP последними записями, поэтому режим можно держать
+включённым. В асинхронных представлениях cProfile видит поток цикла
+событий: запросы ORM из потока sync_to_async видны в журнале SQL, а в
+профиль могут попасть другие корутины того же цикла.
+"""
+import cProfile
+import io
+import logging
+import marshal
+import pstats
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from . import metrics
+from .middleware import view_label
+from .models import ProfileCapture
+
+logger = logging.getLogger(__name__)
+
+RATE_CACHE_KEY = 'core:profile-captures:{minute}'
+PROFILE_HEADER = 'X-Profile'
+PROFILE_PARAM = '_profile'
+# Строк сводки pstats в profile_text
+PROFILE_LINES = 40
+
+
+def get_setting(name, default):
+    return getattr(settings, name, default)
+
+
+def requested(request):
+    """Запрос просит профиль заголовком или параметром (права проверяются отдельно)."""
+    return request.headers.get(PROFILE_HEADER) == '1' or request.GET.get(PROFILE_PARAM) == '1'
+
+
+def allow_capture(now=None):
+    """Берёт место в минутном лимите сохранений; False, если лимит исчерпан."""
+    limit = get_setting('NASA_PROFILE_MAX_PER_MINUTE', 6)
+    key = RATE_CACHE_KEY.format(minute=int((now or time.time()) // 60))
+    cache.add(key, 0, 120)
+    try:
+        return cache.incr(key) <= limit
+    except ValueError:
+        # Ключ вытеснен между add и incr: считаем это первым сохранением минуты
+        cache.set(key, 1, 120)
+        return True
+
+
+class Capture:
+    """Профиль и журнал SQL одного запроса."""
+
+    def __init__(self, trigger, profile):
+        self.trigger = trigger
+        self.profiler = cProfile.Profile() if profile else None
+        self.started = None
+        self.duration = None
+
+    def __enter__(self):
+        self.stats, self._token = metrics.start_query_stats(log=True)
+        self.started = time.perf_counter()
+        if self.profiler:
+            try:
+                self.profiler.enable()
+            except ValueError:
+                # В потоке уже работает другой профилировщик: сохраняем без cProfile
+                self.profiler = None
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.profiler:
+            self.profiler.disable()
+        self.duration = time.perf_counter() - self.started
+        metrics.stop_query_stats(self._token)
+
+    def build(self, request, response, user):
+        text, data = '', None
+        if self.profiler:
+            self.profiler.create_stats()
+            # pstats.Stats забирает stats у профилировщика, поэтому сырые данные — до него
+            data = marshal.dumps(self.profiler.stats)
+            stream = io.StringIO()
+            pstats.Stats(self.profiler, stream=stream).sort_stats('cumulative').print_stats(PROFILE_LINES)
+            text = stream.getvalue()
+        return ProfileCapture(
+            trigger=self.trigger,
+            user=user if getattr(user, 'is_authenticated', False) else None,
+            method=request.method,
+            path=request.get_full_path()[:500],
+            view_name=view_label(request)[:100],
+            status_code=response.status_code,
+            duration_ms=self.duration * 1000,
+            db_ms=self.stats.seconds * 1000,
+            query_count=self.stats.count,
+            sql_log=self.stats.log,
+            profile_text=text,
+            profile_data=data,
+        )
+
+
+def save_capture(capture):
+    """Сохраняет профиль и удаляет записи сверх NASA_PROFILE_KEEP."""
+    capture.save()
+    keep = get_setting('NASA_PROFILE_KEEP', 200)
+    stale = list(ProfileCapture.objects.order_by('-created_at', '-id').values_list('id', flat=True)[keep:keep + 100])
+    if stale:
+        ProfileCapture.objects.filter(id__in=stale).delete()
+    return capture
+
+
+class ProfilingMiddleware:
+    """Снимает профили по запросу сотрудников и для запросов дольше порога."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def plan(manual):
+        """
+        Режим для запроса: (trigger, снимать ли cProfile) или None без учёта.
+        Ручной запрос сверх лимита обслуживается без профиля.
+        """
+        if manual:
+            return (ProfileCapture.TRIGGER_MANUAL, True) if allow_capture() else None
+        if get_setting('NASA_PROFILE_THRESHOLD_MS', 0):
+            return ProfileCapture.TRIGGER_THRESHOLD, random.random() < get_setting('NASA_PROFILE_SAMPLE_RATE', 0.1)
+        return None
+
+    @staticmethod
+    def should_save(capture):
+        if capture.trigger == ProfileCapture.TRIGGER_MANUAL:
+            return True
+        return capture.duration * 1000 >= get_setting('NASA_PROFILE_THRESHOLD_MS', 0) and allow_capture()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        manual = requested(request) and request.user.is_staff
+        plan = self.plan(manual)
+        if plan is None:
+            return self.get_response(request)
+
+        with Capture(*plan) as capture:
+            response = self.get_response(request)
+        if self.should_save(capture):
+            try:
+                saved = save_capture(capture.build(request, response, request.user))
+            except Exception:
+                logger.exception("Не удалось сохранить профиль %s", request.path)
+            else:
+                response.headers['X-Profile-Capture'] = str(saved.pk)
+        return response
+
+    async def __acall__(self, request):
+        user = await request.auser() if requested(request) else None
+        plan = self.plan(bool(user and user.is_staff))
+        if plan is None:
+            return await self.get_response(request)
+
+        with Capture(*plan) as capture:
+            response = await self.get_response(request)
+        if self.should_save(capture):
+            user = user or await request.auser()
+            try:
+                saved = await sync_to_async(save_capture)(capture.build(request, response, user))
+            except Exception:
+                logger.exception("Не удалось сохранить профиль %s", request.path)
+            else:
+                response.headers['X-Profile-Capture'] = str(saved.pk)
+        return response
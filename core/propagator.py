@@ -0,0 +1,180 @@
+"""Векторизованное кеплеровское распространение орбит и поиск сближений с Землёй.
+
+Орбиты — задача двух тел вокруг Солнца без возмущений, в гелиоцентрической
+эклиптической системе J2000. Для скрининга на год вперёд этого хватает:
+ошибка растёт с удалением от эпохи элементов, поэтому результат — кандидаты,
+а не эфемериды. Все объекты и все моменты сетки считаются одним проходом
+массивов NumPy формы (объекты, моменты) без цикла Python по объектам.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+# Гауссова гравитационная постоянная, рад/сутки для a в а.е.
+GAUSS_K = 0.01720209895
+J2000_JD = 2451545.0
+AU_KM = 149_597_870.7
+# Элементы барицентра Земля–Луна на J2000 (Standish, JPL): эпоха, a, e, i, Ω, ω, M
+EARTH_ELEMENTS = (J2000_JD, 1.00000261, 0.01671123, -0.00001531, 0.0, 102.93768193, -2.47311027)
+# Точек уточнения вокруг грубого минимума
+REFINE_POINTS = 49
+
+
+@dataclass
+class Elements:
+    """Элементы орбит массивами формы (N, 1): углы в радианах."""
+    epoch: np.ndarray
+    a: np.ndarray
+    e: np.ndarray
+    i: np.ndarray
+    node: np.ndarray
+    peri: np.ndarray
+    mean_anomaly: np.ndarray
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Из строк (эпоха JD, a, e, i°, Ω°, ω°, M°)."""
+        table = np.asarray(rows, dtype=float).reshape(-1, 7)
+        epoch, a, e = (table[:, k:k + 1] for k in range(3))
+        i, node, peri, mean_anomaly = (np.radians(table[:, k:k + 1]) for k in range(3, 7))
+        return cls(epoch, a, e, i, node, peri, mean_anomaly)
+
+    def __len__(self):
+        return len(self.a)
+
+    def take(self, index):
+        """Подмножество объектов по индексам или срезу."""
+        return Elements(*(getattr(self, name)[index] for name in self.__dataclass_fields__))
+
+
+EARTH = Elements.from_rows([EARTH_ELEMENTS])
+
+
+def solve_kepler(mean_anomaly, e, tolerance=1e-12, max_iterations=50):
+    """Эксцентрическая аномалия E из уравнения Кеплера E - e·sin E = M методом Ньютона для всего массива."""
+    E = np.where(e < 0.8, mean_anomaly, np.pi * np.sign(mean_anomaly))
+    for _ in range(max_iterations):
+        delta = (E - e * np.sin(E) - mean_anomaly) / (1 - e * np.cos(E))
+        E = E - delta
+        if np.max(np.abs(delta)) < tolerance:
+            break
+    return E
+
+
+def positions(elements, jd):
+    """
+    Гелиоцентрические координаты (x, y, z) в а.е. на моменты jd.
+
+    jd транслируется с формой элементов (N, 1): (T,) даёт массивы (N, T),
+    (N, K) — свои моменты для каждого объекта.
+    """
+    n = GAUSS_K / elements.a ** 1.5
+    mean_anomaly = elements.mean_anomaly + n * (jd - elements.epoch)
+    mean_anomaly = np.remainder(mean_anomaly + np.pi, 2 * np.pi) - np.pi
+    E = solve_kepler(mean_anomaly, elements.e)
+    # Координаты в плоскости орбиты: ось x к перигелию
+    xv = elements.a * (np.cos(E) - elements.e)
+    yv = elements.a * np.sqrt(1 - elements.e ** 2) * np.sin(E)
+
+    cos_node, sin_node = np.cos(elements.node), np.sin(elements.node)
+    cos_peri, sin_peri = np.cos(elements.peri), np.sin(elements.peri)
+    cos_i, sin_i = np.cos(elements.i), np.sin(elements.i)
+    px = cos_peri * cos_node - sin_peri * sin_node * cos_i
+    py = cos_peri * sin_node + sin_peri * cos_node * cos_i
+    pz = sin_peri * sin_i
+    qx = -sin_peri * cos_node - cos_peri * sin_node * cos_i
+    qy = -sin_peri * sin_node + cos_peri * cos_node * cos_i
+    qz = cos_peri * sin_i
+    return xv * px + yv * qx, xv * py + yv * qy, xv * pz + yv * qz
+
+
+def earth_distance(elements, jd):
+    """Расстояние объектов до Земли в а.е. на моменты jd (форма как у positions)."""
+    x, y, z = positions(elements, jd)
+    ex, ey, ez = positions(EARTH, jd)
+    return np.sqrt((x - ex) ** 2 + (y - ey) ** 2 + (z - ez) ** 2)
+
+
+def relative_velocity_kmh(elements, jd, h=1e-3):
+    """Скорость объекта относительно Земли в км/ч центральной разностью по времени."""
+    before = [a - b for a, b in zip(positions(elements, jd - h), positions(EARTH, jd - h))]
+    after = [a - b for a, b in zip(positions(elements, jd + h), positions(EARTH, jd + h))]
+    speed_au_day = np.sqrt(sum((a - b) ** 2 for a, b in zip(after, before))) / (2 * h)
+    return speed_au_day * AU_KM / 24
+
+
+@dataclass
+class Approaches:
+    """Найденные сближения: индекс объекта, момент JD, дистанция (а.е.), скорость (км/ч)."""
+    index: np.ndarray
+    jd: np.ndarray
+    distance_au: np.ndarray
+    velocity_kmh: np.ndarray
+
+    def __len__(self):
+        return len(self.index)
+
+
+def _refine(elements, jd, step):
+    """Уточняет минимумы: плотная сетка ±step вокруг грубого момента и парабола по трём точкам."""
+    offsets = np.linspace(-step, step, REFINE_POINTS)
+    grid = jd[:, None] + offsets[None, :]
+    distance = earth_distance(elements, grid)
+    best = np.clip(np.argmin(distance, axis=1), 1, REFINE_POINTS - 2)
+    rows = np.arange(len(jd))
+    d0, d1, d2 = (distance[rows, best + k] for k in (-1, 0, 1))
+    denominator = d0 - 2 * d1 + d2
+    shift = np.where(denominator > 0, 0.5 * (d0 - d2) / np.where(denominator > 0, denominator, 1), 0.0)
+    spacing = offsets[1] - offsets[0]
+    refined = grid[rows, best] + np.clip(shift, -1, 1) * spacing
+    return refined[:, None]
+
+
+def find_approaches(elements, start_jd, end_jd, step=0.25, max_distance_au=0.05, chunk_size=256):
+    """
+    Сближения объектов с Землёй ближе max_distance_au в интервале [start_jd, end_jd).
+
+    Грубая сетка с шагом step суток считается пачками по chunk_size объектов
+    (память O(chunk_size × моментов)); локальные минимумы расстояния
+    уточняются плотной сеткой. Орбиты с e ≥ 1 пропускаются.
+    """
+    jd = np.arange(start_jd, end_jd, step)
+    found = []
+    if len(jd) < 3 or not len(elements):
+        return Approaches(*(np.empty(0) for _ in range(4)))
+    bound = elements.e[:, 0] < 1
+    earth = positions(EARTH, jd)
+
+    for first in range(0, len(elements), chunk_size):
+        chunk = np.arange(first, min(first + chunk_size, len(elements)))
+        chunk = chunk[bound[chunk]]
+        if not len(chunk):
+            continue
+        subset = elements.take(chunk)
+        x, y, z = positions(subset, jd)
+        distance = np.sqrt((x - earth[0]) ** 2 + (y - earth[1]) ** 2 + (z - earth[2]) ** 2)
+        # Запас порога: грубая сетка может промахнуться мимо минимума
+        middle = distance[:, 1:-1]
+        minima = (middle < distance[:, :-2]) & (middle <= distance[:, 2:]) & (middle < max_distance_au * 1.5)
+        rows, columns = np.nonzero(minima)
+        if not len(rows):
+            continue
+
+        candidates = subset.take(rows)
+        refined = _refine(candidates, jd[columns + 1], step)
+        final_distance = earth_distance(candidates, refined)[:, 0]
+        keep = final_distance <= max_distance_au
+        if not keep.any():
+            continue
+        candidates = candidates.take(keep)
+        refined = refined[keep]
+        found.append((
+            chunk[rows[keep]],
+            refined[:, 0],
+            final_distance[keep],
+            relative_velocity_kmh(candidates, refined)[:, 0],
+        ))
+
+    if not found:
+        return Approaches(*(np.empty(0) for _ in range(4)))
+    return Approaches(*(np.concatenate(parts) for parts in zip(*found)))
@@ -0,0 +1,81 @@
+"""Запросы страниц мониторинга и списка отслеживания.
+
+Вынесены из представлений, чтобы их план можно было проверить командой explain_queries.
+"""
+from datetime import datetime, timedelta
+
+from django.utils import timezone
+
+from .models import DailyFlybyStats, Flyby, Watchlist
+
+WEEK_DAYS = 7
+WATCHLIST_DAYS = 30
+# Ключи сортировки для keyset-пагинации: последнее поле уникально
+FLYBY_ORDER = ('date', 'id')
+WATCHLIST_ORDER = ('-added_at', '-id')
+NEXT_APPROACH_ORDER = ('next_approach_at', 'id')
+
+
+def day_start(day):
+    """Начало дня в текущем часовом поясе."""
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+
+def window_bounds(days, today=None):
+    """
+    Окно из дней today..today + days включительно.
+
+    Returns:
+        tuple: (первый день, последний день, начало окна, конец окна) — datetime
+            границы полуоткрытые: [начало, конец)
+    """
+    today = today or timezone.localdate()
+    end = today + timedelta(days=days)
+    return today, end, day_start(today), day_start(end + timedelta(days=1))
+
+
+def index_flybys(start, end, hazardous_only=False):
+    """Сближения окна для таблицы главной страницы."""
+    flybys = Flyby.objects.select_related('asteroid').filter(
+        date__gte=start,
+        date__lt=end,
+    ).order_by(*FLYBY_ORDER)
+    if hazardous_only:
+        flybys = flybys.filter(is_hazardous=True)
+    return flybys
+
+
+def user_watchlist_items(user, hazardous_only=False):
+    """Элементы списка отслеживания пользователя, новые сверху."""
+    items = Watchlist.objects.filter(user=user).select_related('asteroid').order_by(*WATCHLIST_ORDER)
+    if hazardous_only:
+        items = items.filter(asteroid__is_potentially_hazardous=True)
+    return items
+
+
+def upcoming_flybys(items, start, end):
+    """Сближения отслеживаемых астероидов в окне."""
+    return Flyby.objects.filter(
+        asteroid_id__in=items.values('asteroid_id'),
+        date__gte=start,
+        date__lt=end,
+    ).select_related('asteroid').order_by(*FLYBY_ORDER)
+
+
+def view_queries(user=None):
+    """Именованные запросы представлений index и watchlist для проверки планов."""
+    first_day, last_day, week_start, week_end = window_bounds(WEEK_DAYS)
+    queries = [
+        ('index: flybys', index_flybys(week_start, week_end)),
+        ('index: flybys (hazardous)', index_flybys(week_start, week_end, hazardous_only=True)),
+        ('index: daily stats', DailyFlybyStats.objects.filter(date__gte=first_day, date__lte=last_day)),
+    ]
+    if user is not None:
+        _, _, month_start, month_end = window_bounds(WATCHLIST_DAYS)
+        items = user_watchlist_items(user)
+        queries += [
+            ('watchlist: items', items),
+            ('watchlist: items by next approach', items.order_by(*NEXT_APPROACH_ORDER)),
+            ('watchlist: upcoming flybys', upcoming_flybys(items, month_start, month_end)),
+        ]
+    return queries
@@ -0,0 +1,103 @@
+"""Хранение сближений в двух уровнях: горячая таблица Flyby и архив ArchivedFlyby.
+
+Страницы, живая лента, оповещения и список отслеживания смотрят только на
+недавние и предстоящие сближения, поэтому Flyby держит окно от горизонта
+хранения (NASA_RETENTION_DAYS дней назад) и дальше: размер таблицы и её
+индексов не растёт с годами истории. Более старые строки apply_retention
+переносит в ArchivedFlyby короткими транзакциями по пакетам; загрузка
+старых окон сразу пишет и обновляет архивные строки, а сводки по дням
+раньше горизонта считаются по обоим уровням.
+
+Выгрузка, история списка отслеживания и сближения астероида в API читают
+оба уровня по запросу (archived=1) одним UNION ALL; аналитика подключает
+архив сама, если окно начинается раньше горизонта.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .caching import bump_generation
+from .models import ArchivedFlyby, Flyby
+from .queries import day_start
+
+logger = logging.getLogger(__name__)
+
+COPY_FIELDS = (
+    'asteroid_id', 'date', 'velocity_kmh', 'miss_distance_km', 'is_hazardous', 'source', 'created_at', 'updated_at',
+)
+
+
+def get_retention_days():
+    return getattr(settings, 'NASA_RETENTION_DAYS', 365)
+
+
+def get_batch_size():
+    return getattr(settings, 'NASA_INGEST_BATCH_SIZE', 500)
+
+
+def retention_cutoff(today=None, days=None):
+    """Начало первого дня горячего окна или None, если хранение не ограничено."""
+    days = get_retention_days() if days is None else days
+    if not days:
+        return None
+    return day_start((today or timezone.localdate()) - timedelta(days=days))
+
+
+def across_tiers(build, archived=False):
+    """
+    Запрос build(модель) к Flyby, при archived — объединённый с тем же запросом к архиву.
+
+    build должен вернуть values/values_list; сортировку задаёт вызывающий
+    после объединения и только по выбранным столбцам.
+    """
+    rows = build(Flyby).order_by()
+    if archived:
+        rows = rows.union(build(ArchivedFlyby).order_by(), all=True)
+    return rows
+
+
+def _move_batch(ids):
+    rows = Flyby.objects.filter(id__in=ids).values_list(*COPY_FIELDS)
+    archived = [ArchivedFlyby(**dict(zip(COPY_FIELDS, row))) for row in rows]
+    # Повторно загруженный старый день заменяет свою прежнюю архивную копию
+    ArchivedFlyby.objects.bulk_create(
+        archived,
+        update_conflicts=True,
+        unique_fields=['asteroid', 'date'],
+        update_fields=[name for name in COPY_FIELDS if name not in ('asteroid_id', 'date')],
+    )
+    # Вместе со строкой удаляются отметки об отправленных по ней оповещениях
+    Flyby.objects.filter(id__in=ids).delete()
+    return len(archived)
+
+
+def apply_retention(cutoff=None, batch_size=None):
+    """
+    Переносит сближения раньше cutoff (по умолчанию retention_cutoff()) в архив.
+
+    Каждый пакет из batch_size строк — своя транзакция: копия в архив и
+    удаление из Flyby фиксируются вместе, читатели не ждут весь перенос.
+
+    Returns:
+        int: число перенесённых сближений
+    """
+    cutoff = cutoff or retention_cutoff()
+    if cutoff is None:
+        return 0
+    batch_size = batch_size or get_batch_size()
+    moved = 0
+    while True:
+        with transaction.atomic():
+            ids = list(
+                Flyby.objects.filter(date__lt=cutoff).order_by('date', 'id').values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            moved += _move_batch(ids)
+    if moved:
+        bump_generation()
+        logger.info("Перенесено в архив сближений: %s (раньше %s)", moved, cutoff)
+    return moved
@@ -0,0 +1,165 @@
+"""Полнотекстовый поиск и автодополнение по названиям и NASA ID астероидов.
+
+В SQLite поиск идёт по виртуальной таблице FTS5 core_asteroid_search с
+внешним содержимым (content=core_asteroid) и индексами префиксов: запрос
+«2024 AB» ищет строки со словом 2024 и словом, начинающимся на ab, за
+время поиска по индексу, без прохода по таблице. Индекс синхронизируют
+триггеры на core_asteroid, поэтому загрузка (bulk_create с upsert,
+bulk_update), админка и импорт элементов орбит обновляют его без
+отдельных запросов из Python.
+
+Перестройка таблицы при миграциях SQLite (ALTER через копию таблицы)
+удаляет её триггеры; ensure_index после каждой миграции возвращает их и
+перестраивает индекс. На других базах поиск сводится к icontains по
+названию и точному NASA ID.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection, connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Asteroid
+
+SEARCH_TABLE = 'core_asteroid_search'
+RESULT_FIELDS = ('id', 'nasa_id', 'name', 'absolute_magnitude', 'is_potentially_hazardous', 'nasa_jpl_url')
+# Слов запроса, после которых остальные отбрасываются
+MAX_TERMS = 6
+TERM = re.compile(r'\w+')
+
+TRIGGERS = {
+    f'{SEARCH_TABLE}_ai': f"""
+        CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_ai AFTER INSERT ON core_asteroid BEGIN
+            INSERT INTO {SEARCH_TABLE}(rowid, name, nasa_id) VALUES (new.id, new.name, new.nasa_id);
+        END
+    """,
+    f'{SEARCH_TABLE}_ad': f"""
+        CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_ad AFTER DELETE ON core_asteroid BEGIN
+            INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, name, nasa_id)
+            VALUES ('delete', old.id, old.name, old.nasa_id);
+        END
+    """,
+    f'{SEARCH_TABLE}_au': f"""
+        CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_au AFTER UPDATE OF name, nasa_id ON core_asteroid BEGIN
+            INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, name, nasa_id)
+            VALUES ('delete', old.id, old.name, old.nasa_id);
+            INSERT INTO {SEARCH_TABLE}(rowid, name, nasa_id) VALUES (new.id, new.name, new.nasa_id);
+        END
+    """,
+}
+CREATE_TABLE = f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+        name, nasa_id, content='core_asteroid', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='1 2 3 4'
+    )
+"""
+
+
+def uses_fts(using=connection):
+    return using.vendor == 'sqlite'
+
+
+def rebuild_index(using=connection):
+    """Перестраивает FTS-индекс по текущему содержимому core_asteroid."""
+    with using.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')")
+
+
+def ensure_index(using=connection):
+    """
+    Создаёт таблицу и триггеры, которых нет; если чего-то не хватало, индекс
+    перестраивается. Возвращает True, если индекс пришлось восстанавливать.
+    """
+    if not uses_fts(using):
+        return False
+    with using.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE name = %s OR (type = 'trigger' AND tbl_name = 'core_asteroid')",
+            [SEARCH_TABLE],
+        )
+        present = {row[0] for row in cursor.fetchall()}
+        if {SEARCH_TABLE, *TRIGGERS} <= present:
+            return False
+        cursor.execute(CREATE_TABLE)
+        for sql in TRIGGERS.values():
+            cursor.execute(sql)
+    rebuild_index(using)
+    return True
+
+
+def ensure_index_after_migrate(sender, using, **kwargs):
+    """Приёмник post_migrate: возвращает триггеры после перестройки core_asteroid."""
+    from django.db import connections
+    ensure_index(connections[using])
+
+
+def match_expression(text):
+    """
+    Выражение MATCH из строки пользователя: слова в кавычках (операторы FTS5
+    не интерпретируются), последнее — префиксом для автодополнения.
+    """
+    terms = TERM.findall(text.lower())[:MAX_TERMS]
+    if not terms:
+        return None
+    return ' '.join([*(f'"{term}"' for term in terms[:-1]), f'"{terms[-1]}"*'])
+
+
+def get_limit(value, default=None):
+    maximum = getattr(settings, 'NASA_SEARCH_LIMIT_MAX', 50)
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        limit = default or getattr(settings, 'NASA_SEARCH_LIMIT', 10)
+    return max(1, min(limit, maximum))
+
+
+def _fallback(text):
+    """Условие без FTS: все слова в названии или точный NASA ID."""
+    condition = Q()
+    for term in TERM.findall(text)[:MAX_TERMS]:
+        condition &= Q(name__icontains=term)
+    return condition | Q(nasa_id=text.strip())
+
+
+def filter_matching(queryset, text):
+    """Астероиды queryset, подходящие под поиск; без сортировки и лимита (для админки)."""
+    expression = match_expression(text)
+    if expression is None:
+        return queryset
+    # Таблица FTS есть только в SQLite: queryset может читать из реплики на другой базе
+    if not uses_fts(connections[queryset.db]):
+        return queryset.filter(_fallback(text))
+    return queryset.filter(id__in=RawSQL(
+        f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s', [expression],
+    ))
+
+
+def search_asteroids(text, limit=10):
+    """
+    Астероиды по названию или NASA ID, лучшие совпадения первыми: точный
+    NASA ID, затем ранг bm25. Один запрос; словари с полями RESULT_FIELDS.
+    """
+    expression = match_expression(text)
+    if expression is None:
+        return []
+    text = text.strip()
+    if not uses_fts():
+        return list(Asteroid.objects.filter(_fallback(text)).order_by('name').values(*RESULT_FIELDS)[:limit])
+
+    columns = ', '.join(f'a.{name}' for name in RESULT_FIELDS)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT {columns} FROM {SEARCH_TABLE} JOIN core_asteroid a ON a.id = {SEARCH_TABLE}.rowid
+            WHERE {SEARCH_TABLE} MATCH %s
+            ORDER BY a.nasa_id = %s DESC, {SEARCH_TABLE}.rank
+            LIMIT %s
+            """,
+            [expression, text, limit],
+        )
+        results = [dict(zip(RESULT_FIELDS, row)) for row in cursor.fetchall()]
+    for result in results:
+        # SQLite отдаёт BooleanField сырым 0/1
+        result['is_potentially_hazardous'] = bool(result['is_potentially_hazardous'])
+    return results
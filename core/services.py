@@ -1,34 +1,80 @@
 """Сервис для работы с NASA NeoWs API."""
+import logging
+import threading
+import httpx
 import requests
 from datetime import datetime, timedelta
 from django.conf import settings
 from django.utils import timezone
-from .models import Asteroid, Flyby
+from .client import AsyncNeoWsClient, NeoWsClient, NeoWsClientError
+from .ingest import ingest_feed
+
+logger = logging.getLogger(__name__)
 
 
 class NASANeoWsService:
     """Сервис для получения данных о сближениях астероидов с Землёй."""
     
+    _client = None
+    _client_lock = threading.Lock()
+    _base_url = None
+    
+    @classmethod
+    def get_client(cls):
+        """Общий для процесса клиент: одна keep-alive сессия и общие лимитеры по ключам."""
+        with cls._client_lock:
+            if cls._client is None:
+                cls._client = NeoWsClient(base_url=cls.get_base_url())
+            return cls._client
+    
+    @classmethod
+    def async_client(cls):
+        """
+        Новый асинхронный клиент. Он привязан к циклу событий, поэтому не
+        кэшируется на процесс: используйте `async with` в пределах одного цикла.
+        """
+        return AsyncNeoWsClient(base_url=cls.get_base_url())
+    
     @classmethod
     def get_base_url(cls):
-        return getattr(settings, 'NASA_NEO_API_URL', 'https://api.nasa.gov/neo/rest/v1/feed')
+        return cls._base_url or getattr(settings, 'NASA_NEO_API_URL', 'https://api.nasa.gov/neo/rest/v1/feed')
+    
+    @classmethod
+    def set_base_url(cls, base_url):
+        """
+        Переключает процесс на другой адрес фида (например, локальный fake_neows);
+        None возвращает NASA_NEO_API_URL. Общий клиент пересоздаётся при следующем запросе.
+        """
+        with cls._client_lock:
+            cls._base_url = base_url
+            cls._client = None
     
     @classmethod
     def get_api_key(cls):
         return getattr(settings, 'NASA_API_KEY', '') or 'DEMO_KEY'
     
     @classmethod
-    def fetch_week_data(cls, start_date=None, end_date=None):
+    def get_api_keys(cls):
+        """Пул ключей для распределения запросов; по умолчанию один NASA_API_KEY."""
+        keys = [key for key in getattr(settings, 'NASA_API_KEYS', []) if key]
+        return keys or [cls.get_api_key()]
+    
+    @classmethod
+    def request_feed(cls, start_date, end_date, api_key=None):
         """
-        Получает данные о сближениях астероидов за неделю.
-        
-        Args:
-            start_date: Дата начала периода (datetime или str). Если None, используется сегодня.
-            end_date: Дата конца периода (datetime или str). Если None, используется start_date + 7 дней.
+        Запрашивает фид через общий клиент (с повторами и ограничением частоты).
         
         Returns:
-            dict: Данные от NASA API или None в случае ошибки
+            requests.Response: ответ API (статус и заголовки X-RateLimit-* проверяет вызывающий код)
+        
+        Raises:
+            NeoWsClientError: сетевая ошибка не прошла после всех повторов
         """
+        return cls.get_client().get_feed(start_date, end_date, api_key or cls.get_api_key())
+    
+    @staticmethod
+    def date_range(start_date=None, end_date=None):
+        """Приводит границы периода (date, datetime или YYYY-MM-DD) к датам; по умолчанию неделя от сегодня."""
         if start_date is None:
             start_date = timezone.now().date()
         elif isinstance(start_date, datetime):
@@ -43,143 +89,63 @@ class NASANeoWsService:
         elif isinstance(end_date, str):
             end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
         
-        params = {
-            'start_date': start_date.strftime('%Y-%m-%d'),
-            'end_date': end_date.strftime('%Y-%m-%d'),
-            'api_key': cls.get_api_key()
-        }
-        
-        try:
-            response = requests.get(cls.get_base_url(), params=params, timeout=10)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            print(f"Ошибка при запросе к NASA API: {e}")
-            return None
+        return start_date, end_date
     
     @classmethod
-    def process_and_save_data(cls, data):
+    def fetch_week_data(cls, start_date=None, end_date=None):
         """
-        Обрабатывает данные от NASA API и сохраняет в базу данных.
+        Получает данные о сближениях астероидов за неделю.
         
         Args:
-            data: Словарь с данными от NASA API
+            start_date: Дата начала периода (datetime или str). Если None, используется сегодня.
+            end_date: Дата конца периода (datetime или str). Если None, используется start_date + 7 дней.
         
         Returns:
-            tuple: (количество созданных астероидов, количество созданных сближений)
+            dict: Данные от NASA API или None в случае ошибки
         """
-        if not data or 'near_earth_objects' not in data:
-            return 0, 0
-        
-        asteroids_created = 0
-        flybys_created = 0
+        start_date, end_date = cls.date_range(start_date, end_date)
         
-        # Проходим по всем дням в ответе
-        for date_str, asteroids_data in data['near_earth_objects'].items():
-            date = datetime.strptime(date_str, '%Y-%m-%d').date()
-            
-            # Обрабатываем каждый астероид
-            for asteroid_data in asteroids_data:
-                try:
-                    # Получаем или создаём астероид
-                    asteroid, created = cls._get_or_create_asteroid(asteroid_data)
-                    if created:
-                        asteroids_created += 1
-                    
-                    # Обрабатываем все сближения для этого астероида в этот день
-                    close_approach_data = asteroid_data.get('close_approach_data', [])
-                    for approach in close_approach_data:
-                        flyby, created = cls._get_or_create_flyby(
-                            asteroid, approach, date
-                        )
-                        if created:
-                            flybys_created += 1
-                            
-                except Exception as e:
-                    print(f"Ошибка при обработке астероида {asteroid_data.get('id', 'unknown')}: {e}")
-                    continue
-        
-        return asteroids_created, flybys_created
+        try:
+            response = cls.request_feed(start_date, end_date)
+            response.raise_for_status()
+            return response.json()
+        except (NeoWsClientError, requests.exceptions.RequestException, ValueError) as e:
+            logger.error("Ошибка при запросе к NASA API: %s", e)
+            return None
     
     @classmethod
-    def _get_or_create_asteroid(cls, asteroid_data):
-        """Получает или создаёт астероид из данных NASA API."""
-        nasa_id = asteroid_data.get('id')
-        if not nasa_id:
-            raise ValueError("NASA ID не найден в данных")
-        
-        name = asteroid_data.get('name', 'Unknown')
-        absolute_magnitude = asteroid_data.get('absolute_magnitude_h')
-        is_hazardous = asteroid_data.get('is_potentially_hazardous_asteroid', False)
-        nasa_jpl_url = asteroid_data.get('nasa_jpl_url', '')
-        
-        asteroid, created = Asteroid.objects.get_or_create(
-            nasa_id=nasa_id,
-            defaults={
-                'name': name,
-                'absolute_magnitude': absolute_magnitude,
-                'is_potentially_hazardous': is_hazardous,
-                'nasa_jpl_url': nasa_jpl_url,
-            }
-        )
+    async def afetch_week_data(cls, start_date=None, end_date=None, client=None):
+        """
+        Асинхронный вариант fetch_week_data: не блокирует цикл событий на время запроса.
         
-        # Обновляем данные, если астероид уже существует
-        if not created:
-            update_fields = []
-            if asteroid.name != name:
-                asteroid.name = name
-                update_fields.append('name')
-            if asteroid.absolute_magnitude != absolute_magnitude:
-                asteroid.absolute_magnitude = absolute_magnitude
-                update_fields.append('absolute_magnitude')
-            if asteroid.is_potentially_hazardous != is_hazardous:
-                asteroid.is_potentially_hazardous = is_hazardous
-                update_fields.append('is_potentially_hazardous')
-            if asteroid.nasa_jpl_url != nasa_jpl_url:
-                asteroid.nasa_jpl_url = nasa_jpl_url
-                update_fields.append('nasa_jpl_url')
-            if update_fields:
-                asteroid.save(update_fields=update_fields)
+        Args:
+            client: AsyncNeoWsClient текущего цикла событий; без него создаётся временный
         
-        return asteroid, created
+        Returns:
+            dict: Данные от NASA API или None в случае ошибки
+        """
+        start_date, end_date = cls.date_range(start_date, end_date)
+        if client is None:
+            async with cls.async_client() as client:
+                return await cls.afetch_week_data(start_date, end_date, client=client)
+        try:
+            response = await client.get_feed(start_date, end_date, cls.get_api_key())
+            response.raise_for_status()
+            return response.json()
+        except (NeoWsClientError, httpx.HTTPError, ValueError) as e:
+            logger.error("Ошибка при запросе к NASA API: %s", e)
+            return None
     
     @classmethod
-    def _get_or_create_flyby(cls, asteroid, approach_data, date):
-        """Получает или создаёт сближение из данных NASA API."""
-        # Парсим дату и время
-        approach_date_str = approach_data.get('close_approach_date_full')
-        if approach_date_str:
-            try:
-                approach_datetime = datetime.strptime(
-                    approach_date_str, '%Y-%b-%d %H:%M'
-                )
-                approach_datetime = timezone.make_aware(approach_datetime)
-            except ValueError:
-                # Если формат не подходит, используем только дату
-                approach_datetime = timezone.make_aware(
-                    datetime.combine(date, datetime.min.time())
-                )
-        else:
-            approach_datetime = timezone.make_aware(
-                datetime.combine(date, datetime.min.time())
-            )
-        
-        # Получаем скорость (конвертируем км/с в км/ч)
-        velocity_data = approach_data.get('relative_velocity', {})
-        velocity_kms = float(velocity_data.get('kilometers_per_second', 0))
-        velocity_kmh = velocity_kms * 3600  # Конвертация в км/ч
-        
-        # Получаем расстояние промаха
-        miss_distance_data = approach_data.get('miss_distance', {})
-        miss_distance_km = float(miss_distance_data.get('kilometers', 0))
+    def process_and_save_data(cls, data):
+        """
+        Обрабатывает данные от NASA API и сохраняет в базу данных.
         
-        flyby, created = Flyby.objects.get_or_create(
-            asteroid=asteroid,
-            date=approach_datetime,
-            defaults={
-                'velocity_kmh': velocity_kmh,
-                'miss_distance_km': miss_distance_km,
-            }
-        )
+        Args:
+            data: Словарь с данными от NASA API
         
-        return flyby, created
+        Returns:
+            tuple: (количество созданных астероидов, количество созданных сближений)
+        """
+        result = ingest_feed(data)
+        return result.asteroids_created, result.flybys_created
@@ -0,0 +1,189 @@
+"""Потоковый разбор ответа фида NeoWs и учёт пропускной способности стадий загрузки."""
+import codecs
+import json
+import time
+from contextlib import contextmanager
+from itertools import islice
+
+# Размер куска при чтении ответа или файла
+CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = ' \t\r\n'
+_decoder = json.JSONDecoder()
+
+
+class FeedStreamParser:
+    """
+    Инкрементальный разбор JSON фида.
+
+    Читает ответ кусками и по одному выдаёт пары (дата, объект астероида) из
+    near_earth_objects, не собирая документ целиком. В памяти одновременно
+    находятся только текущий кусок и разбираемый объект. Скалярные поля верхнего
+    уровня (element_count и т.п.) сохраняются в meta.
+    """
+
+    def __init__(self, chunks, encoding='utf-8'):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder(encoding)()
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+        self.meta = {}
+        self.bytes_read = 0
+
+    def _fill(self):
+        """Дочитывает следующий кусок в буфер; False, если поток закончился."""
+        if self._eof:
+            return False
+        for chunk in self._chunks:
+            if not chunk:
+                continue
+            if isinstance(chunk, (bytes, bytearray, memoryview)):
+                self.bytes_read += len(chunk)
+                chunk = self._decoder.decode(bytes(chunk))
+            self._buf = self._buf[self._pos:] + chunk
+            self._pos = 0
+            return True
+        self._buf = self._buf[self._pos:] + self._decoder.decode(b'', final=True)
+        self._pos = 0
+        self._eof = True
+        return False
+
+    def _peek(self):
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                return ''
+
+    def _take(self, expected):
+        char = self._peek()
+        if char not in expected:
+            raise ValueError(f"Некорректный JSON фида: ожидался один из {expected!r}, получено {char!r}")
+        self._pos += 1
+        return char
+
+    def _value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # Число на границе куска может продолжаться в следующем
+            if end == len(self._buf) and self._fill():
+                continue
+            self._pos = end
+            return value
+
+    def _iter_days(self):
+        self._take('{')
+        if self._peek() == '}':
+            self._pos += 1
+            return
+        while True:
+            date_str = self._value()
+            self._take(':')
+            self._take('[')
+            if self._peek() == ']':
+                self._pos += 1
+            else:
+                while True:
+                    yield date_str, self._value()
+                    if self._take(',]') == ']':
+                        break
+            if self._take(',}') == '}':
+                return
+
+    def __iter__(self):
+        self._take('{')
+        if self._peek() == '}':
+            return
+        while True:
+            key = self._value()
+            self._take(':')
+            if key == 'near_earth_objects':
+                yield from self._iter_days()
+            else:
+                self.meta[key] = self._value()
+            if self._take(',}') == '}':
+                return
+
+
+def iter_bytes(data, chunk_size=CHUNK_SIZE):
+    """Режет уже загруженное тело ответа на куски без копирования."""
+    view = memoryview(data)
+    for i in range(0, len(view), chunk_size):
+        yield view[i:i + chunk_size]
+
+
+def iter_file(path, chunk_size=CHUNK_SIZE):
+    """Читает сохранённый дамп фида кусками."""
+    with open(path, 'rb') as f:
+        yield from iter(lambda: f.read(chunk_size), b'')
+
+
+def batched(iterable, size):
+    """Списки по size элементов из итератора."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class PipelineStats:
+    """
+    Учёт строк и времени по стадиям конвейера.
+
+    Стадии, обёрнутые через meter(), считают время внутри next() вместе со всеми
+    стадиями выше по цепочке; в отчёте из него вычитается время upstream-стадии.
+    """
+
+    def __init__(self):
+        self.stages = {}
+
+    def _stage(self, name, upstream=None):
+        return self.stages.setdefault(name, {'rows': 0, 'seconds': 0.0, 'upstream': upstream})
+
+    def meter(self, name, iterable, upstream=None):
+        stage = self._stage(name, upstream)
+        iterator = iter(iterable)
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                stage['seconds'] += time.perf_counter() - started
+                return
+            stage['seconds'] += time.perf_counter() - started
+            stage['rows'] += 1
+            yield item
+
+    @contextmanager
+    def measure(self, name, rows):
+        stage = self._stage(name)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            stage['seconds'] += time.perf_counter() - started
+            stage['rows'] += rows
+
+    def report(self):
+        """Список {stage, rows, seconds, rows_per_sec} в порядке стадий."""
+        report = []
+        for name, stage in self.stages.items():
+            seconds = stage['seconds']
+            upstream = self.stages.get(stage['upstream'])
+            if upstream is not None:
+                seconds = max(0.0, seconds - upstream['seconds'])
+            report.append({
+                'stage': name,
+                'rows': stage['rows'],
+                'seconds': round(seconds, 4),
+                'rows_per_sec': round(stage['rows'] / seconds, 1) if seconds else None,
+            })
+        return report
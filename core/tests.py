@@ -1,6 +1,74 @@
-from django.test import TestCase
+import csv
+import gzip
+import json
+import marshal
+import sqlite3
+import tempfile
+from datetime import date, datetime
+from io import StringIO
+from unittest import mock
+
+import httpx
+import numpy
+import requests
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.urls import reverse
-from .models import Asteroid
+from django.utils import timezone
+from .aggregates import refresh_daily_stats
+from .analytics import LUNAR_DISTANCE_KM, nice_edges, summarize, to_columns, window_analytics
+from .alerts import matching_flybys, run_alerts
+from .bench import compare, create_users, percentile, run_bench, synthetic_feed
+from .backfill import ApiKeyPool, RateLimitExhausted, arun_backfill, save_window, split_windows
+from .caching import get_generation
+from .client import AsyncNeoWsClient, NeoWsClient, NeoWsClientError, TokenBucket, parse_retry_after
+from .columnar import append as append_archive, get_archive
+from .db import ReadWriteRouter, copy_to_replica
+from .events import live_events
+from .export import EXPORT_COLUMNS, export_rows
+from .fakefeed import DROP, FakeFeedConfig, start_in_thread
+from .ingest import content_hash, ingest_feed, ingest_items, iter_feed_items, normalize_items
+from .management.commands.explain_queries import find_seq_scans
+from .metrics import (
+    NEOWS_DURATION, NEOWS_RATE_LIMIT_REMAINING, REGISTRY, REQUEST_DB_QUERIES, REQUESTS, TEMPLATE_DURATION, Histogram,
+)
+from .models import AlertDelivery, AlertRule, ArchivedFlyby, Asteroid, DailyFlybyStats, DataGeneration, FeedWindow, Flyby, ProfileCapture, Watchlist
+from .orbits import import_mpc, import_neows, jd_to_datetime, parse_mpc_line, predict_flybys, unpack_epoch
+from .pagination import InvalidCursor, decode_cursor, keyset_page
+from .propagator import EARTH_ELEMENTS, Elements, find_approaches
+from .queries import FLYBY_ORDER, day_start
+from .retention import apply_retention, retention_cutoff
+from .search import ensure_index, search_asteroids
+from .services import NASANeoWsService
+from .watchlist import refresh_passed, watchlist_summary
+from .stream import FeedStreamParser, PipelineStats, iter_bytes
+
+
+def make_feed(count=3, date_str='2026-01-12', hazardous_every=2, miss_distance='1000000.5', time='10:30'):
+    """Минимальный ответ фида NeoWs с count астероидами на один день; сближения в time этого дня."""
+    date_full = datetime.strptime(date_str, '%Y-%m-%d').strftime(f'%Y-%b-%d {time}')
+    asteroids = []
+    for i in range(count):
+        asteroids.append({
+            'id': str(1000 + i),
+            'name': f'({2026 + i} AB)',
+            'absolute_magnitude_h': 20.5 + i,
+            'is_potentially_hazardous_asteroid': i % hazardous_every == 0,
+            'nasa_jpl_url': f'https://ssd.jpl.nasa.gov/?sstr={1000 + i}',
+            'close_approach_data': [{
+                'close_approach_date': date_str,
+                'close_approach_date_full': date_full,
+                'relative_velocity': {'kilometers_per_second': '10.0'},
+                'miss_distance': {'kilometers': miss_distance},
+            }],
+        })
+    return {'element_count': count, 'near_earth_objects': {date_str: asteroids}}
+
 
 class CoreViewsTest(TestCase):
     def test_index_page_loads(self):
@@ -16,4 +84,1306 @@ class CoreViewsTest(TestCase):
             name="Test Asteroid",
             is_potentially_hazardous=True
         )
-        self.assertEqual(str(ast), "Test Asteroid (12345)")
\ No newline at end of file
+        self.assertEqual(str(ast), "Test Asteroid (12345)")
+
+
+class IngestTest(TestCase):
+    def test_ingest_creates_rows(self):
+        """Первая загрузка создаёт астероиды и сближения."""
+        result = ingest_feed(make_feed(count=3))
+        self.assertEqual((result.asteroids_created, result.flybys_created), (3, 3))
+        self.assertEqual(Asteroid.objects.count(), 3)
+        flyby = Flyby.objects.get(asteroid__nasa_id='1000')
+        self.assertEqual(flyby.velocity_kmh, 36000.0)
+        self.assertEqual(timezone.localtime(flyby.date).hour, 10)
+
+    def test_ingest_counts_updates(self):
+        """Повторная загрузка обновляет только изменившиеся строки."""
+        ingest_feed(make_feed(count=3))
+        result = ingest_feed(make_feed(count=3))
+        self.assertEqual(
+            (result.asteroids_created, result.asteroids_updated, result.flybys_created, result.flybys_updated),
+            (0, 0, 0, 0),
+        )
+        result = ingest_feed(make_feed(count=4, miss_distance='2000000.0'))
+        self.assertEqual((result.asteroids_created, result.flybys_created), (1, 1))
+        self.assertEqual(result.flybys_updated, 3)
+        self.assertEqual(Flyby.objects.filter(miss_distance_km=2000000.0).count(), 4)
+
+    def test_ingest_query_count_is_constant(self):
+        """Число запросов не зависит от количества астероидов."""
+        # 12-й — поиск локального прогноза на дни фида
+        with self.assertNumQueries(12):
+            ingest_feed(make_feed(count=50))
+
+    def test_drop_midnight_duplicates(self):
+        """Полуночная строка старой загрузки удаляется, если есть сближение с точным временем."""
+        legacy = make_feed(count=3)
+        for asteroid in legacy['near_earth_objects']['2026-01-12']:
+            del asteroid['close_approach_data'][0]['close_approach_date_full']
+        ingest_feed(legacy)
+        ingest_feed(make_feed(count=2))
+        self.assertEqual(Flyby.objects.count(), 5)
+
+        out = StringIO()
+        call_command('drop_midnight_duplicates', stdout=out)
+        self.assertIn('Удалено дублей: 2', out.getvalue())
+        hours = {
+            nasa_id: timezone.localtime(date).hour
+            for nasa_id, date in Flyby.objects.values_list('asteroid__nasa_id', 'date')
+        }
+        self.assertEqual(hours, {'1000': 10, '1001': 10, '1002': 0})
+        self.assertEqual(DailyFlybyStats.objects.get(date=date(2026, 1, 12)).asteroid_count, 3)
+        call_command('drop_midnight_duplicates', stdout=StringIO())
+        self.assertEqual(Flyby.objects.count(), 3)
+
+    def test_process_and_save_data_uses_ingest(self):
+        """Сервис возвращает количество созданных астероидов и сближений."""
+        self.assertEqual(NASANeoWsService.process_and_save_data(make_feed(count=2)), (2, 2))
+        self.assertEqual(NASANeoWsService.process_and_save_data({}), (0, 0))
+
+
+def fake_response(data=None, status_code=200, remaining='100'):
+    response = mock.Mock(status_code=status_code, headers={'X-RateLimit-Remaining': remaining})
+    data = data if data is not None else make_feed(count=1)
+    response.json.return_value = data
+    response.content = json.dumps(data).encode()
+    return response
+
+
+class BackfillTest(TestCase):
+    def test_split_windows(self):
+        """Диапазон режется на окна не длиннее допустимого фидом."""
+        windows = split_windows(date(2026, 1, 1), date(2026, 1, 20))
+        self.assertEqual(windows, [
+            (date(2026, 1, 1), date(2026, 1, 8)),
+            (date(2026, 1, 9), date(2026, 1, 16)),
+            (date(2026, 1, 17), date(2026, 1, 20)),
+        ])
+
+    def test_key_pool_prefers_remaining_quota(self):
+        """Пул выдаёт ключ с наибольшим остатком и исключает исчерпанные."""
+        pool = ApiKeyPool(['a', 'b'])
+        pool.update('a', {'X-RateLimit-Remaining': '5'})
+        pool.update('b', {'X-RateLimit-Remaining': '50'})
+        self.assertEqual(pool.acquire(), 'b')
+        pool.exhaust('b')
+        pool.update('a', {'X-RateLimit-Remaining': '0'})
+        with self.assertRaises(RateLimitExhausted):
+            pool.acquire()
+
+    def test_load_nasa_resumes_from_checkpoint(self):
+        """Повторный запуск не запрашивает уже загруженные окна."""
+        args = ['--start', '2026-01-01', '--end', '2026-01-20', '--workers', '2']
+        with mock.patch.object(NASANeoWsService, 'request_feed', return_value=fake_response()) as request_feed:
+            call_command('load_nasa', *args, stdout=StringIO())
+            self.assertEqual(request_feed.call_count, 3)
+            self.assertEqual(FeedWindow.objects.count(), 3)
+            call_command('load_nasa', *args, stdout=StringIO())
+            self.assertEqual(request_feed.call_count, 3)
+        self.assertEqual(Asteroid.objects.count(), 1)
+
+    def test_load_nasa_stops_when_quota_exhausted(self):
+        """При ответе 429 от всех ключей окна остаются незагруженными."""
+        with mock.patch.object(NASANeoWsService, 'request_feed', return_value=fake_response(status_code=429)):
+            out = StringIO()
+            call_command('load_nasa', '--start', '2026-01-01', '--end', '2026-01-20', stdout=out)
+        self.assertFalse(FeedWindow.objects.exists())
+        self.assertIn('Квота исчерпана', out.getvalue())
+
+
+class NeoWsClientTest(TestCase):
+    def make_client(self, *responses):
+        client = NeoWsClient(base_url='http://neows.test/feed', max_retries=2, backoff_base=0.01)
+        client.session.get = mock.Mock(side_effect=list(responses))
+        return client
+
+    @mock.patch('core.client.time.sleep')
+    def test_retries_server_errors(self, sleep):
+        """5xx повторяется с задержкой, итоговый ответ возвращается вызывающему коду."""
+        client = self.make_client(fake_response(status_code=503), fake_response())
+        response = client.get_feed(date(2026, 1, 1), date(2026, 1, 8), 'key')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(client.stats.requests, 2)
+        self.assertEqual(client.stats.retries, 1)
+        self.assertEqual(len(client.stats.latencies), 2)
+
+    @mock.patch('core.client.time.sleep')
+    def test_quota_exhausted_is_not_retried(self, sleep):
+        """429 при нулевом остатке квоты сразу возвращается без повторов."""
+        client = self.make_client(fake_response(status_code=429, remaining='0'))
+        response = client.get_feed(date(2026, 1, 1), date(2026, 1, 8), 'key')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(client.stats.retries, 0)
+
+    @mock.patch('core.client.time.sleep')
+    def test_network_errors_raise_after_retries(self, sleep):
+        """Сетевая ошибка после всех повторов превращается в NeoWsClientError."""
+        error = requests.ConnectionError('down')
+        client = self.make_client(error, error, error)
+        with self.assertRaises(NeoWsClientError):
+            client.get_feed(date(2026, 1, 1), date(2026, 1, 8), 'key')
+        self.assertEqual(client.stats.failures, 1)
+        self.assertEqual(sleep.call_count, 2)
+
+    def test_retry_after_and_bucket(self):
+        """Retry-After разбирается, а токены ограничены остатком квоты."""
+        self.assertEqual(parse_retry_after('7'), 7.0)
+        self.assertIsNone(parse_retry_after('soon'))
+        bucket = TokenBucket(limit=1000, period=3600)
+        bucket.adjust({'X-RateLimit-Limit': '1000', 'X-RateLimit-Remaining': '1'})
+        self.assertEqual(bucket.reserve(), 0.0)
+        self.assertGreater(bucket.reserve(), 0.0)
+
+    @mock.patch('core.client.time.sleep')
+    def test_request_feed_waits_for_token(self, sleep):
+        """request_feed берёт токен ключа и ждёт, когда квота на исходе."""
+        client = NeoWsClient(base_url='http://neows.test/feed', rate_limit=1, rate_period=3600)
+        client.session.get = mock.Mock(side_effect=[fake_response(), fake_response()])
+        with mock.patch.object(NASANeoWsService, 'get_client', return_value=client):
+            NASANeoWsService.request_feed(date(2026, 1, 1), date(2026, 1, 8), api_key='key')
+            sleep.assert_not_called()
+            NASANeoWsService.request_feed(date(2026, 1, 1), date(2026, 1, 8), api_key='key')
+        self.assertGreater(sleep.call_args.args[0], 0)
+        self.assertGreater(client.stats.throttled_seconds, 0)
+
+
+class AsyncNeoWsClientTest(TestCase):
+    def make_client(self, *responses):
+        responses = iter(responses)
+        client = AsyncNeoWsClient(base_url='http://neows.test/feed', max_retries=2, backoff_base=0.01)
+        client.session = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: next(responses)))
+        return client
+
+    @mock.patch('core.client.asyncio.sleep')
+    async def test_retries_server_errors(self, sleep):
+        async with self.make_client(httpx.Response(503), httpx.Response(200, json=make_feed())) as client:
+            response = await client.get_feed(date(2026, 1, 12), date(2026, 1, 12), 'key')
+        self.assertEqual(response.json()['element_count'], 3)
+        self.assertEqual((client.stats.requests, client.stats.retries), (2, 1))
+        sleep.assert_awaited_once()
+
+    async def test_backfill_windows_concurrently(self):
+        """Асинхронная загрузка сохраняет окна так же, как синхронная."""
+        feed = json.dumps(make_feed()).encode()
+        client = self.make_client(*(httpx.Response(200, content=feed) for _ in range(2)))
+        windows = split_windows(date(2026, 1, 1), date(2026, 1, 12))
+        await arun_backfill(windows, workers=2, key_pool=ApiKeyPool(['key']), client=client)
+        await client.aclose()
+        self.assertEqual(await FeedWindow.objects.acount(), 2)
+        self.assertEqual(await Flyby.objects.acount(), 3)
+
+    async def test_async_views(self):
+        response = await self.async_client.get(reverse('core:index'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('ETag', response.headers)
+        user = await User.objects.acreate_user('researcher', password='secret')
+        await self.async_client.aforce_login(user)
+        response = await self.async_client.get(reverse('core:watchlist'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['summary']['total'], 0)
+
+
+class FeedStreamTest(TestCase):
+    def test_parser_matches_json_loads(self):
+        """Потоковый разбор при любой нарезке совпадает с json.loads."""
+        feed = make_feed(count=5)
+        feed['links'] = {'next': 'http://example.com/?a="b"'}
+        body = json.dumps(feed, ensure_ascii=False).encode()
+        expected = [('2026-01-12', item) for item in feed['near_earth_objects']['2026-01-12']]
+        for chunk_size in (1, 7, 64, len(body)):
+            parser = FeedStreamParser(iter_bytes(body, chunk_size))
+            self.assertEqual(list(parser), expected)
+            self.assertEqual(parser.meta['element_count'], 5)
+            self.assertEqual(parser.bytes_read, len(body))
+
+    def test_ingest_stream_in_batches(self):
+        """Поток пишется пакетами, статистика считает строки по стадиям."""
+        body = json.dumps(make_feed(count=7)).encode()
+        stats = PipelineStats()
+        result = ingest_items(FeedStreamParser(iter_bytes(body, 100)), batch_size=3, stats=stats)
+        self.assertEqual(result.asteroids_created, 7)
+        report = {stage['stage']: stage for stage in stats.report()}
+        self.assertEqual(report['parse']['rows'], 7)
+        self.assertEqual(report['normalize']['rows'], 7)
+        self.assertEqual(report['write']['rows'], 7)
+
+    def test_load_nasa_from_file(self):
+        """load_nasa --file загружает сохранённый дамп без обращения к API."""
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as f:
+            json.dump(make_feed(count=4), f)
+            f.flush()
+            out = StringIO()
+            call_command('load_nasa', '--file', f.name, stdout=out)
+        self.assertEqual(Asteroid.objects.count(), 4)
+        self.assertIn('parse: 4', out.getvalue())
+
+
+class IncrementalSyncTest(TestCase):
+    def test_unchanged_asteroids_are_not_rewritten(self):
+        """Совпавший отпечаток не трогает строку и её updated_at."""
+        ingest_feed(make_feed(count=2))
+        before = Asteroid.objects.get(nasa_id='1000').updated_at
+        result = ingest_feed(make_feed(count=2))
+        self.assertEqual(result.asteroids_updated, 0)
+        self.assertEqual(Asteroid.objects.get(nasa_id='1000').updated_at, before)
+        feed = make_feed(count=2)
+        feed['near_earth_objects']['2026-01-12'][0]['name'] = 'Renamed'
+        self.assertEqual(ingest_feed(feed).asteroids_updated, 1)
+
+    def test_fresh_window_is_skipped(self):
+        """Повторный запуск в пределах NASA_SYNC_FRESHNESS не ходит в API."""
+        with mock.patch.object(NASANeoWsService, 'request_feed', return_value=fake_response()) as request_feed:
+            call_command('load_nasa', stdout=StringIO())
+            call_command('load_nasa', stdout=StringIO())
+        self.assertEqual(request_feed.call_count, 1)
+
+    def test_unchanged_window_only_updates_watermark(self):
+        """Окно с тем же хэшем содержимого не пишется, обновляется только fetched_at."""
+        args = ['--start', '2026-01-01', '--end', '2026-01-05']
+        with mock.patch.object(NASANeoWsService, 'request_feed', return_value=fake_response()):
+            call_command('load_nasa', *args, stdout=StringIO())
+            window = FeedWindow.objects.get()
+            with mock.patch('core.backfill.ingest_records') as ingest:
+                call_command('load_nasa', *args, '--max-age', '0', stdout=StringIO())
+            ingest.assert_not_called()
+        refreshed = FeedWindow.objects.get()
+        self.assertEqual(refreshed.completed_at, window.completed_at)
+        self.assertGreater(refreshed.fetched_at, window.fetched_at)
+
+    def test_changed_window_is_parsed_once(self):
+        """Хэш и запись окна считаются по одному разбору ответа."""
+        body = json.dumps(make_feed(count=2)).encode()
+        with mock.patch('core.backfill.normalize_items', wraps=normalize_items) as normalize:
+            result = save_window((date(2026, 1, 12), date(2026, 1, 12)), body, known_hash='stale')
+        self.assertEqual(normalize.call_count, 1)
+        self.assertEqual(result.flybys_created, 2)
+        expected = content_hash(normalize_items(iter_feed_items(make_feed(count=2))))
+        self.assertEqual(FeedWindow.objects.get().content_hash, expected)
+
+
+class QueryPlanTest(TestCase):
+    def test_hazardous_flag_is_denormalized(self):
+        """Флаг опасности копируется в Flyby и выравнивается при изменении астероида."""
+        ingest_feed(make_feed(count=2))
+        self.assertEqual(Flyby.objects.filter(is_hazardous=True).count(), 1)
+        feed = make_feed(count=2)
+        feed['near_earth_objects']['2026-01-12'][1]['is_potentially_hazardous_asteroid'] = True
+        ingest_feed(feed)
+        self.assertEqual(Flyby.objects.filter(is_hazardous=True).count(), 2)
+
+    def test_find_seq_scans(self):
+        """Распознаются полные проходы SQLite и PostgreSQL, но не поиск по индексу."""
+        plan = (
+            '2 0 0 SCAN core_flyby\n'
+            '3 0 0 SCAN core_asteroid USING COVERING INDEX asteroid_hazardous_idx\n'
+            '4 0 0 SEARCH core_watchlist USING INDEX watchlist_user_added_idx (user_id=?)\n'
+            'Seq Scan on core_watchlist  (cost=0.00..1.01 rows=1 width=4)'
+        )
+        self.assertEqual(find_seq_scans(plan), {'core_flyby', 'core_watchlist'})
+
+    def test_explain_queries_has_no_seq_scans(self):
+        """Запросы страниц используют индексы."""
+        out = StringIO()
+        call_command('explain_queries', '--check', stdout=out)
+        self.assertIn('core_flyby', out.getvalue())
+
+
+class DailyStatsTest(TestCase):
+    def test_ingest_maintains_daily_stats(self):
+        """Загрузка пересчитывает агрегаты затронутых дней."""
+        ingest_feed(make_feed(count=3))
+        stats = DailyFlybyStats.objects.get(date=date(2026, 1, 12))
+        self.assertEqual((stats.asteroid_count, stats.hazardous_count), (3, 2))
+        self.assertEqual(stats.min_miss_distance_km, 1000000.5)
+        self.assertEqual(stats.max_velocity_kmh, 36000.0)
+
+        Flyby.objects.all().delete()
+        refresh_daily_stats([date(2026, 1, 12)])
+        self.assertFalse(DailyFlybyStats.objects.exists())
+
+    def test_index_reads_daily_stats(self):
+        """Статистика главной страницы берётся из агрегатов, а не из Flyby."""
+        ingest_feed(make_feed(count=3, date_str=timezone.localdate().isoformat(), time='12:00'))
+        response = self.client.get(reverse('core:index'))
+        self.assertEqual(response.context['total_asteroids'], 3)
+        self.assertEqual(response.context['hazardous_count'], 2)
+        self.assertEqual(response.context['safe_count'], 1)
+        self.assertEqual(len(response.context['flybys']), 3)
+
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_repeat_anonymous_view_is_not_modified(self):
+        """Повторный запрос с If-None-Match получает 304 без запросов к данным."""
+        response = self.client.get(reverse('core:index'))
+        etag = response.headers['ETag']
+        self.assertIn('public', response.headers['Cache-Control'])
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('core:index'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_ingest_changes_etag(self):
+        """Загрузка новых данных меняет ETag, параметры запроса тоже."""
+        etag = self.client.get(reverse('core:index')).headers['ETag']
+        self.assertNotEqual(self.client.get(reverse('core:index'), {'hazardous': '1'}).headers['ETag'], etag)
+        ingest_feed(make_feed(count=1))
+        cache.clear()
+        response = self.client.get(reverse('core:index'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        self.assertEqual(DataGeneration.objects.get().value, 1)
+
+    def test_authenticated_page_is_private(self):
+        """Страница вошедшего пользователя не кэшируется прокси."""
+        user = User.objects.create_user('researcher', password='secret')
+        self.client.force_login(user)
+        response = self.client.get(reverse('core:index'))
+        self.assertIn('private', response.headers['Cache-Control'])
+        self.assertNotIn('ETag', response.headers)
+
+
+class PaginationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        moment = timezone.now() + timezone.timedelta(hours=1)
+        for i in range(5):
+            asteroid = Asteroid.objects.create(nasa_id=str(i), name=f'A{i}')
+            # Одинаковая дата у нескольких строк: порядок держится на id
+            Flyby.objects.create(asteroid=asteroid, date=moment + timezone.timedelta(minutes=i // 2),
+                                 velocity_kmh=1, miss_distance_km=1)
+
+    def test_pages_cover_rows_once(self):
+        """Страницы по курсору не теряют и не повторяют строки с одинаковой датой."""
+        seen, cursor = [], None
+        while True:
+            page = keyset_page(Flyby.objects.all(), FLYBY_ORDER, cursor, page_size=2)
+            seen += [flyby.id for flyby in page.items]
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(seen, list(Flyby.objects.order_by(*FLYBY_ORDER).values_list('id', flat=True)))
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(InvalidCursor):
+            decode_cursor('not-a-cursor', Flyby, FLYBY_ORDER)
+        response = self.client.get(reverse('core:index'), {'cursor': 'garbage', 'page_size': '2'})
+        self.assertEqual(len(response.context['flybys']), 2)
+
+    def test_index_next_page(self):
+        """Ссылка «дальше» сохраняет фильтры и ведёт на следующую страницу."""
+        response = self.client.get(reverse('core:index'), {'page_size': '3'})
+        page = response.context['page']
+        self.assertTrue(page.has_next)
+        self.assertContains(response, f'cursor={page.next_cursor}')
+        response = self.client.get(reverse('core:index'), {'page_size': '3', 'cursor': page.next_cursor})
+        self.assertEqual(len(response.context['flybys']), 2)
+        self.assertFalse(response.context['page'].has_next)
+
+    def test_watchlist_pages(self):
+        user = User.objects.create_user('researcher', password='secret')
+        for asteroid in Asteroid.objects.all():
+            Watchlist.objects.create(user=user, asteroid=asteroid)
+        self.client.force_login(user)
+        response = self.client.get(reverse('core:watchlist'), {'page_size': '2'})
+        self.assertEqual(response.context['summary']['total'], 5)
+        self.assertEqual(len(response.context['watchlist_items']), 2)
+        self.assertEqual(len(response.context['upcoming_flybys']), 2)
+        cursor = response.context['upcoming_page'].next_cursor
+        response = self.client.get(reverse('core:watchlist'), {'page_size': '2', 'upcoming_cursor': cursor})
+        self.assertEqual(len(response.context['watchlist_items']), 2)
+        self.assertEqual(response.context['upcoming_flybys'][0].asteroid.nasa_id, '2')
+
+
+class ApiTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        ingest_feed(make_feed(count=4, date_str=timezone.localdate().isoformat(), time='23:00'))
+
+    def test_flybys_fields_and_cursor(self):
+        """Только запрошенные поля; курсор ведёт на следующую страницу."""
+        response = self.client.get(reverse('core:api_flybys'), {'fields': 'name,miss_distance_km', 'page_size': 3})
+        data = response.json()
+        self.assertEqual(set(data['results'][0]), {'name', 'miss_distance_km'})
+        self.assertEqual(len(data['results']), 3)
+        self.assertIn('ETag', response.headers)
+        data = self.client.get(reverse('core:api_flybys'), {'page_size': 3, 'cursor': data['next_cursor']}).json()
+        self.assertEqual(len(data['results']), 1)
+        self.assertIsNone(data['next'])
+
+    def test_flybys_filters_and_errors(self):
+        data = self.client.get(reverse('core:api_flybys'), {'hazardous': '1'}).json()
+        self.assertEqual(len(data['results']), 2)
+        self.assertTrue(all(row['is_hazardous'] for row in data['results']))
+        self.assertEqual(self.client.get(reverse('core:api_flybys'), {'fields': 'secret'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('core:api_flybys'), {'start': 'yesterday'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('core:api_flybys'), {'start': '2000-01-01', 'end': '2000-01-07'}).json()['results'], [])
+
+    def test_flybys_not_modified(self):
+        etag = self.client.get(reverse('core:api_flybys')).headers['ETag']
+        response = self.client.get(reverse('core:api_flybys'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_asteroid_detail(self):
+        data = self.client.get(reverse('core:api_asteroid', args=['1000']), {'fields': 'name,flybys'}).json()
+        self.assertEqual(data['name'], '(2026 AB)')
+        self.assertEqual(len(data['flybys']), 1)
+        self.assertEqual(self.client.get(reverse('core:api_asteroid', args=['missing'])).status_code, 404)
+
+    def test_watchlist(self):
+        self.assertEqual(self.client.get(reverse('core:api_watchlist')).status_code, 401)
+        user = User.objects.create_user('researcher', password='secret')
+        Watchlist.objects.create(user=user, asteroid=Asteroid.objects.get(nasa_id='1001'))
+        self.client.force_login(user)
+        response = self.client.get(reverse('core:api_watchlist'), {'fields': 'nasa_id'})
+        self.assertEqual(response.json()['results'], [{'nasa_id': '1001'}])
+        response = self.client.get(reverse('core:api_watchlist'), {'fields': 'nasa_id'},
+                                   HTTP_IF_NONE_MATCH=response.headers['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+
+class ExportTest(TestCase):
+    def setUp(self):
+        ingest_feed(make_feed(count=3))
+
+    def test_command_csv_and_filters(self):
+        out = StringIO()
+        call_command('export_flybys', '--hazardous', '--start', '2026-01-12', '--end', '2026-01-12', stdout=out)
+        rows = list(csv.DictReader(StringIO(out.getvalue())))
+        self.assertEqual([row['nasa_id'] for row in rows], ['1000', '1002'])
+        out = StringIO()
+        call_command('export_flybys', '--start', '2026-01-13', stdout=out)
+        self.assertEqual(out.getvalue().splitlines(), [','.join(EXPORT_COLUMNS)])
+
+    def test_command_gzip_ndjson_file(self):
+        with tempfile.NamedTemporaryFile(suffix='.ndjson.gz') as f:
+            call_command('export_flybys', '--format', 'ndjson', '--gzip', '--output', f.name,
+                         '--chunk-size', '1', stderr=StringIO())
+            lines = gzip.decompress(open(f.name, 'rb').read()).decode().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(json.loads(lines[0])['name'], '(2026 AB)')
+
+    def test_endpoint_streams(self):
+        user = User.objects.create_user('researcher', password='secret')
+        self.client.force_login(user)
+        response = self.client.get(reverse('core:export_flybys'), {'format': 'ndjson', 'hazardous': '0'})
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['nasa_id'] for line in lines], ['1001'])
+        response = self.client.get(reverse('core:export_flybys'), {'gzip': '1'})
+        self.assertEqual(response.headers['Content-Type'], 'application/gzip')
+        self.assertEqual(len(gzip.decompress(b''.join(response.streaming_content)).splitlines()), 4)
+        self.assertEqual(self.client.get(reverse('core:export_flybys'), {'start': '12.01.2026'}).status_code, 400)
+
+
+class AlertTest(TestCase):
+    def setUp(self):
+        soon = timezone.now() + timezone.timedelta(days=2)
+        later = timezone.now() + timezone.timedelta(days=20)
+        self.near = Asteroid.objects.create(nasa_id='1', name='Near', is_potentially_hazardous=True)
+        self.far = Asteroid.objects.create(nasa_id='2', name='Far')
+        Flyby.objects.create(asteroid=self.near, date=soon, velocity_kmh=1, miss_distance_km=100, is_hazardous=True)
+        Flyby.objects.create(asteroid=self.near, date=later, velocity_kmh=1, miss_distance_km=100, is_hazardous=True)
+        Flyby.objects.create(asteroid=self.far, date=soon, velocity_kmh=1, miss_distance_km=9000)
+        self.alice = User.objects.create_user('alice', 'alice@example.com', 'secret')
+        self.bob = User.objects.create_user('bob', 'bob@example.com', 'secret')
+        for user in (self.alice, self.bob):
+            Watchlist.objects.create(user=user, asteroid=self.near)
+            Watchlist.objects.create(user=user, asteroid=self.far)
+        AlertRule.objects.create(user=self.alice)
+        AlertRule.objects.create(user=self.bob, max_miss_distance_km=1000, hazardous_only=True,
+                                 lookahead=timezone.timedelta(days=30))
+
+    def test_thresholds_in_one_query(self):
+        """Пороги всех пользователей проверяются одним запросом."""
+        with self.assertNumQueries(1):
+            pairs = sorted(matching_flybys())
+        alice = sorted(Flyby.objects.filter(date__lt=timezone.now() + timezone.timedelta(days=7)).values_list('id', flat=True))
+        bob = sorted(Flyby.objects.filter(asteroid=self.near).values_list('id', flat=True))
+        self.assertEqual(pairs, sorted([(self.alice.id, i) for i in alice] + [(self.bob.id, i) for i in bob]))
+
+    def test_one_email_per_user_and_no_repeats(self):
+        result = run_alerts()
+        self.assertEqual((result.created, result.users, result.sent), (4, 2, 4))
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), ['alice@example.com', 'bob@example.com'])
+        self.assertIn('Near', mail.outbox[0].body)
+        self.assertFalse(AlertDelivery.objects.filter(sent_at__isnull=True).exists())
+
+        result = run_alerts()
+        self.assertEqual((result.created, result.sent), (0, 0))
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_update_rule_view(self):
+        self.client.force_login(self.alice)
+        self.client.post(reverse('core:update_alert_rule'), {
+            'max_miss_distance_km': '500', 'days_ahead': '99', 'hazardous_only': '1',
+        })
+        rule = AlertRule.objects.get(user=self.alice)
+        self.assertEqual(rule.max_miss_distance_km, 500)
+        self.assertEqual(rule.lookahead, AlertRule.MAX_LOOKAHEAD)
+        self.assertTrue(rule.hazardous_only)
+        self.assertFalse(rule.enabled)
+
+
+class WatchlistSummaryTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('researcher', password='secret')
+        now = timezone.now()
+        self.asteroids = [Asteroid.objects.create(nasa_id=str(i), name=f'A{i}') for i in range(3)]
+        # A0 сближается через 5 дней, A1 — через 1 день (и уже сближался), у A2 сближений нет
+        for asteroid, days in ((self.asteroids[0], 5), (self.asteroids[1], 1), (self.asteroids[1], -3)):
+            Flyby.objects.create(asteroid=asteroid, date=now + timezone.timedelta(days=days),
+                                 velocity_kmh=1, miss_distance_km=1)
+        self.client.force_login(self.user)
+        for asteroid in self.asteroids:
+            self.client.get(reverse('core:add_to_watchlist', args=[asteroid.id]))
+
+    def test_sorted_by_next_approach(self):
+        """Ближайшие сближения первыми, астероиды без сближений — в конце, в том числе на следующей странице."""
+        response = self.client.get(reverse('core:watchlist'), {'page_size': 2})
+        self.assertEqual([item.asteroid.name for item in response.context['watchlist_items']], ['A1', 'A0'])
+        cursor = response.context['items_page'].next_cursor
+        response = self.client.get(reverse('core:watchlist'), {'page_size': 2, 'cursor': cursor})
+        self.assertEqual([item.asteroid.name for item in response.context['watchlist_items']], ['A2'])
+        response = self.client.get(reverse('core:watchlist'), {'sort': 'added'})
+        self.assertEqual(response.context['watchlist_items'][0].asteroid.name, 'A2')
+
+    def test_summary_cached_and_invalidated(self):
+        summary = self.client.get(reverse('core:watchlist')).context['summary']
+        self.assertEqual((summary['total'], summary['upcoming']), (3, 2))
+        with self.assertNumQueries(0):
+            self.assertEqual(watchlist_summary(self.user), summary)
+        self.client.get(reverse('core:remove_from_watchlist', args=[Watchlist.objects.get(asteroid=self.asteroids[0]).id]))
+        self.assertEqual(watchlist_summary(self.user)['total'], 2)
+
+    def test_ingest_and_passed_flybys_refresh_next_approach(self):
+        item = Watchlist.objects.get(asteroid=self.asteroids[1])
+        passed = timezone.now() - timezone.timedelta(days=3)
+        Watchlist.objects.filter(pk=item.pk).update(next_approach_at=passed)
+        # Страница не пишет: прошедшая дата не показывается, но и не сдвигается
+        with self.assertNumQueries(7):
+            response = self.client.get(reverse('core:watchlist'))
+        self.assertNotContains(response, timezone.localtime(passed).strftime('%d.%m.%Y %H:%M'))
+        self.assertEqual(Watchlist.objects.get(pk=item.pk).next_approach_at, passed)
+        summary = watchlist_summary(self.user)
+        out = StringIO()
+        call_command('refresh_watchlist', stdout=out)
+        self.assertIn('Обновлено строк списков отслеживания: 1', out.getvalue())
+        item.refresh_from_db()
+        self.assertGreater(item.next_approach_at, timezone.now())
+        self.assertEqual(refresh_passed(), 0)
+        # Сводка владельца сброшена вместе со сдвигом
+        self.assertIsNot(watchlist_summary(self.user), summary)
+
+        asteroid = Asteroid.objects.create(nasa_id='1000', name='(2026 AB)')
+        Watchlist.objects.create(user=self.user, asteroid=asteroid)
+        day = timezone.localdate() + timezone.timedelta(days=3)
+        ingest_feed(make_feed(count=1, date_str=day.isoformat(), time='12:00'))
+        self.assertEqual(Watchlist.objects.get(asteroid=asteroid).next_approach_at.date(), day)
+
+
+class LiveEventsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    async def test_pushes_flybys_and_stats_after_ingest(self):
+        stream = live_events(poll=0.01, lifetime=5)
+        self.assertTrue((await anext(stream)).startswith('retry:'))
+        self.assertIn('event: hello', await anext(stream))
+
+        await sync_to_async(ingest_feed)(make_feed(date_str=timezone.localdate().isoformat(), time='23:00'))
+        # on_commit в TestCase не срабатывает: сбрасываем кэш поколения сами
+        await cache.aclear()
+        message = await anext(stream)
+        self.assertIn('event: flybys', message)
+        self.assertIn('id: 1', message)
+        flybys = json.loads(message.split('data: ', 1)[1])
+        self.assertEqual(len(flybys), 3)
+        self.assertIn('date_display', flybys[0])
+        stats = json.loads((await anext(stream)).split('data: ', 1)[1])
+        self.assertEqual(stats['total_asteroids'], 3)
+        await stream.aclose()
+
+    async def test_stale_last_event_id_reloads(self):
+        stream = live_events(last_event_id='41', poll=0.01, lifetime=0.01)
+        messages = [message async for message in stream]
+        self.assertIn('event: reload', messages[1])
+
+    def test_index_rows_carry_live_ids(self):
+        ingest_feed(make_feed(count=1, date_str=timezone.localdate().isoformat(), time='23:00'))
+        response = self.client.get(reverse('core:index'))
+        self.assertContains(response, f'data-flyby-id="{Flyby.objects.get().id}"')
+
+    async def test_live_feed_only_under_asgi(self):
+        # Клиент тестов — WSGI: ленту не подключаем, поток не открываем
+        response = await sync_to_async(self.client.get)(reverse('core:index'))
+        self.assertNotContains(response, reverse('core:live_feed'))
+        self.assertEqual((await sync_to_async(self.client.get)(reverse('core:live_feed'))).status_code, 204)
+
+        response = await self.async_client.get(reverse('core:index'))
+        self.assertContains(response, reverse('core:live_feed'))
+        with self.settings(NASA_LIVE_FEED_ENABLED=False):
+            self.assertEqual((await self.async_client.get(reverse('core:live_feed'))).status_code, 204)
+
+
+class QueryBudgetTest(TestCase):
+    """
+    Число запросов страниц не зависит от объёма данных: N+1 в представлении
+    или шаблоне превышает бюджет уже на синтетическом наборе.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        ingest_feed(synthetic_feed(asteroids=60, flybys_per_asteroid=3))
+        cls.user = create_users(users=1, watchlist_per_user=25)[0]
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_index_budget(self):
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('core:index'), {'page_size': 200})
+        self.assertGreater(len(response.context['flybys']), 10)
+
+    def test_index_anonymous_budget(self):
+        self.client.logout()
+        with self.assertNumQueries(3):
+            self.client.get(reverse('core:index'), {'page_size': 200})
+
+    def test_watchlist_budget(self):
+        with self.assertNumQueries(7):
+            response = self.client.get(reverse('core:watchlist'), {'page_size': 50})
+        self.assertEqual(len(response.context['watchlist_items']), 25)
+
+    def test_api_flybys_budget(self):
+        self.client.logout()
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('core:api_flybys'), {'page_size': 500})
+        self.assertGreater(len(response.json()['results']), 10)
+
+
+class BenchTest(TestCase):
+    def test_synthetic_feed_is_deterministic(self):
+        self.assertEqual(synthetic_feed(10, 2, seed=1), synthetic_feed(10, 2, seed=1))
+        self.assertEqual(synthetic_feed(10, 2)['element_count'], 20)
+
+    def test_percentile_nearest_rank(self):
+        self.assertEqual(percentile(range(1, 21), 0.95), 19)
+        self.assertEqual(percentile([5], 0.5), 5)
+
+    def test_run_bench_reports_metrics(self):
+        results = run_bench(asteroids=20, flybys_per_asteroid=2, users=2, watchlist_per_user=5, repeat=2)
+        self.assertEqual(results['ingest']['initial']['flybys_created'], 40)
+        self.assertEqual(results['ingest']['repeat']['flybys_created'], 0)
+        self.assertEqual(set(results['views']), {'index', 'index_authenticated', 'watchlist'})
+        changes = dict((name, change) for name, _, _, change in compare(results, results))
+        self.assertEqual(changes['views.index.queries'], 0)
+
+
+class FakeFeedTest(TestCase):
+    def setUp(self):
+        self.server = None
+
+    def tearDown(self):
+        NASANeoWsService.set_base_url(None)
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def start(self, **config):
+        self.server = start_in_thread(FakeFeedConfig(**config))
+        return NeoWsClient(base_url=self.server.url, backoff_base=0.001, max_retries=8)
+
+    def test_feed_is_deterministic_per_day(self):
+        client = self.start(per_day=5)
+        first = client.get_feed(date(2026, 1, 1), date(2026, 1, 3), 'key').json()
+        second = client.get_feed(date(2026, 1, 3), date(2026, 1, 5), 'key').json()
+        self.assertEqual(first['element_count'], 15)
+        self.assertEqual(first['near_earth_objects']['2026-01-03'], second['near_earth_objects']['2026-01-03'])
+
+    def test_rate_limit_headers_and_quota(self):
+        self.start(per_day=1, rate_limit=2)
+        params = {'start_date': '2026-01-01', 'end_date': '2026-01-01', 'api_key': 'key'}
+        remaining = [requests.get(self.server.url, params=params).headers['X-RateLimit-Remaining'] for _ in range(2)]
+        self.assertEqual(remaining, ['1', '0'])
+        self.assertEqual(requests.get(self.server.url, params=params).status_code, 429)
+        self.assertEqual(requests.get(self.server.url, params={**params, 'api_key': 'other'}).status_code, 200)
+        self.assertEqual(requests.get(self.server.url, params={**params, 'api_key': ''}).status_code, 403)
+
+    def test_rejects_long_range(self):
+        client = self.start()
+        self.assertEqual(client.get_feed(date(2026, 1, 1), date(2026, 1, 10), 'key').status_code, 400)
+
+    def test_injected_errors_are_retried(self):
+        client = self.start(per_day=1, error_rate=0.5, errors=(503, DROP), seed=3)
+        for day in range(1, 6):
+            response = client.get_feed(date(2026, 1, day), date(2026, 1, day), 'key')
+            self.assertEqual(response.status_code, 200)
+        self.assertGreater(client.stats.retries, 0)
+
+    def test_load_nasa_uses_base_url(self):
+        self.start(per_day=4)
+        call_command(
+            'load_nasa', '--base-url', self.server.url, '--start', '2026-01-01', '--end', '2026-01-09',
+            '--no-alerts', stdout=StringIO(),
+        )
+        self.assertEqual(Flyby.objects.count(), 36)
+        self.assertEqual(self.server.state.statuses, {200: 2})
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        REGISTRY.clear()
+
+    def test_histogram_renders_cumulative_buckets(self):
+        histogram = Histogram('test_seconds', 'Тест', ('view',), buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 5):
+            histogram.observe(value, view='a"b')
+        text = histogram.render()
+        self.assertIn('test_seconds_bucket{view="a\\"b",le="0.1"} 1', text)
+        self.assertIn('test_seconds_bucket{view="a\\"b",le="1.0"} 2', text)
+        self.assertIn('test_seconds_bucket{view="a\\"b",le="+Inf"} 3', text)
+        self.assertIn('test_seconds_count{view="a\\"b"} 3', text)
+
+    def test_request_metrics_count_queries(self):
+        ingest_feed(make_feed(count=2, date_str=timezone.localdate().isoformat(), time='23:00'))
+        self.client.get(reverse('core:index'))
+        self.assertEqual(REQUESTS.value(view='core:index', method='GET', status=200), 1)
+        self.assertEqual(REQUEST_DB_QUERIES.count(view='core:index'), 1)
+        self.assertEqual(TEMPLATE_DURATION.count(template='core/index.html'), 1)
+        series = REQUEST_DB_QUERIES._series[('core:index',)]
+        self.assertGreater(series.total, 0)
+
+        response = self.client.get(reverse('core:metrics'))
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        self.assertContains(response, 'neo_http_requests_total{view="core:index",method="GET",status="200"} 1')
+        self.assertContains(response, 'neo_ingest_rows_total{model="flyby",action="created"} 2')
+
+    def test_client_records_latency_and_headroom(self):
+        client = NeoWsClient(max_retries=0)
+        with mock.patch.object(client.session, 'get', return_value=fake_response(remaining='42')):
+            client.get_feed(date(2026, 1, 1), date(2026, 1, 2), 'abcdefgh1234')
+        self.assertEqual(NEOWS_DURATION.count(outcome='ok'), 1)
+        self.assertEqual(NEOWS_RATE_LIMIT_REMAINING.value(key='…1234'), 42)
+
+    @override_settings(NASA_METRICS_TOKEN='secret')
+    def test_token_required_when_configured(self):
+        self.assertEqual(self.client.get(reverse('core:metrics')).status_code, 403)
+        response = self.client.get(reverse('core:metrics'), headers={'Authorization': 'Bearer secret'})
+        self.assertEqual(response.status_code, 200)
+
+
+class ProfilingTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.staff = User.objects.create_user('staff', password='x', is_staff=True, is_superuser=True)
+        ingest_feed(make_feed(count=2, date_str=timezone.localdate().isoformat(), time='23:00'))
+
+    def test_staff_flag_captures_profile_and_sql(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('core:index'), {'_profile': '1'})
+        capture = ProfileCapture.objects.get(pk=response['X-Profile-Capture'])
+        self.assertEqual((capture.trigger, capture.view_name, capture.user), ('manual', 'core:index', self.staff))
+        self.assertEqual(capture.query_count, len(capture.sql_log))
+        self.assertTrue(any('core_flyby' in query['sql'] for query in capture.sql_log))
+        self.assertIn('cumulative', capture.profile_text)
+        self.assertTrue(marshal.loads(bytes(capture.profile_data)))
+
+        download = self.client.get(reverse('admin:core_profilecapture_download', args=[capture.pk]))
+        self.assertEqual(download.content, bytes(capture.profile_data))
+        self.assertContains(self.client.get(reverse('admin:core_profilecapture_change', args=[capture.pk])), 'core_flyby')
+
+    def test_flag_ignored_for_regular_users(self):
+        user = User.objects.create_user('regular', password='x')
+        self.client.force_login(user)
+        response = self.client.get(reverse('core:index'), headers={'X-Profile': '1'})
+        self.assertNotIn('X-Profile-Capture', response)
+        self.assertFalse(ProfileCapture.objects.exists())
+
+    @override_settings(NASA_PROFILE_MAX_PER_MINUTE=1)
+    def test_captures_are_rate_limited(self):
+        self.client.force_login(self.staff)
+        for _ in range(3):
+            self.client.get(reverse('core:index'), headers={'X-Profile': '1'})
+        self.assertEqual(ProfileCapture.objects.count(), 1)
+
+    @override_settings(NASA_PROFILE_THRESHOLD_MS=0.001, NASA_PROFILE_SAMPLE_RATE=0, NASA_PROFILE_KEEP=2)
+    def test_slow_requests_captured_without_profile_outside_sample(self):
+        for _ in range(3):
+            self.client.get(reverse('core:index'))
+        captures = list(ProfileCapture.objects.all())
+        self.assertEqual(len(captures), 2)
+        self.assertEqual(captures[0].trigger, 'threshold')
+        self.assertIsNone(captures[0].profile_data)
+        self.assertTrue(captures[0].sql_log)
+
+
+# Орбита Земли, наклонённая на 2°: проходит через Землю в узлах, около 20 марта и 22 сентября
+TILTED_EARTH = {
+    'orbit_epoch_jd': EARTH_ELEMENTS[0],
+    'semi_major_axis_au': EARTH_ELEMENTS[1],
+    'eccentricity': EARTH_ELEMENTS[2],
+    'inclination_deg': 2.0,
+    'ascending_node_deg': EARTH_ELEMENTS[4],
+    'perihelion_arg_deg': EARTH_ELEMENTS[5],
+    'mean_anomaly_deg': EARTH_ELEMENTS[6],
+}
+
+
+def mpc_line(designation, epoch='K2555', elements=(310.55432, 178.92918, 304.27008, 10.82773, 0.2228359, 1.4580300)):
+    """Строка MPCORB.DAT с полями в колонках формата."""
+    line = [' '] * 202
+    mean_anomaly, peri, node, inclination, eccentricity, axis = elements
+    for start, text in (
+        (0, designation[:7]), (20, epoch), (26, f'{mean_anomaly:9.5f}'), (37, f'{peri:9.5f}'),
+        (48, f'{node:9.5f}'), (59, f'{inclination:9.5f}'), (70, f'{eccentricity:9.7f}'),
+        (92, f'{axis:11.7f}'), (166, designation),
+    ):
+        line[start:start + len(text)] = text
+    return ''.join(line)
+
+
+class OrbitTest(TestCase):
+    def test_propagator_finds_node_crossings(self):
+        elements = Elements.from_rows([list(TILTED_EARTH.values())])
+        start = 2461041.5  # 2026-01-01
+        approaches = find_approaches(elements, start, start + 365, chunk_size=1)
+        self.assertEqual(len(approaches), 2)
+        self.assertTrue((approaches.distance_au < 1e-4).all())
+        self.assertEqual([jd_to_datetime(jd).month for jd in approaches.jd], [3, 9])
+        # Скорость относительно Земли в узле: около 30 км/с × sin 2°
+        self.assertTrue(((approaches.velocity_kmh > 3000) & (approaches.velocity_kmh < 4500)).all())
+
+    def test_parse_mpc_line(self):
+        self.assertEqual(unpack_epoch('K2555'), 2460800.5)  # 2025-05-05
+        self.assertEqual(unpack_epoch('K25AV'), 2460979.5)  # 2025-10-31
+        number, designation, elements = parse_mpc_line(mpc_line('(433) Eros'))
+        self.assertEqual((number, designation), (433, 'Eros'))
+        self.assertAlmostEqual(elements['semi_major_axis_au'], 1.45803)
+        self.assertAlmostEqual(elements['eccentricity'], 0.2228359)
+        self.assertEqual(parse_mpc_line(mpc_line('2020 AB'))[:2], (None, '2020 AB'))
+
+    def test_import_mpc_matches_numbered_and_provisional(self):
+        eros = Asteroid.objects.create(nasa_id='2000433', name='433 Eros (A898 PA)')
+        provisional = Asteroid.objects.create(nasa_id='3000001', name='(2020 AB)')
+        lines = ['Header', '-' * 160, mpc_line('(433) Eros'), mpc_line('2020 AB'), mpc_line('2021 ZZ')]
+        result = import_mpc(lines)
+        self.assertEqual((result.updated, result.unmatched), (2, ['(2021 ZZ)']))
+        eros.refresh_from_db()
+        provisional.refresh_from_db()
+        self.assertEqual((eros.orbit_source, provisional.orbit_source), ('mpc', 'mpc'))
+        self.assertAlmostEqual(eros.inclination_deg, 10.82773)
+
+    def test_import_neows_lookup_and_browse(self):
+        Asteroid.objects.create(nasa_id='1000', name='Old')
+        objects = [
+            {'id': str(nasa_id), 'name': f'({nasa_id})', 'orbital_data': {
+                'epoch_osculation': '2461000.5', 'semi_major_axis': '1.2', 'eccentricity': '.3',
+                'inclination': '5', 'ascending_node_longitude': '10', 'perihelion_argument': '20', 'mean_anomaly': '30',
+            }}
+            for nasa_id in (1000, 1001)
+        ]
+        with self.assertLogs('core.orbits', 'WARNING') as logs:
+            result = import_neows({'near_earth_objects': objects + [{'id': '1002', 'orbital_data': {}}]})
+        self.assertIn('Нет элементов орбиты для 1002', logs.output[0])
+        self.assertEqual((result.updated, result.created, result.unmatched), (1, 1, ['1002']))
+        self.assertEqual(Asteroid.objects.get(nasa_id='1001').semi_major_axis_au, 1.2)
+        self.assertEqual(import_neows(objects[0]).updated, 1)
+
+    def test_predict_writes_local_rows_outside_neows_days(self):
+        asteroid = Asteroid.objects.create(nasa_id='9', name='(Tilted)', is_potentially_hazardous=True, **TILTED_EARTH)
+        Asteroid.objects.create(nasa_id='10', name='(No elements)')
+        start = date(2026, 3, 1)
+        result = predict_flybys(start=start, days=45)
+        self.assertEqual((result.objects, result.created), (1, 1))
+        flyby = Flyby.objects.get()
+        self.assertEqual((flyby.source, flyby.is_hazardous), ('local', True))
+        self.assertTrue(DailyFlybyStats.objects.filter(date=timezone.localdate(flyby.date)).exists())
+
+        # День загружен из NeoWs: прежний прогноз убирается, новый на этот день не пишется
+        Flyby.objects.create(asteroid=asteroid, date=flyby.date + timezone.timedelta(hours=3),
+                             velocity_kmh=1, miss_distance_km=1)
+        result = predict_flybys(start=start, days=45)
+        self.assertEqual((result.removed, result.created, result.skipped), (1, 0, 1))
+        self.assertEqual(list(Flyby.objects.values_list('source', flat=True)), ['neows'])
+
+    def test_ingest_replaces_predictions_for_feed_days(self):
+        """Загрузка дня из NeoWs убирает прогноз на этот день в той же транзакции."""
+        tomorrow = timezone.localdate() + timezone.timedelta(days=1)
+        other = Asteroid.objects.create(nasa_id='9', name='(Tilted)')
+        moment = day_start(tomorrow) + timezone.timedelta(hours=4)
+        Flyby.objects.create(asteroid=other, date=moment, velocity_kmh=1, miss_distance_km=1, source=Flyby.SOURCE_LOCAL)
+        later = Flyby.objects.create(asteroid=other, date=moment + timezone.timedelta(days=3), velocity_kmh=1,
+                                     miss_distance_km=1, source=Flyby.SOURCE_LOCAL)
+        ingest_feed(make_feed(count=2, date_str=tomorrow.isoformat()))
+        self.assertEqual(set(Flyby.objects.filter(source=Flyby.SOURCE_LOCAL)), {later})
+        self.assertEqual(DailyFlybyStats.objects.get(date=tomorrow).asteroid_count, 2)
+
+    def test_alerts_and_api_distinguish_predictions(self):
+        asteroid = Asteroid.objects.create(nasa_id='9', name='(Tilted)')
+        Flyby.objects.create(asteroid=asteroid, date=timezone.now() + timezone.timedelta(days=1),
+                             velocity_kmh=1, miss_distance_km=1, source=Flyby.SOURCE_LOCAL)
+        user = User.objects.create_user('alice', 'alice@example.com', 'secret')
+        Watchlist.objects.create(user=user, asteroid=asteroid)
+        AlertRule.objects.create(user=user)
+        self.assertFalse(matching_flybys().exists())
+        rows = self.client.get(reverse('core:api_flybys')).json()['results']
+        self.assertEqual([row['source'] for row in rows], ['local'])
+
+
+class AnalyticsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        feed = make_feed(count=4, date_str=timezone.localdate().isoformat(), time='23:00')
+        day = next(iter(feed['near_earth_objects'].values()))
+        for i, item in enumerate(day):
+            item['close_approach_data'][0]['miss_distance']['kilometers'] = str(LUNAR_DISTANCE_KM * (i + 1))
+            if i < 3:
+                item['estimated_diameter'] = {'meters': {
+                    'estimated_diameter_min': 10 ** (i + 1), 'estimated_diameter_max': 4 * 10 ** (i + 1),
+                }}
+        # Второе сближение первого астероида: размер учитывается один раз
+        day[0]['close_approach_data'].append({**day[0]['close_approach_data'][0], 'close_approach_date_full': None})
+        ingest_feed(feed)
+
+    def test_ingest_stores_diameter(self):
+        self.assertEqual(
+            list(Asteroid.objects.order_by('nasa_id').values_list('diameter_min_m', 'diameter_max_m')),
+            [(10, 40), (100, 400), (1000, 4000), (None, None)],
+        )
+
+    def test_histograms_and_percentiles(self):
+        data = self.client.get(reverse('core:api_analytics')).json()
+        self.assertEqual((data['flybys'], data['asteroids'], data['with_diameter']), (5, 4, 3))
+        diameter = data['histograms']['diameter_m']
+        self.assertEqual(sum(diameter['counts']), 3)
+        self.assertEqual(data['percentiles']['diameter_m']['p50'], 200)
+        distance = data['histograms']['miss_distance_ld']
+        self.assertEqual(sum(distance['counts']), 5)
+        self.assertEqual(sum(distance['hazardous']), Flyby.objects.filter(is_hazardous=True).count())
+        self.assertEqual(data['percentiles']['miss_distance_ld']['p50'], 2)
+        self.assertEqual(data['histograms']['velocity_kmh']['counts'][-1], 5)
+
+    def test_cached_per_generation(self):
+        url = reverse('core:api_analytics')
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            self.client.get(url)
+        ingest_feed(make_feed(count=1, date_str=timezone.localdate().isoformat(), time='05:00'))
+        cache.delete('core:data-generation')
+        self.assertEqual(self.client.get(url).json()['flybys'], 6)
+
+    def test_nice_edges(self):
+        edges = nice_edges(95)
+        self.assertEqual((edges[1], edges[-1]), (5, 95))
+        self.assertEqual(len(nice_edges(0)), 25)
+
+
+class ColumnarArchiveTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        settings = override_settings(NASA_ARCHIVE_DIR=self.directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.today = timezone.localdate()
+        for days_ago in (1, 2, 3, 10):
+            ingest_feed(make_feed(
+                count=3, date_str=(self.today - timezone.timedelta(days=days_ago)).isoformat(),
+                miss_distance=str(1000 * days_ago), time='00:00',
+            ))
+
+    def test_build_append_and_range_search(self):
+        self.assertEqual(append_archive(until=self.today - timezone.timedelta(days=2)), 6)
+        archive = get_archive()
+        self.assertEqual(len(archive), 6)
+        self.assertEqual(append_archive(until=self.today), 6)
+        archive = get_archive()
+        self.assertEqual((len(archive), len(archive.asteroids)), (12, 3))
+        self.assertTrue((numpy.diff(archive.columns['date']) >= 0).all())
+
+        day = self.today - timezone.timedelta(days=2)
+        first, last = archive.bounds(day_start(day), day_start(self.today))
+        self.assertEqual(last - first, 6)
+        self.assertEqual(set(archive.columns['miss_distance_km'][first:last]), {1000, 2000})
+        # Повторное дописывание без новых дней ничего не меняет
+        self.assertEqual(append_archive(until=self.today), 0)
+
+    def test_export_matches_database(self):
+        append_archive()
+        out = StringIO()
+        call_command('export_flybys', '--archive', '--format', 'ndjson', stdout=out)
+        from_archive = [json.loads(line) for line in out.getvalue().splitlines()]
+        out = StringIO()
+        call_command('export_flybys', '--format', 'ndjson', stdout=out)
+        self.assertEqual(from_archive, [json.loads(line) for line in out.getvalue().splitlines()])
+
+        hazardous = list(get_archive().export_rows(hazardous=True, chunk_size=2))
+        self.assertEqual(len(hazardous), Flyby.objects.filter(is_hazardous=True).count())
+
+    def test_analytics_read_archive_without_database(self):
+        append_archive()
+        start, end = day_start(self.today - timezone.timedelta(days=10)), day_start(self.today)
+        expected = summarize(to_columns(list(
+            Flyby.objects.filter(date__gte=start, date__lt=end).order_by().values_list(
+                'asteroid_id', 'miss_distance_km', 'velocity_kmh', 'is_hazardous',
+                'asteroid__diameter_min_m', 'asteroid__diameter_max_m',
+            )
+        )))
+        get_generation()
+        with self.assertNumQueries(0):
+            self.assertEqual(window_analytics(start, end), expected)
+
+
+class SearchTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        ingest_feed(make_feed(count=3))
+        Asteroid.objects.create(nasa_id='2000433', name='433 Eros (A898 PA)')
+
+    def names(self, query):
+        return [result['name'] for result in search_asteroids(query)]
+
+    def test_designation_prefix_and_nasa_id(self):
+        self.assertEqual(self.names('2027 AB'), ['(2027 AB)'])
+        self.assertEqual(self.names('2026 a'), ['(2026 AB)'])
+        self.assertEqual(self.names('433'), ['433 Eros (A898 PA)'])
+        self.assertEqual(self.names('ero'), ['433 Eros (A898 PA)'])
+        self.assertEqual(self.names('1001'), ['(2027 AB)'])
+        # Операторы FTS5 в запросе — обычные слова
+        self.assertEqual(self.names('AB OR "x NEAR('), [])
+        self.assertEqual(self.names('  '), [])
+
+    def test_index_follows_ingestion(self):
+        feed = make_feed(count=1)
+        next(iter(feed['near_earth_objects'].values()))[0]['name'] = '(2026 ZZ)'
+        ingest_feed(feed)
+        self.assertEqual(self.names('2026 zz'), ['(2026 ZZ)'])
+        self.assertEqual(self.names('2026 ab'), [])
+        Asteroid.objects.filter(nasa_id='1001').delete()
+        self.assertEqual(self.names('2027'), [])
+
+    def test_missing_triggers_are_restored(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER core_asteroid_search_ai')
+        Asteroid.objects.create(nasa_id='3000001', name='(2030 QQ)')
+        self.assertEqual(self.names('2030'), [])
+        self.assertTrue(ensure_index())
+        self.assertFalse(ensure_index())
+        self.assertEqual(self.names('2030'), ['(2030 QQ)'])
+
+    def test_endpoints(self):
+        url = reverse('core:api_search')
+        self.assertEqual(self.client.get(url).status_code, 400)
+        self.client.get(url, {'q': 'eros'})
+        with self.assertNumQueries(1):
+            data = self.client.get(url, {'q': '2026', 'limit': '5'}).json()
+        self.assertEqual([row['nasa_id'] for row in data['results']], ['1000'])
+        self.assertContains(self.client.get(reverse('core:search'), {'q': 'eros'}), '433 Eros')
+
+        staff = User.objects.create_user('staff', password='x', is_staff=True, is_superuser=True)
+        self.client.force_login(staff)
+        response = self.client.get(reverse('admin:core_asteroid_changelist'), {'q': '2027 ab'})
+        self.assertEqual([asteroid.nasa_id for asteroid in response.context['cl'].result_list], ['1001'])
+
+
+class DatabaseModeTest(TestCase):
+    @override_settings(NASA_READ_DATABASE='pragmas')
+    def test_sqlite_pragmas_on_new_connection(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            wrapper = type(connections['default'])({**connection.settings_dict, 'NAME': f'{tmp}/db.sqlite3'}, alias='pragmas')
+            wrapper.ensure_connection()
+            try:
+                with wrapper.cursor() as cursor:
+                    values = [cursor.execute(f'PRAGMA {name}').fetchone()[0]
+                              for name in ('journal_mode', 'busy_timeout', 'synchronous', 'query_only')]
+            finally:
+                wrapper.close()
+        # synchronous=NORMAL — 1; соединение псевдонима чтения — только на чтение
+        self.assertEqual(values, ['wal', 5000, 1, 1])
+
+    @override_settings(NASA_READ_DATABASE='replica')
+    def test_router_sends_reads_to_replica_outside_transactions(self):
+        router = ReadWriteRouter()
+        # TestCase держит тест в транзакции: чтения внутри неё остаются в default
+        self.assertEqual(router.db_for_read(Flyby), 'default')
+        with mock.patch.object(connection, 'in_atomic_block', False):
+            self.assertEqual(router.db_for_read(Flyby), 'replica')
+            self.assertEqual(router.db_for_read(Asteroid), 'replica')
+            self.assertIsNone(router.db_for_read(Watchlist))
+            self.assertIsNone(router.db_for_read(User))
+        self.assertEqual(router.db_for_write(Flyby), 'default')
+        self.assertFalse(router.allow_migrate('replica', 'core'))
+        self.assertIsNone(router.allow_migrate('default', 'core'))
+        asteroid, watchlist = Asteroid(), Watchlist()
+        asteroid._state.db, watchlist._state.db = 'replica', 'default'
+        self.assertTrue(router.allow_relation(asteroid, watchlist))
+
+    def test_router_is_inactive_without_replica(self):
+        router = ReadWriteRouter()
+        with mock.patch.object(connection, 'in_atomic_block', False):
+            self.assertIsNone(router.db_for_read(Flyby))
+        self.assertIsNone(router.db_for_write(Flyby))
+
+    def test_ingest_commits_each_batch(self):
+        """Каждый пакет — своя транзакция, поколение данных меняется один раз."""
+        from . import ingest
+        savepoints = []
+        write_batch = ingest._write_batch
+
+        def record(*args):
+            # В TestCase транзакция пакета — точка сохранения внутри транзакции теста
+            savepoints.append(connection.savepoint_ids[-1])
+            return write_batch(*args)
+
+        with mock.patch.object(ingest, '_write_batch', record):
+            result = ingest_feed(make_feed(count=5), batch_size=2)
+        self.assertEqual(len(set(savepoints)), 3)
+        self.assertEqual(result.flybys_created, 5)
+        self.assertEqual(DailyFlybyStats.objects.get().asteroid_count, 5)
+        self.assertEqual(DataGeneration.objects.get().value, 1)
+
+    def test_interrupted_ingest_keeps_derived_data(self):
+        """Оборванный поток: записанные пакеты уже со сводками, повтор их не теряет."""
+        tomorrow = timezone.localdate() + timezone.timedelta(days=1)
+        feed = make_feed(count=3, date_str=tomorrow.isoformat())
+        user = User.objects.create_user('researcher', password='secret')
+        item = Watchlist.objects.create(user=user, asteroid=Asteroid.objects.create(nasa_id='1000', name='(2026 AB)'))
+
+        def truncated(items):
+            yield from list(items)[:2]
+            raise ValueError('Обрыв потока')
+
+        with self.assertRaises(ValueError):
+            ingest_items(truncated(iter_feed_items(feed)), batch_size=2)
+        self.assertEqual(DailyFlybyStats.objects.get(date=tomorrow).asteroid_count, 2)
+        item.refresh_from_db()
+        self.assertIsNotNone(item.next_approach_at)
+        self.assertEqual(DataGeneration.objects.get().value, 1)
+
+        result = ingest_feed(feed, batch_size=2)
+        self.assertEqual(result.flybys_created, 1)
+        self.assertEqual(DailyFlybyStats.objects.get(date=tomorrow).asteroid_count, 3)
+
+
+class ReplicaCopyTest(TransactionTestCase):
+    # Онлайн-бэкап ждёт конца открытой транзакции источника, поэтому без обёртки TestCase
+    def test_copy_to_replica(self):
+        ingest_feed(make_feed(count=2))
+        with tempfile.TemporaryDirectory() as tmp:
+            replica = connections.configure_settings({**connections.settings, 'replica': {
+                'ENGINE': 'django.db.backends.sqlite3', 'NAME': f'{tmp}/replica.sqlite3',
+            }})['replica']
+            with mock.patch.dict(connections.settings, {'replica': replica}), \
+                    override_settings(NASA_READ_DATABASE='replica', NASA_REPLICA_COPY_PAGES=4), \
+                    mock.patch('core.db.time.sleep') as sleep:
+                copy_to_replica()
+                del connections['replica']
+            # Копия идёт шагами по 4 страницы с паузой между ними
+            self.assertGreater(sleep.call_count, 1)
+            copy = sqlite3.connect(f'{tmp}/replica.sqlite3')
+            try:
+                self.assertEqual(copy.execute('SELECT COUNT(*) FROM core_asteroid').fetchone()[0], 2)
+            finally:
+                copy.close()
+
+
+class ReplicaSyncTest(TestCase):
+    @mock.patch('core.db.copy_to_replica', return_value='replica.sqlite3')
+    @mock.patch('core.db.replica_is_sqlite', return_value=True)
+    def test_data_commands_sync_sqlite_replica(self, is_sqlite, copy):
+        """Команды, меняющие данные, обновляют файл-реплику сами, как load_nasa."""
+        for name in ('apply_retention', 'drop_midnight_duplicates', 'predict_flybys'):
+            out = StringIO()
+            call_command(name, stdout=out)
+            self.assertIn('Реплика для чтений обновлена: replica.sqlite3', out.getvalue())
+        self.assertEqual(copy.call_count, 3)
+        is_sqlite.return_value = False
+        call_command('apply_retention', stdout=StringIO())
+        self.assertEqual(copy.call_count, 3)
+
+
+class RetentionTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        # Старые сближения в горячей таблице, как до включения горизонта хранения
+        with override_settings(NASA_RETENTION_DAYS=0):
+            ingest_feed(make_feed(date_str='2020-01-12'))
+        ingest_feed(make_feed(count=2, date_str=(timezone.localdate() + timezone.timedelta(days=1)).isoformat()))
+
+    def test_moves_old_flybys_to_archive(self):
+        created_at = Flyby.objects.get(asteroid__nasa_id='1000', date__year=2020).created_at
+        self.assertEqual(apply_retention(batch_size=2), 3)
+        self.assertEqual(Flyby.objects.count(), 2)
+        self.assertFalse(Flyby.objects.filter(date__lt=retention_cutoff()).exists())
+        archived = ArchivedFlyby.objects.get(asteroid__nasa_id='1000')
+        self.assertEqual((archived.velocity_kmh, archived.created_at), (36000.0, created_at))
+        self.assertEqual(apply_retention(), 0)
+
+    def test_reingested_old_window_updates_archive_in_place(self):
+        apply_retention()
+        result = ingest_feed(make_feed(date_str='2020-01-12'))
+        self.assertEqual((result.flybys_created, result.flybys_updated), (0, 0))
+        self.assertEqual(len(list(export_rows(archived=True))), 5)
+
+        result = ingest_feed(make_feed(count=4, date_str='2020-01-12', miss_distance='2000000.0'))
+        self.assertEqual((result.flybys_created, result.flybys_updated), (1, 3))
+        self.assertFalse(Flyby.objects.filter(date__year=2020).exists())
+        self.assertEqual(ArchivedFlyby.objects.filter(miss_distance_km=2000000.0).count(), 4)
+        self.assertEqual(DailyFlybyStats.objects.get(date=date(2020, 1, 12)).asteroid_count, 4)
+        self.assertEqual(apply_retention(), 0)
+
+    @override_settings(NASA_RETENTION_DAYS=0)
+    def test_zero_horizon_keeps_everything(self):
+        self.assertEqual(apply_retention(), 0)
+        out = StringIO()
+        call_command('apply_retention', stdout=out)
+        self.assertIn('не ограничено', out.getvalue())
+        self.assertEqual(Flyby.objects.count(), 5)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('apply_retention', '--days', '30', stdout=out)
+        self.assertIn('Перенесено в архив: 3', out.getvalue())
+
+    def test_exports_read_both_tiers_on_request(self):
+        apply_retention()
+        hot = [row[1] for row in export_rows()]
+        both = list(export_rows(archived=True))
+        self.assertEqual(len(hot), 2)
+        self.assertEqual(len(both), 5)
+        self.assertEqual([row[0] for row in both], sorted(row[0] for row in both))
+        self.assertEqual(both[0][0].year, 2020)
+
+        user = User.objects.create_user('researcher', password='secret')
+        self.client.force_login(user)
+        response = self.client.get(reverse('core:export_flybys'), {'archived': '1'})
+        self.assertEqual(len(b''.join(response.streaming_content).decode().splitlines()), 6)
+
+    def test_watchlist_history_and_asteroid_flybys(self):
+        apply_retention()
+        url = reverse('core:api_watchlist_history')
+        self.assertEqual(self.client.get(url).status_code, 401)
+        user = User.objects.create_user('researcher', password='secret')
+        Watchlist.objects.create(user=user, asteroid=Asteroid.objects.get(nasa_id='1001'))
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(url, {'fields': 'nasa_id'}).json()['results'], [])
+        results = self.client.get(url, {'fields': 'nasa_id,date', 'archived': '1'}).json()['results']
+        self.assertEqual([row['nasa_id'] for row in results], ['1001'])
+        self.assertTrue(results[0]['date'].startswith('2020-01-12'))
+
+        detail = reverse('core:api_asteroid', args=['1001'])
+        self.assertEqual(len(self.client.get(detail, {'fields': 'flybys'}).json()['flybys']), 1)
+        self.assertEqual(len(self.client.get(detail, {'fields': 'flybys', 'archived': '1'}).json()['flybys']), 2)
+
+    def test_analytics_and_columnar_archive_include_archived(self):
+        apply_retention()
+        start = day_start(date(2020, 1, 12))
+        self.assertEqual(window_analytics(start, day_start(date(2020, 1, 13)))['flybys'], 3)
+        with tempfile.TemporaryDirectory() as tmp:
+            self.assertEqual(append_archive(path=tmp, rebuild=True), 3)
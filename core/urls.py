@@ -1,12 +1,23 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 app_name = 'core'
 
 urlpatterns = [
     path('', views.index, name='index'),
+    path('events/', views.live_feed, name='live_feed'),
     path('watchlist/', views.watchlist, name='watchlist'),
     path('watchlist/add/<int:asteroid_id>/', views.add_to_watchlist, name='add_to_watchlist'),
     path('watchlist/remove/<int:watchlist_id>/', views.remove_from_watchlist, name='remove_from_watchlist'),
     path('watchlist/update-notes/<int:watchlist_id>/', views.update_watchlist_notes, name='update_watchlist_notes'),
+    path('watchlist/alerts/', views.update_alert_rule, name='update_alert_rule'),
+    path('export/flybys/', views.export_flybys, name='export_flybys'),
+    path('search/', views.search, name='search'),
+    path('metrics', views.metrics, name='metrics'),
+    path('api/flybys/', api.flybys, name='api_flybys'),
+    path('api/analytics/', api.analytics, name='api_analytics'),
+    path('api/search/', api.search, name='api_search'),
+    path('api/asteroids/<str:nasa_id>/', api.asteroid_detail, name='api_asteroid'),
+    path('api/watchlist/', api.watchlist, name='api_watchlist'),
+    path('api/watchlist/history/', api.watchlist_history, name='api_watchlist_history'),
 ]
@@ -1,94 +1,146 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from django.utils.dateparse import parse_date
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.utils import timezone
-from datetime import timedelta
-from .models import Asteroid, Flyby, Watchlist
+from . import metrics as process_metrics, queries
+from .pagination import InvalidCursor, akeyset_page, get_page_size
+from .aggregates import awindow_stats
+from .caching import conditional_on_generation
+from .events import live_events, live_feed_enabled
+from .export import CONTENT_TYPES, FORMATS, export_filename, export_rows, export_stream
+from .models import AlertRule, Asteroid, Watchlist
+from .search import get_limit, search_asteroids
+from .watchlist import awatchlist_summary, invalidate_summary, refresh_next_approaches
+
+
+async def paginate(request, queryset, order, cursor_param='cursor', default_size=None):
+    """Keyset-страница по параметрам запроса; повреждённый курсор ведёт на первую страницу."""
+    page_size = get_page_size(request.GET.get('page_size'), default_size)
+    try:
+        return await akeyset_page(queryset, order, request.GET.get(cursor_param), page_size)
+    except InvalidCursor:
+        return await akeyset_page(queryset, order, None, page_size)
+
+
+async def get_user(request):
+    """
+    Пользователь запроса без синхронных обращений к сессии.
+
+    request.user подменяется загруженным объектом: шаблоны и контекстные
+    процессоры читают его уже в асинхронном представлении.
+    """
+    request.user = await request.auser()
+    return request.user
 
 
-def index(request):
+@conditional_on_generation
+async def index(request):
     """
     Главная страница.
     Показывает список астероидов из базы данных.
     Данные обновляются через команду: python manage.py load_nasa
+    Асинхронное представление: запросы идут через асинхронный ORM.
     """
-    today = timezone.now().date()
-    week_end = today + timedelta(days=7)
+    today, week_end, start, end = queries.window_bounds(queries.WEEK_DAYS)
 
     show_hazardous_only = request.GET.get('hazardous', '') == '1'
   
-    flybys = Flyby.objects.select_related('asteroid').filter(
-        date__gte=today,
-        date__lte=week_end
-    ).order_by('date')
-
-    if show_hazardous_only:
-        flybys = flybys.filter(asteroid__is_potentially_hazardous=True)
-    
-    week_asteroids_qs = Asteroid.objects.filter(
-        flybys__date__gte=today,
-        flybys__date__lte=week_end
-    ).distinct()
-
-    total_asteroids = week_asteroids_qs.count()
-    hazardous_count = week_asteroids_qs.filter(is_potentially_hazardous=True).count()
-    safe_count = total_asteroids - hazardous_count
+    flybys = queries.index_flybys(start, end, hazardous_only=show_hazardous_only)
+    page = await paginate(request, flybys, queries.FLYBY_ORDER)
     
+    user = await get_user(request)
     user_watchlist_ids = set()
-    if request.user.is_authenticated:
-        user_watchlist_ids = set(
-            Watchlist.objects.filter(user=request.user)
-            .values_list('asteroid_id', flat=True)
-        )
+    if user.is_authenticated:
+        user_watchlist_ids = {
+            asteroid_id async for asteroid_id in
+            Watchlist.objects.filter(user=user).values_list('asteroid_id', flat=True)
+        }
     
     context = {
-        'flybys': flybys,
+        'flybys': page.items,
+        'page': page,
         'show_hazardous_only': show_hazardous_only,
-        'total_asteroids': total_asteroids,
-        'hazardous_count': hazardous_count,
-        'safe_count': safe_count,
         'user_watchlist_ids': user_watchlist_ids,
         'week_start': today,
         'week_end': week_end,
+        'live_feed': live_feed_enabled(request),
+        **await awindow_stats(today, week_end),
     }
     
     return render(request, 'core/index.html', context)
 
 
 @login_required
-def watchlist(request):
-    """Личный кабинет: список отслеживания."""
+async def watchlist(request):
+    """
+    Личный кабинет: список отслеживания.
+
+    Карточки по умолчанию отсортированы по ближайшему сближению (?sort=added —
+    по дате добавления) и выводятся постранично; сводка берётся из кэша.
+    Страница ничего не пишет: уже прошедшее next_approach_at (до refresh_passed)
+    выводится как «нет данных».
+    Асинхронное представление: запросы идут через асинхронный ORM.
+    """
     show_hazardous_only = request.GET.get('hazardous', '') == '1'
+    sort_by_added = request.GET.get('sort') == 'added'
     
-    watchlist_items = Watchlist.objects.filter(
-        user=request.user
-    ).select_related('asteroid').order_by('-added_at')
+    user = await get_user(request)
+    now = timezone.now()
+    watchlist_items = queries.user_watchlist_items(user, hazardous_only=show_hazardous_only)
     
-    if show_hazardous_only:
-        watchlist_items = watchlist_items.filter(
-            asteroid__is_potentially_hazardous=True
-        )
+    _, _, start, end = queries.window_bounds(queries.WATCHLIST_DAYS)
     
-    today = timezone.now().date()
-    month_end = today + timedelta(days=30)
+    upcoming_flybys = queries.upcoming_flybys(watchlist_items, start, end)
     
-    watchlist_asteroid_ids = watchlist_items.values_list('asteroid_id', flat=True)
-    
-    upcoming_flybys = Flyby.objects.filter(
-        asteroid_id__in=watchlist_asteroid_ids,
-        date__gte=today,
-        date__lte=month_end
-    ).select_related('asteroid').order_by('date')
+    page_size = getattr(settings, 'NASA_WATCHLIST_PAGE_SIZE', 20)
+    order = queries.WATCHLIST_ORDER if sort_by_added else queries.NEXT_APPROACH_ORDER
+    items_page = await paginate(request, watchlist_items, order, default_size=page_size)
+    upcoming_page = await paginate(request, upcoming_flybys, queries.FLYBY_ORDER, 'upcoming_cursor', page_size)
     
     context = {
-        'watchlist_items': watchlist_items,
-        'upcoming_flybys': upcoming_flybys,
+        'watchlist_items': items_page.items,
+        'summary': await awatchlist_summary(user, now),
+        'now': now,
+        'items_page': items_page,
+        'upcoming_flybys': upcoming_page.items,
+        'upcoming_page': upcoming_page,
         'show_hazardous_only': show_hazardous_only,
+        'sort_by_added': sort_by_added,
+        'alert_rule': await AlertRule.objects.filter(user=user).afirst(),
+        'alert_max_days': AlertRule.MAX_LOOKAHEAD.days,
     }
     
     return render(request, 'core/watchlist.html', context)
 
 
+async def live_feed(request):
+    """
+    Живая лента главной страницы (Server-Sent Events): новые и изменённые
+    сближения и сводка после каждой загрузки.
+
+    Только под ASGI: соединение держит корутину, а не поток. Под WSGI поток
+    был бы буферизован до конца жизни соединения, поэтому там (и при
+    выключенном NASA_LIVE_FEED_ENABLED) ответ — 204, и браузер не
+    переподключается.
+    """
+    if not live_feed_enabled(request):
+        return HttpResponse(status=204)
+    response = StreamingHttpResponse(
+        live_events(request.headers.get('Last-Event-ID')),
+        content_type='text/event-stream',
+    )
+    response.headers['Cache-Control'] = 'no-cache'
+    # nginx иначе буферизует поток
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @login_required
 def add_to_watchlist(request, asteroid_id):
     """Добавить в избранное."""
@@ -100,11 +152,13 @@ def add_to_watchlist(request, asteroid_id):
     )
     
     if created:
+        refresh_next_approaches(Watchlist.objects.filter(pk=obj.pk))
+        invalidate_summary(request.user)
         messages.success(request, f'{asteroid.name} добавлен в наблюдение.')
     else:
         messages.info(request, f'{asteroid.name} уже отслеживается.')
     
-    return redirect(request.META.get('HTTP_REFERER', 'index'))
+    return redirect(request.META.get('HTTP_REFERER', 'core:index'))
 
 
 @login_required
@@ -113,9 +167,10 @@ def remove_from_watchlist(request, watchlist_id):
     item = get_object_or_404(Watchlist, id=watchlist_id, user=request.user)
     name = item.asteroid.name
     item.delete()
+    invalidate_summary(request.user)
     
     messages.success(request, f'{name} удален из списка.')
-    return redirect('watchlist')
+    return redirect('core:watchlist')
 
 
 @login_required
@@ -128,4 +183,87 @@ def update_watchlist_notes(request, watchlist_id):
         item.save()
         messages.success(request, 'Заметка сохранена')
         
-    return redirect('watchlist')
+    return redirect('core:watchlist')
+
+
+@login_required
+def update_alert_rule(request):
+    """Сохранить пороги оповещений."""
+    if request.method == 'POST':
+        rule = AlertRule.objects.filter(user=request.user).first() or AlertRule(user=request.user)
+        try:
+            days = int(request.POST.get('days_ahead') or rule.lookahead.days)
+            distance = request.POST.get('max_miss_distance_km', '').strip()
+            rule.max_miss_distance_km = float(distance) if distance else None
+        except ValueError:
+            messages.error(request, 'Пороги оповещений должны быть числами')
+            return redirect('core:watchlist')
+        rule.lookahead = timedelta(days=min(max(days, 1), AlertRule.MAX_LOOKAHEAD.days))
+        rule.hazardous_only = request.POST.get('hazardous_only') == '1'
+        rule.enabled = request.POST.get('enabled') == '1'
+        rule.save()
+        messages.success(request, 'Настройки оповещений сохранены')
+
+    return redirect('core:watchlist')
+
+
+def _parse_day(value):
+    """Дата из параметра запроса; None для пустого значения, ValueError для некорректного."""
+    if not value:
+        return None
+    day = parse_date(value)
+    if day is None:
+        raise ValueError(value)
+    return day
+
+
+@login_required
+def export_flybys(request):
+    """
+    Выгрузка истории сближений потоком: ?format=csv|ndjson&gzip=1&start=&end=&hazardous=1|0;
+    archived=1 добавляет сближения, перенесённые в архив.
+    """
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in FORMATS:
+        return HttpResponseBadRequest(f"Неизвестный формат, доступны: {', '.join(FORMATS)}")
+    try:
+        start, end = (_parse_day(request.GET.get(name)) for name in ('start', 'end'))
+    except ValueError:
+        return HttpResponseBadRequest('Дата должна быть в формате YYYY-MM-DD')
+    hazardous = {'1': True, '0': False}.get(request.GET.get('hazardous'))
+    compress = request.GET.get('gzip') == '1'
+    archived = request.GET.get('archived') == '1'
+
+    response = StreamingHttpResponse(
+        export_stream(fmt, export_rows(start, end, hazardous, archived=archived), compress=compress),
+        content_type='application/gzip' if compress else CONTENT_TYPES[fmt],
+    )
+    response.headers['Content-Disposition'] = f'attachment; filename="{export_filename(fmt, compress)}"'
+    return response
+
+
+def search(request):
+    """Поиск астероидов по названию или NASA ID: ?q=2024 AB."""
+    query = request.GET.get('q', '').strip()
+    results = search_asteroids(query, get_limit(request.GET.get('limit'), default=50)) if query else []
+    watchlist_ids = set()
+    if results and request.user.is_authenticated:
+        watchlist_ids = set(Watchlist.objects.filter(
+            user=request.user, asteroid_id__in=[result['id'] for result in results],
+        ).values_list('asteroid_id', flat=True))
+    return render(request, 'core/search.html', {
+        'query': query,
+        'results': results,
+        'user_watchlist_ids': watchlist_ids,
+    })
+
+
+def metrics(request):
+    """
+    Метрики процесса в текстовом формате Prometheus. Если задан
+    NASA_METRICS_TOKEN, нужен заголовок Authorization: Bearer <токен>.
+    """
+    token = getattr(settings, 'NASA_METRICS_TOKEN', '')
+    if token and not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponseForbidden()
+    return HttpResponse(process_metrics.REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
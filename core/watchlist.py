@@ -0,0 +1,117 @@
+"""Ближайшие сближения отслеживаемых астероидов и сводка списка отслеживания.
+
+Дата ближайшего сближения хранится в Watchlist.next_approach_at: по ней
+список сортируется индексом (user, next_approach_at) без подзапроса на
+каждую строку. Значение пересчитывается одним UPDATE с подзапросом после
+загрузки; прошедшие сближения сдвигает refresh_passed (load_nasa и
+периодическая команда refresh_watchlist). Страница только читает: прошедшая
+дата до сдвига показывается как отсутствующая, а запрос страницы не берёт
+блокировку записи и не ждёт загрузку.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Min, OuterRef, Q, Subquery
+from django.utils import timezone
+
+from .caching import aget_generation, get_generation
+from .models import Flyby, Watchlist
+from .queries import WATCHLIST_DAYS, window_bounds
+
+SUMMARY_CACHE_KEY = 'core:watchlist-summary:{user_id}'
+
+
+def next_flyby_date(now=None):
+    """Подзапрос: дата ближайшего сближения астероида строки после now (индекс asteroid, date)."""
+    return Subquery(
+        Flyby.objects.filter(asteroid_id=OuterRef('asteroid_id'), date__gte=now or timezone.now())
+        .order_by('date').values('date')[:1]
+    )
+
+
+def refresh_next_approaches(items, now=None):
+    """Пересчитывает next_approach_at для строк items одним UPDATE."""
+    return items.update(next_approach_at=next_flyby_date(now))
+
+
+def refresh_for_asteroids(asteroid_ids, batch_size=500, now=None):
+    """Пересчёт после загрузки для строк с изменившимися сближениями."""
+    asteroid_ids = list(asteroid_ids)
+    updated = 0
+    for i in range(0, len(asteroid_ids), batch_size):
+        items = Watchlist.objects.filter(asteroid_id__in=asteroid_ids[i:i + batch_size])
+        updated += refresh_next_approaches(items, now)
+    return updated
+
+
+def refresh_passed(now=None, batch_size=500):
+    """
+    Сдвигает next_approach_at строк, у которых сближение уже прошло, и сбрасывает
+    сводки их владельцев.
+
+    Returns:
+        int: число обновлённых строк
+    """
+    now = now or timezone.now()
+    passed = list(Watchlist.objects.filter(next_approach_at__lt=now).order_by().values_list('id', 'user_id'))
+    for i in range(0, len(passed), batch_size):
+        refresh_next_approaches(Watchlist.objects.filter(id__in=[pk for pk, _ in passed[i:i + batch_size]]), now)
+    cache.delete_many([SUMMARY_CACHE_KEY.format(user_id=user_id) for user_id in {user_id for _, user_id in passed}])
+    return len(passed)
+
+
+def get_summary_ttl():
+    return getattr(settings, 'NASA_WATCHLIST_SUMMARY_TTL', 300)
+
+
+def _summary_stamp(generation, now):
+    return generation, timezone.localdate(now)
+
+
+def _summary_query(user, now):
+    _, _, _, month_end = window_bounds(WATCHLIST_DAYS, timezone.localdate(now))
+    return Watchlist.objects.filter(user=user), dict(
+        total=Count('id'),
+        hazardous=Count('id', filter=Q(asteroid__is_potentially_hazardous=True)),
+        upcoming=Count('id', filter=Q(next_approach_at__gte=now, next_approach_at__lt=month_end)),
+        next_approach_at=Min('next_approach_at', filter=Q(next_approach_at__gte=now)),
+    )
+
+
+def watchlist_summary(user, now=None):
+    """
+    Сводка списка отслеживания одним агрегатом: всего, опасных, сближений в ближайшие
+    WATCHLIST_DAYS дней и дата ближайшего.
+
+    Кэшируется на пользователя; поколение данных и день в ключе значения сбрасывают
+    сводку после загрузки и в полночь, изменение списка — invalidate_summary.
+    """
+    now = now or timezone.now()
+    stamp = _summary_stamp(get_generation()[0], now)
+    key = SUMMARY_CACHE_KEY.format(user_id=user.pk)
+    cached = cache.get(key)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    items, aggregates = _summary_query(user, now)
+    summary = items.aggregate(**aggregates)
+    cache.set(key, (stamp, summary), get_summary_ttl())
+    return summary
+
+
+async def awatchlist_summary(user, now=None):
+    """Асинхронный вариант watchlist_summary с тем же кэшем."""
+    now = now or timezone.now()
+    stamp = _summary_stamp((await aget_generation())[0], now)
+    key = SUMMARY_CACHE_KEY.format(user_id=user.pk)
+    cached = await cache.aget(key)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    items, aggregates = _summary_query(user, now)
+    summary = await items.aaggregate(**aggregates)
+    await cache.aset(key, (stamp, summary), get_summary_ttl())
+    return summary
+
+
+def invalidate_summary(user):
+    cache.delete(SUMMARY_CACHE_KEY.format(user_id=user.pk))